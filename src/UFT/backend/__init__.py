@@ -4,6 +4,8 @@
 """
 __version__ = "0.1"
 __author__ = "@fanmuzhi, @boqiling"
-__all__ = ["load_config", "sync_config", "load_test_item"]
+__all__ = ["load_config", "sync_config", "load_test_item", "TestPlan",
+           "TestStep", "compile_test_plan"]
 
 from config_io import load_config, sync_config, load_test_item, get_latest_revision
+from testplan import TestPlan, TestStep, compile_test_plan
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: test items of a PGEM configuration compiled once per DUT.
+The misc settings are parsed to numbers and booleans, so the polling loops
+of the channel read attributes instead of calling load_test_item.
+"""
+
+__version__ = "0.1"
+__author__ = "@fanmuzhi, @boqiling"
+__all__ = ["TestStep", "TestPlan", "compile_test_plan"]
+
+from collections import namedtuple
+from config_io import load_test_item
+
+# capacitance measure time out, in seconds, if Overtime is not set
+OVERTIME_DEFAULT = 600.0
+
+
+def _number(misc, key, default=None):
+    """misc setting with unit, e.g. "5.0V" or "1.0A", as float."""
+    if key not in misc:
+        return default
+    return float(misc[key].strip("aAvV"))
+
+
+def _yes(misc, key):
+    return misc.get(key, False) == "Yes"
+
+
+class TestStep(namedtuple("TestStep",
+                          ["name", "enable", "stoponfail", "min", "max",
+                           "threshold", "ceiling", "current", "overtime",
+                           "shutdown", "recharge", "flush_ee", "file",
+                           "fwver", "misc"])):
+    """one test item, compiled. misc keeps the settings as load_test_item
+    returns them, for the keys without attribute.
+    """
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, name, item):
+        """
+        :param item: dict of load_test_item, None if the item is not set.
+        """
+        if item is None:
+            return cls.disabled(name)
+        return cls(name=name,
+                   enable=bool(item["enable"]),
+                   stoponfail=bool(item["stoponfail"]),
+                   min=item["min"],
+                   max=item["max"],
+                   threshold=_number(item, "Threshold"),
+                   ceiling=_number(item, "Ceiling"),
+                   current=_number(item, "Current"),
+                   overtime=_number(item, "Overtime", OVERTIME_DEFAULT),
+                   shutdown=_yes(item, "Shutdown"),
+                   recharge=_yes(item, "Recharge"),
+                   flush_ee=_yes(item, "Flush_EE"),
+                   file=item.get("File"),
+                   fwver=item.get("FWver"),
+                   misc=tuple(sorted(item.items())))
+
+    @classmethod
+    def disabled(cls, name):
+        return cls(name, False, True, None, None, None, None, None,
+                   OVERTIME_DEFAULT, False, False, False, None, None, ())
+
+    def get(self, key, default=None):
+        """misc setting by its name in the configuration."""
+        for k, v in self.misc:
+            if k == key:
+                return v
+        return default
+
+
+class TestPlan(object):
+    """the compiled test items of one DUT, by item name. An item missing
+    from the configuration is disabled.
+    """
+    __slots__ = ("partnumber", "revision", "steps")
+
+    def __init__(self, partnumber, revision, steps):
+        object.__setattr__(self, "partnumber", partnumber)
+        object.__setattr__(self, "revision", revision)
+        object.__setattr__(self, "steps", dict(steps))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("TestPlan is read only")
+
+    def __getitem__(self, name):
+        step = self.steps.get(name)
+        if step is None:
+            return TestStep.disabled(name)
+        return step
+
+    def __contains__(self, name):
+        return name in self.steps
+
+
+def compile_test_plan(config):
+    """compile the test items of a configuration.
+    :param config: PGEMConfig object
+    :return: TestPlan
+    """
+    steps = {}
+    for item in config.testitems:
+        steps[item.name] = TestStep.compile(
+            item.name, load_test_item(config, item.name))
+    return TestPlan(config.partnumber, config.revision, steps)
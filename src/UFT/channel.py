@@ -11,11 +11,21 @@ __all__ = ["Channel", "ChannelStates"]
 import sys
 
 from UFT.devices import pwr, load, aardvark
-from UFT.devices import erie
+from UFT.devices import erie, erie_sim, erie_io
 from UFT.models import DUT_STATUS, DUT, Cycle, PGEMBase, Diamond4
-from UFT.backend import load_config, load_test_item, get_latest_revision
+from UFT.models import StatusBlock
+from UFT.models.regs import CAP_MEAS_DONE, GTG_CAP_OK, GTG_NO_WARNING
+from UFT.models.regs import SLAVE_ADDR, HWREADY, HWREADY_VALUE
+from UFT.models import vpd_dump, write_vpd_many
+from UFT.models import discover_shared_ports, write_shared_vpd_many
+from UFT.models import SHARED_EEP_ADDRESSES
+from UFT.backend import load_config, get_latest_revision
+from UFT.backend import compile_test_plan
 from UFT.backend.session import SessionManager
 from UFT.backend import simplexml
+from UFT.slot_scheduler import SlotScheduler, Sleep, Status, Wait, Ready
+from UFT.slot_scheduler import READY_POLL
+from UFT.sampler import VcapSampler, SampleBudget
 from UFT.config import *
 import threading
 from Queue import Queue
@@ -42,6 +52,7 @@ class ChannelStates(object):
     RECHARGE = 0x1F
     CHECK_VPD = 0x10
     HOLD = 0x0D
+    SLOT_FLOW = 0x20
 
 
 class BOARD_STATUS(object):
@@ -52,11 +63,13 @@ class BOARD_STATUS(object):
 
 
 class Channel(threading.Thread):
-    def __init__(self, name, barcode_list, cable_barcodes_list, capacitor_barcodes_list, mode4in1, channel_id=0):
+    def __init__(self, name, barcode_list, cable_barcodes_list, capacitor_barcodes_list, mode4in1, channel_id=0, continuous=False):
         """initialize channel
         :param name: thread name
         :param barcode_list: list of 2D barcode of dut.
         :param channel_id: channel ID, from 0 to 7
+        :param continuous: a slot done can be loaded again by refill_slots
+                           while the other slots are still testing.
         :return: None
         """
         # channel number for mother board.
@@ -72,23 +85,45 @@ class Channel(threading.Thread):
 
         # Amber 4x/e uses master port + shared port mode
         self.InMode4in1 = mode4in1
+        # EEPROM address of the shared ports, probed once for the run
+        self.shared_ports = {}
 
         # setup dut_list
         self.dut_list = []
         self.config_list = []
+        # TestPlan of each DUT, compiled from config_list in init
+        self.plans = []
         self.barcode_list = barcode_list
         self.cable_barcodes_list = cable_barcodes_list
         self.capacitor_barcodes_list = capacitor_barcodes_list
 
         # progress bar, 0 to 100
         self.progressbar = 0
+        # progress of each slot in the slot flow, and the progressbar share
+        # of the slot phases
+        self.slot_progress = [0] * TOTAL_SLOTNUM
+        self.phase_weights = {}
+
+        # continuous flow, DUTs loaded by refill_slots wait in refills until
+        # the slot flow takes them, DUTs in finished are done and saved
+        self.continuous = continuous
+        self.refills = []
+        self.refill_lock = threading.Lock()
+        self.accepting = False
+        self.finished = []
 
         # counter, to calculate charge and discharge time based on interval
         self.counter = 0
 
+        # status reads of the charging and discharging DUTs
+        self.sample_budget = SampleBudget(SAMPLE_MAX_RATE)
+
         # pre-discharge current, default to 0.8A
         self.current = 2.0
 
+        # time source, replaced by the simulation clock of erie board
+        self.clock = time
+
         # exit flag and queue for threading
         self.exit = False
         self.queue = Queue()
@@ -108,7 +143,13 @@ class Channel(threading.Thread):
 
         logger.info("Initiate Hardware of Channel {0}...".format(self.channel))
         #first setup erie
-        if self.channel == 0:
+        if ERIE_SIMULATION:
+            sim = erie_sim.ErieSimulator(
+                clock=erie_sim.SimClock(ERIE_SIM_SPEEDUP),
+                mode4in1=self.InMode4in1)
+            self.erie = erie.Erie(boardid=self.channel + 1, ser=sim,
+                                  clock=sim.clock)
+        elif self.channel == 0:
             self.erie = erie.Erie(port=ERIE_NO1, boardid=1)
         elif self.channel == 1:
             self.erie = erie.Erie(port=ERIE_NO2, boardid=2)
@@ -116,6 +157,9 @@ class Channel(threading.Thread):
             self.erie = erie.Erie(port=ERIE_NO3, boardid=3)
         elif self.channel == 3:
             self.erie = erie.Erie(port=ERIE_NO4, boardid=4)
+        self.clock = self.erie.clock
+        # all the serial traffic of this board goes through the I/O worker
+        self.erie = erie_io.ErieWorker(self.erie)
 
         # aardvark
         self.adk = aardvark.Adapter(self.erie)
@@ -126,18 +170,9 @@ class Channel(threading.Thread):
 
         logger.info("mode 4in1 is {0}".format(self.InMode4in1))
 
-        for slot in range(TOTAL_SLOTNUM):
-            self.ld.select_channel(slot)
-            self.ld.input_off()
-            #time.sleep(1)
-            #self.ld.protect_on()
-            #self.ld.change_func(load.DCLoad.ModeCURR)
-            #time.sleep(1)
-
-            self.ps.selectChannel(slot)
-            self.ps.deactivateOutput()
-
-            self.erie.LedOff(slot)
+        self._loads_off_all()
+        self._power_off_all()
+        self._leds_off_all()
 
         # setup power supply
         #self.ps.selectChannel(node=PS_ADDR, ch=PS_CHAN)
@@ -146,7 +181,7 @@ class Channel(threading.Thread):
                    "ovp": PS_OVP, "ocp": PS_OCP}
         #self.ps.set(setting)
         #self.ps.activateOutput()
-        time.sleep(1)
+        self.clock.sleep(1)
         #volt = self.ps.measureVolt()
         #curr = self.ps.measureCurr()
         '''
@@ -166,49 +201,247 @@ class Channel(threading.Thread):
         for i, bc in enumerate(self.barcode_list):
             if bc != "":
                 # dut is present
-                dut = PGEMBase(device=self.adk,
-                               slot=i,
-                               barcode=bc)
-                logger.info("dut: {0} SN is {1}"
-                            .format(dut.slotnum, bc))
-                if self.InMode4in1:
-                    if dut.partnumber not in Mode4in1_PN:
-                        raise Exception("This partnumber {0} does not support Mode4in1".format(dut.partnumber))
-                else:
-                    if dut.partnumber in Mode4in1_PN:
-                        if not OVERRIDE:
-                            raise Exception("This partnumber {0} NEED Mode4in1".format(dut.partnumber))
-                dut.status = DUT_STATUS.Idle
-                dut.cable_barcode = self.cable_barcodes_list[i]
-                dut.capacitor_barcode = self.capacitor_barcodes_list[i]
-                dut.testdate = datetime.datetime.now()
+                dut, dut_config, plan = self._load_dut(
+                    i, bc, self.cable_barcodes_list[i],
+                    self.capacitor_barcodes_list[i])
                 self.dut_list.append(dut)
-                dut_config = load_config("sqlite:///" + CONFIG_DB,
-                                         dut.partnumber, dut.revision)
                 self.config_list.append(dut_config)
-                self.set_productype(dut.slotnum, dut.producttype)
-                latest_revision = get_latest_revision("sqlite:///" + CONFIG_DB,
-                                         dut.partnumber)
-                logger.info("dut: {0} has the latest revision of this partnumber is {1}"
-                            .format(dut.slotnum, latest_revision))
-                if latest_revision != dut.revision:
-                    if not OVERRIDE:
-                        dut.errormessage = "Not the latest revision"
-                        dut.status = DUT_STATUS.Fail
-
-                self.channelresult = BOARD_STATUS.Running
-                self.dutnumber += 1
+                self.plans.append(plan)
             else:
                 # dut is not loaded on fixture
                 self.dut_list.append(None)
                 self.config_list.append(None)
+                self.plans.append(None)
 
-    def _check_hardware_ready_(self, dut):
-        for i in range(5):
-            if dut.read_hwready():
-                return True
-            time.sleep(1)
-        return False
+    def _load_dut(self, slot, bc, cable_barcode, capacitor_barcode):
+        """DUT of barcode bc in slot, with its configuration.
+        :return: (PGEMBase, PGEMConfig, TestPlan)
+        """
+        dut = PGEMBase(device=self.adk,
+                       slot=slot,
+                       barcode=bc)
+        logger.info("dut: {0} SN is {1}"
+                    .format(dut.slotnum, bc))
+        if self.InMode4in1:
+            if dut.partnumber not in Mode4in1_PN:
+                raise Exception("This partnumber {0} does not support Mode4in1".format(dut.partnumber))
+        else:
+            if dut.partnumber in Mode4in1_PN:
+                if not OVERRIDE:
+                    raise Exception("This partnumber {0} NEED Mode4in1".format(dut.partnumber))
+        dut.status = DUT_STATUS.Idle
+        dut.cable_barcode = cable_barcode
+        dut.capacitor_barcode = capacitor_barcode
+        dut.testdate = datetime.datetime.now()
+        dut_config = load_config("sqlite:///" + CONFIG_DB,
+                                 dut.partnumber, dut.revision)
+        plan = compile_test_plan(dut_config)
+        self.set_productype(dut.slotnum, dut.producttype)
+        latest_revision = get_latest_revision("sqlite:///" + CONFIG_DB,
+                                 dut.partnumber)
+        logger.info("dut: {0} has the latest revision of this partnumber is {1}"
+                    .format(dut.slotnum, latest_revision))
+        if latest_revision != dut.revision:
+            if not OVERRIDE:
+                dut.errormessage = "Not the latest revision"
+                dut.status = DUT_STATUS.Fail
+
+        self.channelresult = BOARD_STATUS.Running
+        self.dutnumber += 1
+        return dut, dut_config, plan
+
+    def _read_ready_all(self, duts):
+        """hardware ready flag of several DUTs at once, a DUT still booting
+        may not answer.
+        :return: dict of slot number and True if the DUT is ready, False if
+                 it is not, None if it did not answer.
+        """
+        vals = erie_io.call(self.erie, self.adk.poll,
+                            [(dut.slotnum, SLAVE_ADDR) for dut in duts],
+                            HWREADY)
+        return dict((dut.slotnum, None if val is None
+                     else val == HWREADY_VALUE)
+                    for dut, val in zip(duts, vals))
+
+    def _fail_not_ready(self, dut, ready):
+        """dut did not report hardware ready in time.
+        :param ready: last flag read, None if dut did not answer.
+        """
+        dut.status = DUT_STATUS.Fail
+        if ready is None:
+            dut.errormessage = "IIC access failed."
+        else:
+            dut.errormessage = "DUT is not ready."
+        logger.info("dut: {0} status: {1} message: {2} ".
+                    format(dut.slotnum, dut.status, dut.errormessage))
+
+    def _wait_ready(self, duts, powered_at, timeout=READY_TIMEOUT):
+        """wait for the DUTs just powered on to report hardware ready, read
+        round robin until each is ready or timeout seconds after its power
+        on, the DUTs not ready fail.
+        :param powered_at: dict of slot number and power on time.
+        :return: list of the DUTs ready.
+        """
+        waiting, ready = list(duts), []
+        while waiting:
+            flags = self._read_ready_all(waiting)
+            now = self.clock.time()
+            ready += [dut for dut in waiting if flags[dut.slotnum]]
+            waiting = [dut for dut in waiting if not flags[dut.slotnum]]
+            for dut in waiting:
+                if now - powered_at[dut.slotnum] >= timeout:
+                    self._fail_not_ready(dut, flags[dut.slotnum])
+            waiting = [dut for dut in waiting
+                       if dut.status != DUT_STATUS.Fail]
+            if waiting:
+                self.clock.sleep(READY_POLL)
+        return ready
+
+    def _transact_all(self, commands, priority=erie_io.PRIORITY_NORMAL):
+        """send a batch of commands to erie, raise the first failure.
+        :param commands: list of (port, cmd) tuples
+        """
+        for ret in erie_io.call(self.erie, "transact_many", commands,
+                                priority=priority):
+            if isinstance(ret, Exception):
+                raise ret
+
+    def _read_reg_all(self, duts, reg, length=1):
+        """read the same register of slave 0x14 on several DUTs at once.
+        :return: dict of slot number and read_reg result or exception.
+        """
+        futures = []
+        for dut in duts:
+            self.switch_to_dut(dut.slotnum)
+            self.adk.slave_addr = 0x14
+            futures.append(self.adk.read_reg_async(reg, length))
+        results = erie_io.wait_all(futures)
+        return dict((dut.slotnum, ret) for dut, ret in zip(duts, results))
+
+    def _read_status_all(self, duts):
+        """status block of several DUTs at once.
+        :return: dict of slot number and StatusBlock or exception.
+        """
+        blocks = self._read_reg_all(duts, StatusBlock.ADDR, StatusBlock.LEN)
+        for slot, ret in blocks.items():
+            if not isinstance(ret, Exception):
+                blocks[slot] = StatusBlock.decode(ret)
+        return blocks
+
+    def _wait_dut_commands(self, method, duts):
+        """start reset or shutdown on all the DUTs at once, and wait for the
+        completions, raise the first failure.
+        """
+        if not duts:
+            return
+        future = erie_io.submit(self.erie, method,
+                                [dut.slotnum for dut in duts])
+        for ret in future.result():
+            if isinstance(ret, Exception):
+                raise ret
+
+    def _reset_all(self, duts):
+        self._wait_dut_commands("ResetDUTs", duts)
+        for dut in duts:
+            dut.vpd_cache.invalidate()
+
+    def _shutdown_all(self, duts):
+        self._wait_dut_commands("ShutdownDUTs", duts)
+
+    def erie_stats(self):
+        """latency histograms and error counters of the erie board.
+        :return: erie_stats.ErieStats, histogram(cmd, port) and counters.
+        """
+        return self.erie.stats
+
+    def slot_health(self, slot):
+        """error rate and circuit breaker of the DUT in slot.
+        :return: aardvark.SlotHealth
+        """
+        return self.adk.health(slot)
+
+    def _fail_unreachable(self, duts=None):
+        """move the DUTs whose slot stopped answering to Fail, without
+        touching the bus.
+        :param duts: the DUTs to check, all the DUTs of the board if None.
+        """
+        for dut in (self.dut_list if duts is None else duts):
+            if dut is None or dut.status == DUT_STATUS.Fail:
+                continue
+            if not self.adk.is_reachable(dut.slotnum):
+                dut.status = DUT_STATUS.Fail
+                dut.errormessage = "IIC access failed."
+                logger.info("dut: {0} slot unreachable, status: {1} "
+                            "message: {2} ".format(dut.slotnum, dut.status,
+                                                   dut.errormessage))
+
+    def dump_vpd_all(self, start=0x000, length=0x1000, duts=None):
+        """read the VPD range of the DUTs on this board interleaved, and
+        save one dump file per DUT in VPD_DUMP.
+        :return: dict of slot number and file path or exception.
+        """
+        if duts is None:
+            duts = [dut for dut in self.dut_list if dut is not None]
+        paths = {}
+        dumps = erie_io.call(self.erie, vpd_dump.read_duts, duts, start,
+                             length)
+        for dut, dump in zip(duts, dumps):
+            if isinstance(dump, Exception):
+                logger.info("dut: {0} VPD dump failed: {1}".format(
+                    dut.slotnum, dump))
+                paths[dut.slotnum] = dump
+            else:
+                paths[dut.slotnum] = vpd_dump.save_dump(dump, VPD_DUMP)
+        return paths
+
+    def program_shared_vpd(self, duts, files, results):
+        """program the shared port EEPROMs of the 4-in-1 masters whose VPD
+        was written. The shared ports are mapped to their EEPROM address in
+        one probe sweep, kept for the run, then programmed per address.
+        :param results: write_vpd_many results of duts.
+        :return: the results, updated with the shared port failures.
+        """
+        results = list(results)
+        masters = [i for i, ret in enumerate(results)
+                   if not isinstance(ret, Exception)]
+        ports = [duts[i].slotnum + j for i in masters for j in range(1, 4)
+                 if duts[i].slotnum + j not in self.shared_ports]
+        if ports:
+            self.shared_ports.update(erie_io.call(
+                self.erie, discover_shared_ports, self.adk, ports))
+        todo = []
+        for i in masters:
+            slot = duts[i].slotnum
+            found = sorted(self.shared_ports.get(slot + j)
+                           for j in range(1, 4))
+            if found != list(SHARED_EEP_ADDRESSES):
+                logger.info("dut: {0} shared port addresses: {1}".format(
+                    slot, found))
+                results[i] = aardvark.USBI2CAdapterException(
+                    "shared port EEPROM not found")
+            else:
+                todo.append(i)
+        rets = erie_io.call(self.erie, write_shared_vpd_many,
+                            [duts[i] for i in todo],
+                            [files[i] for i in todo], self.shared_ports)
+        for i, ret in zip(todo, rets):
+            if ret is not None:
+                results[i] = ret
+        return results
+
+    def _power_off_all(self):
+        self._transact_all([(slot, erie.CMD_OUTPUT_OFF)
+                            for slot in range(TOTAL_SLOTNUM)],
+                           priority=erie_io.PRIORITY_SAFETY)
+
+    def _loads_off_all(self):
+        self._transact_all([(slot, erie.CMD_INPUT_OFF)
+                            for slot in range(TOTAL_SLOTNUM)],
+                           priority=erie_io.PRIORITY_SAFETY)
+
+    def _leds_off_all(self):
+        self._transact_all([(slot, erie.CMD_LED_OFF)
+                            for slot in range(TOTAL_SLOTNUM)])
 
     def _turn_off_load(self, slot):
         self.ld.select_channel(slot)
@@ -221,12 +454,12 @@ class Channel(threading.Thread):
     def _turn_on_power(self, slot):
         self.ps.selectChannel(slot)
         self.ps.activateOutput()
-        time.sleep(0.1)
+        self.clock.sleep(0.1)
         if self.InMode4in1:
             for i in range(1, 4):
                 self.ps.selectChannel(slot + i)
                 self.ps.activateOutput()
-                time.sleep(0.1)
+                self.clock.sleep(0.1)
 
     def _turn_off_power(self, slot):
         self.ps.selectChannel(slot)
@@ -258,102 +491,340 @@ class Channel(threading.Thread):
             self.erie.SetProType(port, 0x01)
             self.producttype='Jamber'
 
-    def charge_dut(self):
-        """charge
+    def _run_slot_phases(self, phases, feed=None):
+        """run phases on every DUT of the board, each DUT starts its next
+        phase as soon as its own phase is done. With a single phase, that
+        is one test phase of the whole board.
+        :param phases: list of slot phases, functions of the DUT.
+        :param feed: function adding DUTs to the scheduler while it runs.
         """
-
-        power_on_delay = False
+        scheduler = SlotScheduler(self.clock, self._read_status_all,
+                                  self._phase_done, self._read_ready_all)
         for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Charge")
-            # print dut.slotnum
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
+            if dut is not None:
+                scheduler.add(dut, phases)
+        if feed is None:
+            scheduler.run()
+            return
+        while True:
+            scheduler.run(lambda: feed(scheduler))
+            with self.refill_lock:
+                if not self.refills:
+                    self.accepting = False
+                    break
+
+    def _phase_done(self, dut, phase):
+        weight = self.phase_weights.get(phase)
+        if weight is None:
+            return
+        self.slot_progress[dut.slotnum] += weight
+        duts = [d for d in self.dut_list if d is not None]
+        self.progressbar = sum(self.slot_progress[d.slotnum]
+                               for d in duts) // len(duts)
+
+    def _slot_phases(self):
+        """phases of the slot flow and their progressbar share.
+        """
+        phases = [(self._charge_slot, 20)]
+        if HOLD_EN:
+            phases.append((self._hold_slot, 0))
+        phases += [(self._capacitor_slot, 30),
+                   (self._check_vpd_slot, 5),
+                   (self._discharge_slot, 15),
+                   (self._recharge_slot, 5)]
+        if self.continuous:
+            phases.append((self._finish_slot, 0))
+        return phases
+
+    def run_slots(self):
+        """charge, hold, capacitance, VPD check, discharge and recharge,
+        per DUT instead of per board. In continuous flow, each DUT is saved
+        when done, and the DUTs of refill_slots join the flow.
+        """
+        phases = self._slot_phases()
+        self.phase_weights = dict(phases)
+        self.phase_weights[self._program_slot] = 5
+        for dut in self.dut_list:
+            if dut is not None:
+                self.slot_progress[dut.slotnum] = self.progressbar
+        if self.continuous:
+            with self.refill_lock:
+                self.accepting = True
+            self._run_slot_phases([p for p, w in phases],
+                                  feed=self._take_refills)
+        else:
+            self._run_slot_phases([p for p, w in phases])
+        self.progressbar = 100
+
+    def refill_slots(self, barcode_list, cable_barcodes_list,
+                     capacitor_barcodes_list):
+        """load new DUTs in the slots done, in continuous flow. A slot is
+        loaded if its barcode is set and differs from the DUT done in it.
+        :return: list of the slots loaded, None if the channel does not take
+                 DUTs any more.
+        """
+        with self.refill_lock:
+            if not self.accepting:
+                return None
+            pending = [dut.slotnum for dut, c, p in self.refills]
+        slots = []
+        for slot, bc in enumerate(barcode_list):
+            old = self.dut_list[slot]
+            if bc == "" or slot in pending:
                 continue
-            power_on_delay = True
+            if old is not None:
+                if old not in self.finished or old.barcode == bc:
+                    continue
+            slots.append(slot)
+        # the configurations are loaded out of the lock, the channel thread
+        # takes the refills while polling the other slots
+        loads = []
+        for slot in slots:
+            try:
+                loads.append(self._load_dut(slot, barcode_list[slot],
+                                            cable_barcodes_list[slot],
+                                            capacitor_barcodes_list[slot]))
+            except Exception as e:
+                logger.error("dut: {0} SN {1} not loaded: {2}".format(
+                    slot, barcode_list[slot], e))
+        with self.refill_lock:
+            if not self.accepting:
+                return None
+            self.refills.extend(loads)
+        return [dut.slotnum for dut, c, p in loads]
+
+    def _take_refills(self, scheduler):
+        """start the slot flow of the DUTs loaded by refill_slots.
+        """
+        with self.refill_lock:
+            refills, self.refills = self.refills, []
+        for dut, dut_config, plan in refills:
+            slot = dut.slotnum
+            self.dut_list[slot] = dut
+            self.config_list[slot] = dut_config
+            self.plans[slot] = plan
+            self.slot_progress[slot] = 20
+            # the failures of the DUT before, e.g. its shutdown check, do
+            # not count for the new one
+            for port in range(slot, slot + (4 if self.InMode4in1 else 1)):
+                self.adk.reset_health(port)
+            self._transact_all([(slot, erie.CMD_LED_OFF)])
+            logger.info("dut: {0} SN {1} loaded".format(slot, dut.barcode))
+            scheduler.add(dut, [self._program_slot] +
+                          [p for p, w in self._slot_phases()])
+        if refills:
+            self.channelresult = BOARD_STATUS.Running
+
+    def _finish_slot(self, dut):
+        """result of dut, its slot is turned off and the DUT saved.
+        """
+        self._turn_off_load(dut.slotnum)
+        self._turn_off_power(dut.slotnum)
+        if (dut.status == DUT_STATUS.Idle):
+            dut.status = DUT_STATUS.Pass
+            msg = "passed"
+        else:
+            self._transact_all([(dut.slotnum, erie.CMD_LED_ON)])
+            msg = dut.errormessage
+        logger.info("TEST RESULT: dut {0} ===> {1}".format(
+            dut.slotnum, msg))
+        self.save_file([dut])
+        self.save_db([dut])
+        self.finished.append(dut)
+
+    def _slot_starts(self, dut, config):
+        """the test item config applies to dut, which is still reachable.
+        """
+        self._fail_unreachable([dut])
+        if (not config.enable):
+            return False
+        return not ((config.stoponfail) & (dut.status != DUT_STATUS.Idle))
+
+    def _program_slot(self, dut):
+        """program the VPD of a DUT loaded in continuous flow, the steps of
+        program_dut for one DUT.
+        """
+        config = self.plans[dut.slotnum]["Program_VPD"]
+        if not self._slot_starts(dut, config):
+            return
+        # STEP 1: check Present Pin first for hardware exist
+        self._check_present(dut)
+        if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
+            return
+        # STEP 2: turn power on
+        self.ps.selectChannel(dut.slotnum)  # no turning on shared port power coz Vin check
+        self.ps.activateOutput()
+        # STEP 3: check hardware ready
+        logger.info("Check PGEM Hardware Ready for slot {0}".format(dut.slotnum))
+        ready = yield Ready(READY_TIMEOUT)
+        if not ready:
+            self._fail_not_ready(dut, ready)
+        if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
+            return
+        # STEP 3a: check Vin
+        self.switch_to_dut(dut.slotnum)
+        vin=dut.meas_vin()
+        logger.info("dut: {0} measured Vin {1}".format(dut.slotnum, vin))
+        if 13<vin or 10>vin:
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "Vin error"
+        elif self.InMode4in1:
+            # test each shared port Vin
+            for i in range(1, 4):
+                self.ps.selectChannel(dut.slotnum + i)
+                self.ps.activateOutput()
+                yield Sleep(0.1)
+                self.ps.selectChannel(dut.slotnum + i - 1)
+                self.ps.deactivateOutput()
+                yield Sleep(1)
+                self.switch_to_dut(dut.slotnum)
+                vin=dut.meas_vin()
+                logger.info("dut: {0} measured sharded port at {1} Vin {2}".format(dut.slotnum, i, vin))
+                if 13<vin or 10>vin:
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "Vin error"
+                yield Sleep(1)
+            # turn on every port
             self._turn_on_power(dut.slotnum)
-
-            # start charge
-            dut.status = DUT_STATUS.Charging
-
-        all_charged = False
-        self.counter = 0
-        start_time = time.time()
-        if power_on_delay:
-            time.sleep(5)
-
-        while (not all_charged):
-            all_charged = True
-            for dut in self.dut_list:
-                try:
-                    if dut is None:
-                        continue
-                    config = load_test_item(self.config_list[dut.slotnum],
-                                            "Charge")
-                    if (not config["enable"]):
-                        continue
-                    if (config["stoponfail"]) & \
-                            (dut.status != DUT_STATUS.Charging):
+        if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
+            return
+        # STEP 4: Program VPD
+        dut.status = DUT_STATUS.Program_VPD
+        logger.info("dut: {0} start writing...".format(dut.slotnum))
+        # written in background, the polls of the other slots run between
+        # its batches of frames
+        results = yield Wait(erie_io.submit(
+            self.erie, write_vpd_many, [dut], [config.file],
+            priority=erie_io.PRIORITY_BACKGROUND))
+        if self.InMode4in1:
+            results = self.program_shared_vpd([dut], [config.file], results)
+        if self._program_result(dut, config, results[0]):
+            yield Sleep(1)
+        if (config.stoponfail) & (dut.status != DUT_STATUS.Program_VPD):
+            return
+        # STEP 5: turn power on again if needed
+        self.ps.selectChannel(dut.slotnum)
+        if not self.ps.isOutputOn():
+            self._turn_on_power(dut.slotnum)
+        # STEP 6: check hardware ready and perform RESET
+        ready = yield Ready(READY_TIMEOUT)
+        if not ready:
+            self._fail_not_ready(dut, ready)
+            return
+        rets = yield Wait(erie_io.submit(self.erie, "ResetDUTs",
+                                         [dut.slotnum]))
+        for ret in rets:
+            if isinstance(ret, Exception):
+                raise ret
+        dut.vpd_cache.invalidate()
+        # the completion comes before the DUT booted again
+        ready = yield Ready(READY_TIMEOUT)
+        if not ready:
+            self._fail_not_ready(dut, ready)
+            return
+        dut.status = DUT_STATUS.Idle
+
+    def _charge_slot(self, dut, item="Charge"):
+        """charge phase of dut, or its recharge phase if item is Recharge.
+        """
+        config = self.plans[dut.slotnum][item]
+        if not self._slot_starts(dut, config):
+            return
+        recharge = (item == "Recharge")
+        self._turn_on_power(dut.slotnum)
+
+        # start charge
+        dut.status = DUT_STATUS.Charging
+        start_time = self.clock.time()
+        counter = 0
+        # the first sample as soon as dut is ready
+        ready = yield Ready(READY_TIMEOUT)
+        if not ready:
+            self._fail_not_ready(dut, ready)
+
+        sampler = self._sampler(config)
+        interval = 0
+        while dut.status == DUT_STATUS.Charging:
+            try:
+                status = yield Status(interval)
+                self.switch_to_dut(dut.slotnum)
+                if not status.hwready:
+                    ready = yield Ready(READY_TIMEOUT)
+                    if not ready:
+                        self._fail_not_ready(dut, ready)
                         continue
-
-                    threshold = float(config["Threshold"].strip("aAvV"))
-                    ceiling = float(config["Ceiling"].strip("aAvV"))
-                    max_chargetime = config["max"]
-                    min_chargetime = config["min"]
-
                     self.switch_to_dut(dut.slotnum)
-                    if not self._check_hardware_ready_(dut):
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "DUT is not ready."
-                    this_cycle = Cycle()
-                    this_cycle.vin = dut.meas_vin()
-                    this_cycle.counter = self.counter
-                    this_cycle.time = time.time()
-                    temperature = dut.check_temp()
-                    this_cycle.temp = temperature
-                    this_cycle.state = "charge"
-                    self.counter += 1
-
-                    self.ld.select_channel(dut.slotnum)
-                    this_cycle.vcap = dut.meas_vcap()
-                    chargestatue = dut.charge_status()
-
-                    charge_time = this_cycle.time - start_time
-                    dut.charge_time = charge_time
-                    if (temperature>50 or temperature<10):
-                        all_charged &= True
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "Temperature out of range."
-                    elif (charge_time > max_chargetime):
-                        all_charged &= True
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "Charge Time Too Long."
-                    elif (chargestatue):
-                        if(ceiling > this_cycle.vcap >= threshold)&(max_chargetime>dut.charge_time>min_chargetime):  #dut.meas_chg_time()
-                            all_charged &= True
-                            dut.status = DUT_STATUS.Idle  # pass
-                        else:
-                            dut.status = DUT_STATUS.Fail
-                            dut.errormessage = "Charge Time or Vcap failed"
+                    status = dut.read_status_block()
+                this_cycle = Cycle()
+                this_cycle.vin = status.vin
+                this_cycle.counter = counter
+                this_cycle.time = self.clock.time()
+                temperature = status.temperature
+                this_cycle.temp = temperature
+                this_cycle.state = "charge"
+                this_cycle.vcap = status.vcap
+                counter += 1
+                sampler.add(this_cycle)
+                chargestatue = status.charged
+
+                charge_time = this_cycle.time - start_time
+                dut.charge_time = charge_time
+                if (temperature>50 or temperature<10):
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "Temperature out of range."
+                elif (charge_time > config.max):
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "Charge Time Too Long."
+                elif (chargestatue):
+                    if (config.ceiling > this_cycle.vcap >= config.threshold) & \
+                            (config.max > charge_time > config.min):
+                        if recharge:
+                            self._turn_off_power(dut.slotnum)
+                            if config.shutdown:
+                                rets = yield Wait(erie_io.submit(
+                                    self.erie, "ShutdownDUTs",
+                                    [dut.slotnum]))
+                                for ret in rets:
+                                    if isinstance(ret, Exception):
+                                        raise ret
+                        dut.status = DUT_STATUS.Idle  # pass
                     else:
-                        all_charged &= False
+                        dut.status = DUT_STATUS.Fail
+                        dut.errormessage = "Charge Time or Vcap failed"
+                if not recharge:
                     dut.cycles.append(this_cycle)
-                    logger.info("dut: {0} status: {1} vcap: {2} "
-                                "temp: {3} charged: {4} message: {5} ".
-                                format(dut.slotnum, dut.status, this_cycle.vcap,
-                                       this_cycle.temp, chargestatue, dut.errormessage))
-                except aardvark.USBI2CAdapterException:
-                    logger.info("dut: {0} IIC access failed.".
-                                format(dut.slotnum))
-                    all_charged &= True
-                    dut.status = DUT_STATUS.Fail
-                    dut.errormessage = "IIC access failed."
+                logger.info("dut: {0} status: {1} vcap: {2} "
+                            "temp: {3} charged: {4} message: {5} ".
+                            format(dut.slotnum, dut.status, this_cycle.vcap,
+                                   this_cycle.temp, chargestatue,
+                                   dut.errormessage))
+            except aardvark.USBI2CAdapterException:
+                logger.info("dut: {0} IIC access failed.".
+                            format(dut.slotnum))
+                dut.status = DUT_STATUS.Fail
+                dut.errormessage = "IIC access failed."
+            interval = self.sample_budget.grant(dut.slotnum,
+                                                sampler.next_interval())
+        self.sample_budget.release(dut.slotnum)
 
-            if not all_charged:
-                time.sleep(INTERVAL)
+    def _sampler(self, config):
+        """vcap sampler of a charge or discharge phase.
+        """
+        return VcapSampler(config.threshold, INTERVAL, SAMPLE_MIN_INTERVAL,
+                           SAMPLE_MAX_INTERVAL)
+
+    def _recharge_slot(self, dut):
+        return self._charge_slot(dut, "Recharge")
+
+    def _hold_slot(self, dut):
+        """hold the power on for HOLD_TIME minutes.
+        """
+        yield Sleep(HOLD_TIME * 60)
+
+    def charge_dut(self):
+        """charge
+        """
+        self._run_slot_phases([self._charge_slot])
 
     def hold_power_on(self):
         """
@@ -363,296 +834,208 @@ class Channel(threading.Thread):
         logger.info("HOLD power on for {0} minutes ".format(HOLD_TIME))
         keep_hold=True
         total_seconds=HOLD_TIME*60
-        start_time = time.time()
+        start_time = self.clock.time()
         while(keep_hold):
-            time.sleep(INTERVAL)
-            if (time.time() - start_time) > total_seconds:
+            self.clock.sleep(INTERVAL)
+            if (self.clock.time() - start_time) > total_seconds:
                 keep_hold=False
 
     def recharge_dut(self):
         """charge
         """
-        power_on_delay = False
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Recharge")
-            # print dut.slotnum
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            power_on_delay = True
-            self._turn_on_power(dut.slotnum)
-
-            # start charge
-            dut.status = DUT_STATUS.Charging
+        self._run_slot_phases([self._recharge_slot])
 
-        all_charged = False
-        self.counter = 0
-        start_time = time.time()
+    def _discharge_slot(self, dut):
+        """load discharge phase of dut, then its shutdown check.
+        """
+        config = self.plans[dut.slotnum]["Discharge"]
+        if not self._slot_starts(dut, config):
+            return
+        self._turn_off_power(dut.slotnum)
+        yield Sleep(2)
 
-        if power_on_delay:
-            time.sleep(5)
+        self.ld.select_channel(dut.slotnum)
+        self.current = config.current
+        self.ld.set_curr(self.current)  # set discharge current
+        self.ld.input_on()
 
-        while (not all_charged):
-            all_charged = True
-            for dut in self.dut_list:
-                try:
-                    shutdown=False
-                    if dut is None:
-                        continue
-                    config = load_test_item(self.config_list[dut.slotnum],
-                                            "Recharge")
-                    if (not config["enable"]):
-                        continue
-                    if (config["stoponfail"]) & \
-                            (dut.status != DUT_STATUS.Charging):
-                        continue
+        if self.InMode4in1:
+            for i in range(1, 4):
+                self.ld.select_channel(dut.slotnum + i)
+                self.current = config.current
+                self.ld.set_curr(self.current)  # set discharge current
+                self.ld.input_on()
 
-                    threshold = float(config["Threshold"].strip("aAvV"))
-                    ceiling = float(config["Ceiling"].strip("aAvV"))
-                    max_chargetime = config["max"]
-                    min_chargetime = config["min"]
+        dut.status = DUT_STATUS.Discharging
 
-                    if config.get("Shutdown",False)=="Yes":
-                        shutdown=True
-                    self.switch_to_dut(dut.slotnum)
-                    if not self._check_hardware_ready_(dut):
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "DUT is not ready."
-                    #this_cycle = Cycle()
-                    #this_cycle.vin = dut.meas_vin()
-                    #this_cycle.counter = self.counter
-                    #this_cycle.time = time.time()
-                    temperature = dut.check_temp()
-                    #this_cycle.temp = temperature
-                    #this_cycle.state = "charge"
-                    self.counter += 1
-
-                    self.ld.select_channel(dut.slotnum)
-                    vcap = dut.meas_vcap()
-                    chargestatue=dut.charge_status()
-
-                    charge_time = time.time() - start_time
-                    dut.charge_time = charge_time
-                    if (temperature>50 or temperature<10):
-                        all_charged &= True
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "Temperature out of range."
-                    elif (charge_time > max_chargetime):
-                        all_charged &= True
+        # start discharge cycle
+        sampler = self._sampler(config)
+        counter = 0
+        start_time = self.clock.time()
+        interval = 0
+        while dut.status == DUT_STATUS.Discharging:
+            try:
+                status = yield Status(interval)
+                threshold = config.threshold
+                self.switch_to_dut(dut.slotnum)
+                this_cycle = Cycle()
+                this_cycle.vin = status.vin
+                temperature = status.temperature
+                this_cycle.temp = temperature
+                this_cycle.counter = counter
+                this_cycle.time = self.clock.time()
+
+                this_cycle.state = "discharge"
+                this_cycle.vcap = status.vcap
+                counter += 1
+                sampler.add(this_cycle)
+
+                discharge_time = this_cycle.time - start_time
+                dut.discharge_time = discharge_time
+                if (temperature>50 or temperature<10):
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "Temperature out of range."
+                    self._turn_off_load(dut.slotnum)
+                elif (discharge_time > config.max):
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "Discharge Time Too Long."
+                    self._turn_off_load(dut.slotnum)
+                elif (this_cycle.vin < 4.4):
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "Boost voltage error."
+                    self._turn_off_load(dut.slotnum)
+                elif (this_cycle.vcap < threshold):
+                    self._turn_off_load(dut.slotnum)
+                    if (discharge_time < config.min):
                         dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "Charge Time Too Long."
-                    elif (chargestatue):
-                        if(ceiling > vcap >= threshold)&(max_chargetime>dut.charge_time>min_chargetime):  #dut.meas_chg_time()
-                            all_charged &= True
-                            self._turn_off_power(dut.slotnum)
-
-                            if shutdown == True:
-                                self.erie.ShutdownDUT(dut.slotnum)
-                            dut.status = DUT_STATUS.Idle  # pass
+                        dut.errormessage = "Discharge Time Too Short."
+                    else:
+                        if self.erie.GetPortStatusAll(
+                                ports=[dut.slotnum]).is_gtg(dut.slotnum):
+                            dut.status = DUT_STATUS.Fail
+                            dut.errormessage = "GTG Pin check failed"
                         else:
+                            dut.status = DUT_STATUS.Idle  # pass
+                elif (self.producttype=='Garnet'):
+                    if (this_cycle.vcap > 5.5):
+                        if (this_cycle.vcap - this_cycle.vin >= 0.3):
                             dut.status = DUT_STATUS.Fail
-                            dut.errormessage = "Charge Time or Vcap failed"
-                    else:
-                        all_charged &= False
-                    #dut.cycles.append(this_cycle)
-                    logger.info("dut: {0} status: {1} vcap: {2} "
-                                "temp: {3} charged: {4} message: {5} ".
-                                format(dut.slotnum, dut.status, vcap,
-                                       temperature, chargestatue, dut.errormessage))
-                except aardvark.USBI2CAdapterException:
-                    logger.info("dut: {0} IIC access failed.".
-                                format(dut.slotnum))
-                    all_charged &= True
-                    dut.status = DUT_STATUS.Fail
-                    dut.errormessage = "IIC access failed."
+                            dut.errormessage = "Bypass voltage error."
+                            self._turn_off_load(dut.slotnum)
+                dut.cycles.append(this_cycle)
+                logger.info("dut: {0} status: {1} vcap: {2} vout: {3} "
+                            "temp: {4} message: {5} ".
+                            format(dut.slotnum, dut.status, this_cycle.vcap, this_cycle.vin,
+                                   this_cycle.temp, dut.errormessage))
+            except aardvark.USBI2CAdapterException:
+                logger.info("dut: {0} IIC access failed.".
+                            format(dut.slotnum))
+                dut.status = DUT_STATUS.Fail
+                dut.errormessage = "IIC access failed."
+                self._turn_off_load(dut.slotnum)
+            interval = self.sample_budget.grant(dut.slotnum,
+                                                sampler.next_interval())
+        self.sample_budget.release(dut.slotnum)
 
-            if not all_charged:
-                time.sleep(INTERVAL)
+        # check shutdown function
+        if not ((config.stoponfail) & (dut.status != DUT_STATUS.Idle)):
+            if config.recharge:
+                dut.status = DUT_STATUS.Discharging
+        if (config.stoponfail) & (dut.status != DUT_STATUS.Discharging):
+            return
+        rets = yield Wait(erie_io.submit(self.erie, "ShutdownDUTs",
+                                         [dut.slotnum]))
+        for ret in rets:
+            if isinstance(ret, Exception):
+                raise ret
+        # the completion may come before the DUT is down, give it until it
+        # stops answering
+        deadline = self.clock.time() + erie.SHUTDOWN_TIMEOUT
+        while self.clock.time() < deadline:
+            vals = yield Wait(erie_io.submit(self.erie, self.adk.poll,
+                                             [(dut.slotnum, SLAVE_ADDR)],
+                                             HWREADY))
+            if vals[0] is None:
+                break
+            yield Sleep(READY_POLL)
+        fShutdownSuccessfull = False
+        self.switch_to_dut(dut.slotnum)
+        try:
+            dut.meas_vcap()
+        except aardvark.USBI2CAdapterException:
+            # if iic exception occur, DUT shutdown already
+            fShutdownSuccessfull = True
+
+        if not fShutdownSuccessfull:
+            dut.errormessage = "Shutdown function error."
+            dut.status = DUT_STATUS.Fail
+        else:
+            dut.status = DUT_STATUS.Idle
+        logger.info("Shutdown process...dut: {0} "
+                    "status: {1} message: {2} ".
+                    format(dut.slotnum, dut.status, dut.errormessage))
 
     def discharge_dut(self):
         """discharge
         """
-        power_off_delay = False
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Discharge")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            power_off_delay = True
-            self._turn_off_power(dut.slotnum)
-
-        if power_off_delay:
-            time.sleep(2)
-
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Discharge")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-
-            self.ld.select_channel(dut.slotnum)
-            self.current = float(config["Current"].strip("aAvV"))
-            self.ld.set_curr(self.current)  # set discharge current
-            self.ld.input_on()
-
-            if self.InMode4in1:
-                for i in range(1, 4):
-                    self.ld.select_channel(dut.slotnum + i)
-                    self.current = float(config["Current"].strip("aAvV"))
-                    self.ld.set_curr(self.current)  # set discharge current
-                    self.ld.input_on()
+        self._run_slot_phases([self._discharge_slot])
 
-            dut.status = DUT_STATUS.Discharging
-
-        # start discharge cycle
-        all_discharged = False
-        fast_loop = False
-        start_time = time.time()
-        #self.ps.setVolt(0.0)
-        while (not all_discharged):
-            all_discharged = True
-            for dut in self.dut_list:
-                try:
-                    if dut is None:
-                        continue
-                    config = load_test_item(self.config_list[dut.slotnum],
-                                            "Discharge")
-                    if (not config["enable"]):
-                        continue
-                    if (config["stoponfail"]) & \
-                            (dut.status != DUT_STATUS.Discharging):
-                        continue
+    def _dut_ports(self, dut):
+        """ports of dut, with its shared ports in mode 4in1.
+        """
+        if self.InMode4in1:
+            return range(dut.slotnum, dut.slotnum + 4)
+        return [dut.slotnum]
 
-                    threshold = float(config["Threshold"].strip("aAvV"))
-                    max_dischargetime = config["max"]
-                    min_dischargetime = config["min"]
+    def _check_present(self, dut):
+        """present pin of dut, and of its shared ports in mode 4in1.
+        """
+        self.switch_to_dut(dut.slotnum)
+
+        logger.info("Check PGEM Present Pin for slot {0}".format(dut.slotnum))
+        ports = self._dut_ports(dut)
+        if not self.erie.GetPortStatusAll(ports=ports).is_present(dut.slotnum):
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "PGEM Connection Issue"
+            logger.info("dut: {0} status: {1} message: {2} ".
+                        format(dut.slotnum, dut.status, dut.errormessage))
+        if self.InMode4in1:
+            for i in range(1, 4):
+                self.switch_to_dut(dut.slotnum + i)
 
-                    self.switch_to_dut(dut.slotnum)
-                    # cap_in_ltc = dut.meas_capacitor()
-                    # print cap_in_ltc
-                    this_cycle = Cycle()
-                    this_cycle.vin = dut.meas_vin()
-                    temperature = dut.check_temp()
-                    this_cycle.temp = temperature
-                    this_cycle.counter = self.counter
-                    this_cycle.time = time.time()
-
-                    this_cycle.state = "discharge"
-                    self.ld.select_channel(dut.slotnum)
-                    this_cycle.vcap = dut.meas_vcap()
-                    if (this_cycle.vcap <= threshold + 0.2) & (fast_loop == False) & (self.producttype=='Garnet'):
-                        fast_loop = True
-                    # this_cycle.vcap = self.ld.read_volt()
-                    self.counter += 1
-
-                    discharge_time = this_cycle.time - start_time
-                    dut.discharge_time = discharge_time
-                    if (temperature>50 or temperature<10):
-                        all_discharged &= True
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "Temperature out of range."
-                        self._turn_off_load(dut.slotnum)
-                    elif (discharge_time > max_dischargetime):
-                        all_discharged &= True
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "Discharge Time Too Long."
-                        self._turn_off_load(dut.slotnum)
-                    elif (this_cycle.vin < 4.4):
-                        all_discharged &= True
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "Boost voltage error."
-                        self._turn_off_load(dut.slotnum)
-                    elif (this_cycle.vcap < threshold):
-                        all_discharged &= True
-                        self._turn_off_load(dut.slotnum)
-                        if (discharge_time < min_dischargetime):
-                            dut.status = DUT_STATUS.Fail
-                            dut.errormessage = "Discharge Time Too Short."
-                        else:
-                            if self.erie.GetGTGPin(dut.slotnum):
-                                dut.status = DUT_STATUS.Fail
-                                dut.errormessage = "GTG Pin check failed"
-                            else:
-                                dut.status = DUT_STATUS.Idle  # pass
-                    elif (self.producttype=='Garnet'):
-                        all_discharged &= False
-                        if (this_cycle.vcap > 5.5):
-                            if (this_cycle.vcap - this_cycle.vin >= 0.3):
-                                all_discharged &= True
-                                dut.status = DUT_STATUS.Fail
-                                dut.errormessage = "Bypass voltage error."
-                                self._turn_off_load(dut.slotnum)
-                    else:
-                        all_discharged &= False
-                    dut.cycles.append(this_cycle)
-                    logger.info("dut: {0} status: {1} vcap: {2} vout: {3} "
-                                "temp: {4} message: {5} ".
-                                format(dut.slotnum, dut.status, this_cycle.vcap, this_cycle.vin,
-                                       this_cycle.temp, dut.errormessage))
-                except aardvark.USBI2CAdapterException:
-                    logger.info("dut: {0} IIC access failed.".
-                                format(dut.slotnum))
-                    all_discharged &= True
+                logger.info("Check PGEM Present Pin for slot {0}".format(dut.slotnum + i))
+                if not self.erie.GetPortStatusAll(ports=ports).is_present(dut.slotnum + i):
                     dut.status = DUT_STATUS.Fail
-                    dut.errormessage = "IIC access failed."
-                    self._turn_off_load(dut.slotnum)
-            if not all_discharged:
-                if not fast_loop:
-                    time.sleep(INTERVAL)
-
-        # check shutdown function
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Discharge")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            if config.get("Recharge", False) == "Yes":
-                dut.status = DUT_STATUS.Discharging
-
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Discharge")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & \
-                    (dut.status != DUT_STATUS.Discharging):
-                continue
-
-            fShutdownSuccessfull = False
-            self.switch_to_dut(dut.slotnum)
-            self.erie.ShutdownDUT(dut.slotnum)
-            try:
-                dut.meas_vcap()
-            except aardvark.USBI2CAdapterException:
-                # if iic exception occur, DUT shutdown already
-                fShutdownSuccessfull = True
-
-            if not fShutdownSuccessfull:
-                dut.errormessage = "Shutdown function error."
-                dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "PGEM Connection Issue"
+                    logger.info("dut: {0} status: {1} message: {2} ".
+                                format(dut.slotnum, dut.status, dut.errormessage))
+
+    def _program_result(self, dut, config, ret):
+        """flush or power off dut after its VPD is written.
+        :param ret: bytes written, or the exception of write_vpd_many.
+        :return: True if the power of dut was turned off.
+        """
+        try:
+            if isinstance(ret, Exception):
+                raise ret
+            dut.program_vpd = 1
+            if config.flush_ee:
+                self.switch_to_dut(dut.slotnum)
+                dut.flush_ee()
             else:
-                dut.status = DUT_STATUS.Idle
-            logger.info("Shutdown process...dut: {0} "
-                        "status: {1} message: {2} ".
+                self._turn_off_power(dut.slotnum)
+                return True
+        except AssertionError:
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "Programming VPD Fail"
+            logger.info("dut: {0} status: {1} message: {2} ".
                         format(dut.slotnum, dut.status, dut.errormessage))
+        except aardvark.USBI2CAdapterException:
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "IIC access failed."
+            logger.info("dut: {0} status: {1} message: {2} ".
+                        format(dut.slotnum, dut.status, dut.errormessage))
+        return False
 
     def program_dut(self):
         """ program vpd of DUT.
@@ -662,77 +1045,39 @@ class Channel(threading.Thread):
         for dut in self.dut_list:
             if dut is None:
                 continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
+            config = self.plans[dut.slotnum]["Program_VPD"]
+            if (not config.enable):
                 continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
+            if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
                 continue
-            self.switch_to_dut(dut.slotnum)
-
-            logger.info("Check PGEM Present Pin for slot {0}".format(dut.slotnum))
-            if not self.erie.GetPresentPin(dut.slotnum):
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "PGEM Connection Issue"
-                logger.info("dut: {0} status: {1} message: {2} ".
-                            format(dut.slotnum, dut.status, dut.errormessage))
-            if self.InMode4in1:
-                for i in range(1, 4):
-                    self.switch_to_dut(dut.slotnum + i)
-
-                    logger.info("Check PGEM Present Pin for slot {0}".format(dut.slotnum + i))
-                    if not self.erie.GetPresentPin(dut.slotnum + i):
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "PGEM Connection Issue"
-                        logger.info("dut: {0} status: {1} message: {2} ".
-                                    format(dut.slotnum, dut.status, dut.errormessage))
+            self._check_present(dut)
         # STEP 2: turn power on
-        power_on_delay = False
+        powered, powered_at = [], {}
         for dut in self.dut_list:
             if dut is None:
                 continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
+            config = self.plans[dut.slotnum]["Program_VPD"]
+            if (not config.enable):
                 continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
+            if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
                 continue
-            power_on_delay = True
             self.ps.selectChannel(dut.slotnum)  # no turning on shared port power coz Vin check
             self.ps.activateOutput()
-            time.sleep(0.2)
-        if power_on_delay:
-            time.sleep(5)
-        # STEP 3: check hardware ready
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            self.switch_to_dut(dut.slotnum)
+            powered.append(dut)
+            powered_at[dut.slotnum] = self.clock.time()
+            self.clock.sleep(0.2)
+        # STEP 3: check hardware ready, each DUT goes on once it is ready
+        for dut in powered:
             logger.info("Check PGEM Hardware Ready for slot {0}".format(dut.slotnum))
-            try:
-                if not self._check_hardware_ready_(dut):
-                    dut.status = DUT_STATUS.Fail
-                    dut.errormessage = "DUT is not ready."
-            except aardvark.USBI2CAdapterException:
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "IIC access failed."
-                logger.info("dut: {0} status: {1} message: {2} ".
-                            format(dut.slotnum, dut.status, dut.errormessage))
+        self._wait_ready(powered, powered_at)
         # STEP 3a: check Vin
         for dut in self.dut_list:
             if dut is None:
                 continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
+            config = self.plans[dut.slotnum]["Program_VPD"]
+            if (not config.enable):
                 continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
+            if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
                 continue
             self.switch_to_dut(dut.slotnum)
             vin=dut.meas_vin()
@@ -746,179 +1091,130 @@ class Channel(threading.Thread):
                     for i in range(1, 4):
                         self.ps.selectChannel(dut.slotnum + i)
                         self.ps.activateOutput()
-                        time.sleep(0.1)
+                        self.clock.sleep(0.1)
                         self.ps.selectChannel(dut.slotnum + i - 1)
                         self.ps.deactivateOutput()
-                        time.sleep(1)
+                        self.clock.sleep(1)
                         vin=dut.meas_vin()
                         logger.info("dut: {0} measured sharded port at {1} Vin {2}".format(dut.slotnum, i, vin))
                         if 13<vin or 10>vin:
                             dut.status = DUT_STATUS.Fail
                             dut.errormessage = "Vin error"
-                        time.sleep(1)
+                        self.clock.sleep(1)
 
                     # turn on every port
                     for i in range(0, 4):
                         self.ps.selectChannel(dut.slotnum + i)
                         self.ps.activateOutput()
-                        time.sleep(0.1)
+                        self.clock.sleep(0.1)
         # STEP 4: Program VPD
+        # the VPD of all the DUTs is written interleaved, each DUT fails on
+        # its own.
+        duts, files = [], []
         for dut in self.dut_list:
             if dut is None:
                 continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
+            config = self.plans[dut.slotnum]["Program_VPD"]
+            if (not config.enable):
                 continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
+            if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
                 continue
-            self.switch_to_dut(dut.slotnum)
             dut.status = DUT_STATUS.Program_VPD
-            try:
-                logger.info("dut: {0} start writing...".format(dut.slotnum))
-                dut.write_vpd(config["File"])
-                if self.InMode4in1:
-                    # figure out a non-sequence writing method for shared port, yield a non-sequence cable sequence
-                    s0 = s1 = s2 = False
-                    for i in range(1, 4):
-                        self.switch_to_dut(dut.slotnum + i)
-                        addr = dut.write_shared_vpd(config["File"])
-                        logger.info("shared port: {0} writed at address 0x{1:x}...".format(dut.slotnum + i, addr))
-                        if addr == 0x54:
-                            s0 = True
-                        elif addr == 0x55:
-                            s1 = True
-                        elif addr == 0x56:
-                            s2 = True
-
-                    if not(s0 and s1 and s2):
-                        raise aardvark.USBI2CAdapterException
-                dut.program_vpd = 1
-                if config.get("Flush_EE",False)=="Yes":
-                    self.switch_to_dut(dut.slotnum)
-                    dut.flush_ee()
-                else:
-                    self._turn_off_power(dut.slotnum)
-                    time.sleep(1)
-            except AssertionError:
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "Programming VPD Fail"
-                logger.info("dut: {0} status: {1} message: {2} ".
-                            format(dut.slotnum, dut.status, dut.errormessage))
-            except aardvark.USBI2CAdapterException:
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "IIC access failed."
-                logger.info("dut: {0} status: {1} message: {2} ".
-                            format(dut.slotnum, dut.status, dut.errormessage))
+            logger.info("dut: {0} start writing...".format(dut.slotnum))
+            duts.append(dut)
+            files.append(config.file)
+        results = erie_io.call(self.erie, write_vpd_many, duts, files)
+
+        if self.InMode4in1:
+            results = self.program_shared_vpd(duts, files, results)
+
+        power_off = False
+        for dut, ret in zip(duts, results):
+            config = self.plans[dut.slotnum]["Program_VPD"]
+            power_off |= self._program_result(dut, config, ret)
+        if power_off:
+            self.clock.sleep(1)
 
         # STEP 5: turn power on again if needed
-        power_on_delay = False
+        powered, powered_at = [], {}
         for dut in self.dut_list:
             if dut is None:
                 continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
+            config = self.plans[dut.slotnum]["Program_VPD"]
+            if (not config.enable):
                 continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Program_VPD):
+            if (config.stoponfail) & (dut.status != DUT_STATUS.Program_VPD):
                 continue
+            powered.append(dut)
+            powered_at[dut.slotnum] = self.clock.time()
             self.ps.selectChannel(dut.slotnum)
             if not self.ps.isOutputOn():
-                power_on_delay = True
                 self.ps.activateOutput()
-                time.sleep(0.1)
+                self.clock.sleep(0.1)
                 if self.InMode4in1:
                     for i in range(1, 4):
                         self.ps.selectChannel(dut.slotnum + i)
                         self.ps.activateOutput()
-                        time.sleep(0.1)
-        if power_on_delay:
-            time.sleep(5)
+                        self.clock.sleep(0.1)
         # STEP 6: check hardware ready and perform RESET
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Program_VPD):
-                continue
-            self.switch_to_dut(dut.slotnum)
-
-            try:
-                if not self._check_hardware_ready_(dut):
-                    dut.status = DUT_STATUS.Fail
-                    dut.errormessage = "DUT is not ready."
-                else:
-                    self.erie.ResetDUT(dut.slotnum)
-                    dut.status = DUT_STATUS.Idle
-            except aardvark.USBI2CAdapterException:
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "IIC access failed."
-                logger.info("dut: {0} status: {1} message: {2} ".
-                            format(dut.slotnum, dut.status, dut.errormessage))
-
-    def check_vpd(self):
-
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            if dut.status != DUT_STATUS.Idle:
-                continue
+        ready = self._wait_ready(powered, powered_at)
+        # reset all the ready DUTs at once, and wait for them to boot again
+        self._reset_all(ready)
+        reset_at = dict((dut.slotnum, self.clock.time()) for dut in ready)
+        for dut in self._wait_ready(ready, reset_at):
+            dut.status = DUT_STATUS.Idle
+
+    def _check_vpd_slot(self, dut):
+        """check the VPD and the versions of dut.
+        """
+        config = self.plans[dut.slotnum]["Program_VPD"]
+        if not self._slot_starts(dut, config):
+            return
+        if dut.status != DUT_STATUS.Idle:
+            return
 
-            self.ps.selectChannel(dut.slotnum)
-            if not self.ps.isOutputOn():
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "No Power output, STOP checking VPD"
+        self.ps.selectChannel(dut.slotnum)
+        if not self.ps.isOutputOn():
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "No Power output, STOP checking VPD"
 
-            if self.InMode4in1:
-                for i in range(1, 4):
-                    self.switch_to_dut(dut.slotnum + i)
+        if self.InMode4in1:
+            for i in range(1, 4):
+                self.switch_to_dut(dut.slotnum + i)
 
-                    self.ps.selectChannel(dut.slotnum + i)
-                    if not self.ps.isOutputOn():
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "No Power output, STOP checking VPD"
+                self.ps.selectChannel(dut.slotnum + i)
+                if not self.ps.isOutputOn():
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "No Power output, STOP checking VPD"
 
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Program_VPD")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            self.switch_to_dut(dut.slotnum)
+        if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
+            return
+        self.switch_to_dut(dut.slotnum)
 
-            try:
-                dut.read_vpd()
-                if not dut.check_vpd():
+        try:
+            dut.read_vpd()
+            if not dut.check_vpd():
+                dut.status = DUT_STATUS.Fail
+                dut.errormessage = "Checking VPD error."
+            else:
+                dut.hwver = dut.read_hw_version()
+                logger.info("dut: {0} checking hardware version = {1}".format(dut.slotnum, dut.hwver))
+                if dut.hwver=='255':
                     dut.status = DUT_STATUS.Fail
-                    dut.errormessage = "Checking VPD error."
+                    dut.errormessage = "HW ver error."
                 else:
-                    dut.hwver = dut.read_hw_version()
-                    logger.info("dut: {0} checking hardware version = {1}".format(dut.slotnum, dut.hwver))
-                    if dut.hwver=='255':
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "HW ver error."
-                    else:
-                        dut.fwver = dut.read_fw_version()
-                        logger.info("dut: {0} checking firmware version = {1}".format(dut.slotnum, dut.fwver))
-                        if config.get("FWver", False):
-                            if not dut.fwver==config["FWver"]:
-                                dut.status = DUT_STATUS.Fail
-                                dut.errormessage = "FW ver error."
-            except aardvark.USBI2CAdapterException:
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "IIC access failed."
+                    dut.fwver = dut.read_fw_version()
+                    logger.info("dut: {0} checking firmware version = {1}".format(dut.slotnum, dut.fwver))
+                    if config.fwver:
+                        if not dut.fwver==config.fwver:
+                            dut.status = DUT_STATUS.Fail
+                            dut.errormessage = "FW ver error."
+        except aardvark.USBI2CAdapterException:
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "IIC access failed."
+
+    def check_vpd(self):
+        self._run_slot_phases([self._check_vpd_slot])
 
     def check_temperature_dut(self):
         """
@@ -928,15 +1224,14 @@ class Channel(threading.Thread):
         for dut in self.dut_list:
             if dut is None:
                 continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Check_Temp")
-            if (not config["enable"]):
+            config = self.plans[dut.slotnum]["Check_Temp"]
+            if (not config.enable):
                 continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
+            if (config.stoponfail) & (dut.status != DUT_STATUS.Idle):
                 continue
             self.switch_to_dut(dut.slotnum)
             temp = dut.check_temp()
-            if not (config["min"] < temp < config["max"]):
+            if not (config.min < temp < config.max):
                 dut.status = DUT_STATUS.Fail
                 dut.errormessage = "Temperature out of range."
                 logger.info("dut: {0} status: {1} message: {2} ".
@@ -945,192 +1240,152 @@ class Channel(threading.Thread):
     def switch_to_dut(self, slot):
         self.adk.select_channel(slot)
     
-    def calculate_capacitance(self):
-        """ calculate the capacitance of DUT, based on vcap list in discharging.
-        :return: capacitor value
+    def _capacitor_slot(self, dut):
+        """capacitance measure of dut, then its GTG checks.
         """
+        config = self.plans[dut.slotnum]["Capacitor"]
+        if not self._slot_starts(dut, config):
+            return
+        if dut.status != DUT_STATUS.Idle:
+            return
 
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Capacitor")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            if dut.status != DUT_STATUS.Idle:
-                continue
+        self.ps.selectChannel(dut.slotnum)
+        if not self.ps.isOutputOn():
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "No Power output, STOP cap measure"
 
-            self.ps.selectChannel(dut.slotnum)
-            if not self.ps.isOutputOn():
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "No Power output, STOP cap measure"
+        if self.InMode4in1:
+            for i in range(1, 4):
+                self.switch_to_dut(dut.slotnum + i)
 
-            if self.InMode4in1:
-                for i in range(1, 4):
-                    self.switch_to_dut(dut.slotnum + i)
+                self.ps.selectChannel(dut.slotnum + i)
+                if not self.ps.isOutputOn():
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "No Power output, STOP cap measure"
 
-                    self.ps.selectChannel(dut.slotnum + i)
-                    if not self.ps.isOutputOn():
-                        dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "No Power output, STOP cap measure"
+        if dut.status != DUT_STATUS.Idle:
+            return
 
-        for dut in self.dut_list:
-            if dut is None:
-                continue
-            config = load_test_item(self.config_list[dut.slotnum],
-                                    "Capacitor")
-            if (not config["enable"]):
-                continue
-            if (config["stoponfail"]) & (dut.status != DUT_STATUS.Idle):
-                continue
-            if dut.status != DUT_STATUS.Idle:
-                continue
-
-            self.switch_to_dut(dut.slotnum)
+        self.switch_to_dut(dut.slotnum)
+        try:
+            if (self.producttype=='Jamber'):
+                dut.start_cap_ext()
+            else:
+                dut.start_cap()
+        except aardvark.USBI2CAdapterException:
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "IIC access failed."
+            return
+        dut.status = DUT_STATUS.Cap_Measuring
+        logger.info("dut: {0} started cap measure".format(dut.slotnum))
+        yield Sleep(1)
+        start_time = self.clock.time()
+
+        interval = 0
+        while dut.status == DUT_STATUS.Cap_Measuring:
             try:
-                if (self.producttype=='Jamber'):
-                    dut.start_cap_ext()
-                else:
-                    dut.start_cap()
-            except aardvark.USBI2CAdapterException:
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "IIC access failed."
-            #time.sleep(1)
-            dut.status = DUT_STATUS.Cap_Measuring
-            logger.info("started cap measure")
-
-        #close load and set PS
-        #self.ld.reset()
-        #time.sleep(2)
-        # setup power supply
-        #self.ps.selectChannel(node=PS_ADDR, ch=PS_CHAN)
-        setting = {"volt": PS_VOLT, "curr": PS_CURR,
-                   "ovp": PS_OVP, "ocp": PS_OCP}
-        #self.ps.set(setting)
-        #self.ps.activateOutput()
-        time.sleep(1)
-        start_time = time.time()
-
-        all_cap_mears=False
-        while not all_cap_mears:
-            all_cap_mears=True
-            for dut in self.dut_list:
-                try:
-                    if dut is None:
-                        continue
-                    if dut.status != DUT_STATUS.Cap_Measuring:
-                        continue
-                    self.switch_to_dut(dut.slotnum)
-
-                    config = load_test_item(self.config_list[dut.slotnum],
-                                    "Capacitor")
-                    if "Overtime" in config:
-                        overtime=float(config["Overtime"])
-                    else:
-                        overtime=600
-
-                    #self.adk.slave_addr = 0x14
-                    #val = self.adk.read_reg(0x23,0x01)[0]
-                    val = dut.read_PGEMSTAT(0)
-                    #logger.info("PGEMSTAT.BIT2: {0}".format(val))
-                    vcap_temp=dut.meas_vcap()
-                    logger.info("dut: {0} PGEMSTAT.BIT2: {1} vcap in cap calculate: {2}".format(dut.slotnum, val, vcap_temp))
-
-                    capacitor_time = time.time() - start_time
-                    dut.capacitor_time = capacitor_time
-
-                    if (val | 0xFB)==0xFB: #PGEMSTAT.BIT2==0 CAP MEASURE COMPLETE
-                        all_cap_mears &= True
-                        val1 = dut.read_vpd_byaddress(0x100)[0] #`````````````````````````read cap vale from VPD``````````compare````````````````````````````
-                        logger.info("capacitance_measured value: {0}".format(val1))
-                        dut.capacitance_measured=val1
-                        if not (config["min"] < val1 < config["max"]):
-                            dut.status=DUT_STATUS.Fail
-                            dut.errormessage = "Cap is over limits"
-                            logger.info("dut: {0} capacitor: {1} message: {2} ".
-                                format(dut.slotnum, dut.capacitance_measured,
-                                   dut.errormessage))
-                        else:
-                            dut.status = DUT_STATUS.Idle  # pass
-                    elif capacitor_time > overtime:
-                        all_cap_mears &= True
+                status = yield Status(interval)
+                interval = INTERVAL * 5
+                self.switch_to_dut(dut.slotnum)
+                val = status.pgemstat
+                vcap_temp = status.vcap
+                logger.info("dut: {0} PGEMSTAT.BIT2: {1} vcap in cap calculate: {2}".format(dut.slotnum, val, vcap_temp))
+
+                capacitor_time = self.clock.time() - start_time
+                dut.capacitor_time = capacitor_time
+
+                if CAP_MEAS_DONE(val): #PGEMSTAT.BIT2==0 CAP MEASURE COMPLETE
+                    val1 = dut.read_vpd_byaddress(0x100)[0] # cap value from VPD
+                    logger.info("capacitance_measured value: {0}".format(val1))
+                    dut.capacitance_measured=val1
+                    if not (config.min < val1 < config.max):
                         dut.status=DUT_STATUS.Fail
-                        dut.errormessage = "Cap start over time"
+                        dut.errormessage = "Cap is over limits"
                         logger.info("dut: {0} capacitor: {1} message: {2} ".
                             format(dut.slotnum, dut.capacitance_measured,
                                    dut.errormessage))
                     else:
-                        all_cap_mears &= False
-                except aardvark.USBI2CAdapterException:
-                    logger.info("dut: {0} IIC access failed.".
-                                format(dut.slotnum))
-                    all_cap_mears &= True
-                    dut.status = DUT_STATUS.Fail
-                    dut.errormessage = "IIC access failed."
-            if not all_cap_mears:
-                time.sleep(INTERVAL * 5)
+                        dut.status = DUT_STATUS.Idle  # pass
+                elif capacitor_time > config.overtime:
+                    dut.status=DUT_STATUS.Fail
+                    dut.errormessage = "Cap start over time"
+                    logger.info("dut: {0} capacitor: {1} message: {2} ".
+                        format(dut.slotnum, dut.capacitance_measured,
+                               dut.errormessage))
+            except aardvark.USBI2CAdapterException:
+                logger.info("dut: {0} IIC access failed.".
+                            format(dut.slotnum))
+                dut.status = DUT_STATUS.Fail
+                dut.errormessage = "IIC access failed."
 
         #check capacitance ok
-        for dut in self.dut_list:
-            all_cap_ready=True
-            if dut is None:
-                continue
-            if dut.status != DUT_STATUS.Idle:
-                continue
-            self.switch_to_dut(dut.slotnum)
-            #self.adk.slave_addr = 0x14
-            #val = self.adk.read_reg(0x21,0x01)[0]
-            try:
-                val = dut.read_GTG(0)
-                if not((val&0x02)==0x02):
-                    dut.status=DUT_STATUS.Fail
-                    dut.errormessage = "GTG.bit1 ==0 "
-                    logger.info("GTG.bit1 ==0")
-                # check GTG_WARNING == 0x00
-                #temp=self.adk.read_reg(0x22)[0]
+        if dut.status != DUT_STATUS.Idle:
+            return
+        self.switch_to_dut(dut.slotnum)
+        try:
+            status = dut.read_status_block()
+            val = status.gtg
+            if not GTG_CAP_OK(val):
+                dut.status=DUT_STATUS.Fail
+                dut.errormessage = "GTG.bit1 ==0 "
+                logger.info("GTG.bit1 ==0")
+            # check GTG_WARNING == 0x00
+            else:
+                temp = status.gtg_warn
+                logger.info("GTG_Warning value: {0}".format(temp))
+                if not GTG_NO_WARNING(temp):
+                    dut.status = DUT_STATUS.Fail
+                    dut.errormessage = "GTG_warning != 0x00"
                 else:
-                    temp = dut.read_GTG_WARN(0)
-                    logger.info("GTG_Warning value: {0}".format(temp))
-                    if not (temp==0x00):
+                    ports = self._dut_ports(dut)
+                    if not self.erie.GetPortStatusAll(ports=ports).is_gtg(dut.slotnum):
                         dut.status = DUT_STATUS.Fail
-                        dut.errormessage = "GTG_warning != 0x00"
+                        dut.errormessage = "GTG Pin check failed"
                     else:
-                        #dut.status = DUT_STATUS.Idle    # pass
-                        if not self.erie.GetGTGPin(dut.slotnum):
-                            dut.status = DUT_STATUS.Fail
-                            dut.errormessage = "GTG Pin check failed"
-                        else:
-                            if self.InMode4in1:
-                                all_GTG = True
-                                for i in range(1, 4):
-                                    self.switch_to_dut(dut.slotnum + i)
-                                    if not self.erie.GetGTGPin(dut.slotnum + i):
-                                        all_GTG &= False
-
-                                if all_GTG:
-                                    dut.status = DUT_STATUS.Idle  # pass
-                                else:
-                                    dut.status = DUT_STATUS.Fail
-                                    dut.errormessage = "GTG Pin check failed"
-                            else:
+                        if self.InMode4in1:
+                            all_GTG = True
+                            for i in range(1, 4):
+                                self.switch_to_dut(dut.slotnum + i)
+                                if not self.erie.GetPortStatusAll(ports=ports).is_gtg(dut.slotnum + i):
+                                    all_GTG &= False
+
+                            if all_GTG:
                                 dut.status = DUT_STATUS.Idle  # pass
-            except aardvark.USBI2CAdapterException:
-                dut.status = DUT_STATUS.Fail
-                dut.errormessage = "IIC access failed."
+                            else:
+                                dut.status = DUT_STATUS.Fail
+                                dut.errormessage = "GTG Pin check failed"
+                        else:
+                            dut.status = DUT_STATUS.Idle  # pass
+        except aardvark.USBI2CAdapterException:
+            dut.status = DUT_STATUS.Fail
+            dut.errormessage = "IIC access failed."
+
+    def calculate_capacitance(self):
+        """ calculate the capacitance of DUT, based on vcap list in discharging.
+        :return: capacitor value
+        """
+        self._run_slot_phases([self._capacitor_slot])
+
+    def _unsaved(self, duts):
+        if duts is not None:
+            return duts
+        return [dut for dut in self.dut_list
+                if dut is not None and dut not in self.finished]
 
-    def save_db(self):
+    def save_db(self, duts=None):
+        """
+        :param duts: the DUTs to save, the DUTs not saved yet if None.
+        """
         # setup database
         # db should be prepared in cli.py
         try:
             sm = SessionManager()
             sm.prepare_db("sqlite:///" + RESULT_DB, [DUT, Cycle])
             session = sm.get_session("sqlite:///" + RESULT_DB)
+            # the DUTs saved are still read by the slot flow and the GUI
+            session.expire_on_commit = False
 
-            for dut in self.dut_list:
-                if dut is None:
-                    continue
+            for dut in self._unsaved(duts):
                 for pre_dut in session.query(DUT). \
                         filter(DUT.barcode == dut.barcode, DUT.archived == 0).all():
                     pre_dut.archived = 1
@@ -1143,13 +1398,12 @@ class Channel(threading.Thread):
         except Exception as e:
             self.error(e)
 
-    def save_file(self):
+    def save_file(self, duts=None):
         """ save dut info to xml file
+        :param duts: the DUTs to save, the DUTs not saved yet if None.
         :return:
         """
-        for dut in self.dut_list:
-            if dut is None:
-                continue
+        for dut in self._unsaved(duts):
             if not os.path.exists(RESULT_LOG):
                 os.makedirs(RESULT_LOG)
             filename = dut.barcode + ".xml"
@@ -1174,22 +1428,32 @@ class Channel(threading.Thread):
         else:
             self.channelresult = BOARD_STATUS.Pass
 
+        failed = []
         for dut in self.dut_list:
             if dut is None:
                 continue
             if (dut.status == DUT_STATUS.Idle):
                 dut.status = DUT_STATUS.Pass
+            if (dut.status == DUT_STATUS.Pass):
                 msg = "passed"
             else:
                 self.channelresult = BOARD_STATUS.Fail
-                self.erie.LedOn(dut.slotnum)
+                failed.append((dut.slotnum, erie.CMD_LED_ON))
                 msg = dut.errormessage
             logger.info("TEST RESULT: dut {0} ===> {1}".format(
                 dut.slotnum, msg))
-
-        for slot in range(TOTAL_SLOTNUM):
-            self.ps.selectChannel(slot)
-            self.ps.deactivateOutput()
+        self._transact_all(failed)
+
+        self._power_off_all()
+        for line in self.erie_stats().summary():
+            logger.info(line)
+        for (slot, addr), health in sorted(self.adk.slots.items()):
+            if health.errors:
+                logger.info("IIC slot {0} address 0x{1:02x}: {2} accesses "
+                            "{3} failed {4} retries unreachable: {5}".format(
+                                slot, addr, health.accesses, health.errors,
+                                health.retries, health.unreachable))
+        self.erie.stop()
 
         # save to xml logs
         self.save_file()
@@ -1203,6 +1467,8 @@ class Channel(threading.Thread):
         """
         while (not self.exit):
             state = self.queue.get()
+            if state not in (ChannelStates.INIT, ChannelStates.EXIT):
+                self._fail_unreachable()
             if (state == ChannelStates.EXIT):
                 try:
                     self.prepare_to_exit()
@@ -1258,6 +1524,12 @@ class Channel(threading.Thread):
                     self.progressbar += 30
                 except Exception as e:
                     self.error(e)
+            elif (state == ChannelStates.SLOT_FLOW):
+                try:
+                    logger.info("Channel: Test DUT per slot.")
+                    self.run_slots()
+                except Exception as e:
+                    self.error(e)
             elif (state == ChannelStates.RECHARGE):
                 try:
                     logger.info("Channel: Recharge DUT")
@@ -1272,6 +1544,11 @@ class Channel(threading.Thread):
     def auto_test(self):
         self.queue.put(ChannelStates.INIT)
         self.queue.put(ChannelStates.PROGRAM_VPD)
+        if SLOT_FLOW or self.continuous:
+            self.queue.put(ChannelStates.SLOT_FLOW)
+            self.queue.put(ChannelStates.EXIT)
+            self.start()
+            return
         self.queue.put(ChannelStates.CHARGE)
         if HOLD_EN:
             self.queue.put(ChannelStates.HOLD)
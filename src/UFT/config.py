@@ -27,6 +27,17 @@ OVERRIDE = config.getboolean('StationConfig', 'OVERRIDE')
 TOTAL_SLOTNUM = config.getint('StationConfig', 'TOTAL_SLOTNUM')
 
 INTERVAL = config.getfloat('StationConfig', 'INTERVAL')
+# adaptive sampling of vcap in charge and discharge
+SAMPLE_MIN_INTERVAL = config.getfloat('StationConfig', 'SAMPLE_MIN_INTERVAL') \
+    if config.has_option('StationConfig', 'SAMPLE_MIN_INTERVAL') else 0.2
+SAMPLE_MAX_INTERVAL = config.getfloat('StationConfig', 'SAMPLE_MAX_INTERVAL') \
+    if config.has_option('StationConfig', 'SAMPLE_MAX_INTERVAL') else 10.0
+SAMPLE_MAX_RATE = config.getfloat('StationConfig', 'SAMPLE_MAX_RATE') \
+    if config.has_option('StationConfig', 'SAMPLE_MAX_RATE') else 20.0
+
+# seconds from power on for a DUT to report hardware ready
+READY_TIMEOUT = config.getfloat('StationConfig', 'READY_TIMEOUT') \
+    if config.has_option('StationConfig', 'READY_TIMEOUT') else 10.0
 
 START_VOLT = config.getfloat('StationConfig', 'START_VOLT')
 
@@ -48,6 +59,20 @@ ERIE_NO3 = config.get('StationConfig', 'ERIE_NO3')
 ERIE_NO4 = config.get('StationConfig', 'ERIE_NO4')
 ERIE_DEBUG_INFOR = config.getboolean('StationConfig', 'ERIE_DEBUG_INFOR')
 
+# simulated erie boards instead of COM ports, for benchmark without hardware
+ERIE_SIMULATION = config.getboolean('StationConfig', 'ERIE_SIMULATION') \
+    if config.has_option('StationConfig', 'ERIE_SIMULATION') else False
+ERIE_SIM_SPEEDUP = config.getfloat('StationConfig', 'ERIE_SIM_SPEEDUP') \
+    if config.has_option('StationConfig', 'ERIE_SIM_SPEEDUP') else 1.0
+# CRC checked frames with sequence number, if the firmware supports it
+ERIE_CRC_FRAMING = config.getboolean('StationConfig', 'ERIE_CRC_FRAMING') \
+    if config.has_option('StationConfig', 'ERIE_CRC_FRAMING') else True
+# frames kept per board for the dump on failure, and binary trace files
+ERIE_TRACE_FRAMES = config.getint('StationConfig', 'ERIE_TRACE_FRAMES') \
+    if config.has_option('StationConfig', 'ERIE_TRACE_FRAMES') else 64
+ERIE_TRACE_DIR = config.get('StationConfig', 'ERIE_TRACE_DIR') \
+    if config.has_option('StationConfig', 'ERIE_TRACE_DIR') else ""
+
 ERIE_RES_CONF_NO1 = ast.literal_eval(config.get('StationConfig', 'ERIE_RES_CONF_NO1'))
 ERIE_RES_CONF_NO2 = ast.literal_eval(config.get('StationConfig', 'ERIE_RES_CONF_NO2'))
 ERIE_RES_CONF_NO3 = ast.literal_eval(config.get('StationConfig', 'ERIE_RES_CONF_NO3'))
@@ -61,6 +86,12 @@ CYCLE_INTERVAL = config.getint('StationConfig', 'CYCLE_INTERVAL')
 
 HOLD_EN = config.getboolean('StationConfig', 'HOLD_EN')
 HOLD_TIME = config.getint('StationConfig', 'HOLD_TIME')
+# each DUT starts its next test phase as soon as its own phase is done
+SLOT_FLOW = config.getboolean('StationConfig', 'SLOT_FLOW') \
+    if config.has_option('StationConfig', 'SLOT_FLOW') else True
+# a slot done is loaded again by start while the other slots are testing
+CONTINUOUS_FLOW = config.getboolean('StationConfig', 'CONTINUOUS_FLOW') \
+    if config.has_option('StationConfig', 'CONTINUOUS_FLOW') else False
 
 # Result Database
 RESULT_DB = "./db/pgem.db"
@@ -71,6 +102,9 @@ CONFIG_DB = "./db/pgem_config.db"
 # Location to save xml log
 RESULT_LOG = "./logs/"
 
+# Location to save VPD dump files
+VPD_DUMP = "./vpd/"
+
 # Configuration files to synchronize
 CONFIG_FILE = "./xml/"
 
@@ -1,2 +1,3 @@
 from pyaardvark import Adapter
 from pyaardvark import USBI2CAdapterException
+from pyaardvark import SlotUnreachable
@@ -8,21 +8,87 @@ And rewrite the I2C part of original API aardvark_py.py
 
 __version__ = "1.1.0"
 __author__ = "@dqli"
-__all__ = ["Adapter"]
+__all__ = ["Adapter", "SlotHealth"]
 
 import time
 import logging
+import threading
 from array import array
+from collections import deque
+from UFT.devices import erie_io
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_REG_VAL = 0xFF
 
+# retry policy of an IIC access, per channel and slave address
+RETRY_MAX = 2           # retries of a healthy slot
+BACKOFF_MIN = 100       # ms before the first retry, doubled on each retry
+BACKOFF_MAX = 800       # ms
+BACKOFF_STEP = 10       # ms, the urgent requests are served as often
+ERROR_WINDOW = 32       # last accesses the error rate is taken over
+ERROR_RATE_HIGH = 0.25  # above it, one retry only, after a longer wait
+# consecutive failed accesses (after their retries) which make the slot
+# unreachable, its accesses fail at once from then on
+BREAKER_FAILURES = 3
+
 
 class USBI2CAdapterException(Exception):
     pass
 
 
+class SlotUnreachable(USBI2CAdapterException):
+    """the slot failed too often, the access was not even tried.
+    """
+    pass
+
+
+class SlotHealth(object):
+    """error rate and circuit breaker of one channel and slave address.
+    """
+
+    def __init__(self):
+        self.accesses = 0
+        self.errors = 0
+        self.retries = 0
+        self.consecutive = 0
+        self.unreachable = False
+        self.history = deque(maxlen=ERROR_WINDOW)
+
+    def record(self, ok):
+        """result of an access, after its retries.
+        :return: True if the slot just became unreachable.
+        """
+        self.accesses += 1
+        self.history.append(ok)
+        if ok:
+            self.consecutive = 0
+            return False
+        self.errors += 1
+        self.consecutive += 1
+        if not self.unreachable and self.consecutive >= BREAKER_FAILURES:
+            self.unreachable = True
+            return True
+        return False
+
+    def error_rate(self):
+        """failed accesses of the last ERROR_WINDOW ones.
+        """
+        if not self.history:
+            return 0.0
+        return float(self.history.count(False)) / len(self.history)
+
+    def max_retries(self):
+        return 1 if self.error_rate() > ERROR_RATE_HIGH else RETRY_MAX
+
+    def backoff(self, attempt):
+        """ms to wait before retry attempt, 0 for the first retry.
+        """
+        if self.error_rate() > ERROR_RATE_HIGH:
+            attempt += 1
+        return min(BACKOFF_MAX, BACKOFF_MIN << attempt)
+
+
 def raise_i2c_ex():
     raise USBI2CAdapterException("IIC access wrong")
 
@@ -55,12 +121,29 @@ class Adapter(object):
     '''USB-I2C Aapter API Class
     '''
 
-    OccupyPort = 0
-    slave_addr = 0
-
     def __init__(self, device):
         self.device = device
-        pass
+        # SlotHealth by (channel, slave address)
+        self.slots = {}
+        # channel and slave address selected per thread, the requests run
+        # by the erie worker do not change the selection of the channel
+        self._selection = threading.local()
+
+    @property
+    def OccupyPort(self):
+        return getattr(self._selection, "port", 0)
+
+    @OccupyPort.setter
+    def OccupyPort(self, chnum):
+        self._selection.port = chnum
+
+    @property
+    def slave_addr(self):
+        return getattr(self._selection, "slave_addr", 0)
+
+    @slave_addr.setter
+    def slave_addr(self, addr):
+        self._selection.slave_addr = addr
 
     def __del__(self):
         pass
@@ -68,6 +151,69 @@ class Adapter(object):
     def select_channel(self, chnum):
         self.OccupyPort = chnum
 
+    def health(self, chnum, slave_addr=0x14):
+        '''
+        error rate and circuit breaker of a channel and slave address
+        :return: SlotHealth
+        '''
+        key = (chnum, slave_addr)
+        health = self.slots.get(key)
+        if health is None:
+            health = self.slots[key] = SlotHealth()
+        return health
+
+    def is_reachable(self, chnum, slave_addr=0x14):
+        '''
+        False once the circuit breaker of the slot opened
+        '''
+        health = self.slots.get((chnum, slave_addr))
+        return health is None or not health.unreachable
+
+    def reset_health(self, chnum=None):
+        '''
+        forget the failures of a channel, of all if chnum is None, e.g.
+        when the DUT is powered on again
+        '''
+        for key in self.slots.keys():
+            if chnum is None or key[0] == chnum:
+                del self.slots[key]
+
+    def _unreachable(self, port, slave_addr):
+        self.device.stats.count_shared("unreachable")
+        return SlotUnreachable("IIC slot {0} address 0x{1:02x} is "
+                               "unreachable".format(port, slave_addr))
+
+    def _failed(self, health, port, slave_addr):
+        if health.record(False):
+            logger.info("    IIC slot {0} address 0x{1:02x} unreachable "
+                        "after {2} failures".format(port, slave_addr,
+                                                    health.consecutive))
+
+    def _access(self, port, slave_addr, func, *args):
+        '''
+        Run one IIC access with the retry policy and the circuit breaker of
+        the slot, an unreachable slot fails without bus access.
+        '''
+        health = self.health(port, slave_addr)
+        if health.unreachable:
+            raise self._unreachable(port, slave_addr)
+        attempt = 0
+        while True:
+            try:
+                ret = func(*args)
+            except USBI2CAdapterException:
+                if attempt >= health.max_retries():
+                    self._failed(health, port, slave_addr)
+                    raise
+                logger.info("    IIC error occur, retrying...   ")
+                self.device.stats.count_shared("retries")
+                health.retries += 1
+                self._backoff(health.backoff(attempt))
+                attempt += 1
+                continue
+            health.record(True)
+            return ret
+
     def write(self, wata):
         '''write ata to slave address
         ata can be byte or array of byte
@@ -115,12 +261,7 @@ class Adapter(object):
             ata_out = [reg_addr] + wata
         else:
             raise TypeError("i2c ata to be written is not valid")
-        try:
-            self.write(ata_out)
-        except USBI2CAdapterException:
-            logger.info("    IIC error occur, retrying...   ")
-            self.sleep(200)
-            self.write(ata_out)
+        self._access(self.OccupyPort, self.slave_addr, self.write, ata_out)
 
     def read_reg(self, reg_addr, length=1):
         '''
@@ -129,23 +270,130 @@ class Adapter(object):
         :rtype : object
         reg_addr: register address offset
         '''
-        val = DEFAULT_REG_VAL
-        #self.write(reg_addr)
+        return self._read_reg_at(self.OccupyPort, self.slave_addr,
+                                 reg_addr, length)
 
-        # read register ata
-        try:
-            val = self.read(reg_addr, length)
-        except USBI2CAdapterException:
+    def run_sequence(self, ops):
+        '''
+        Run register writes and reads on current channel and slave address
+        back to back.
+        ops: list of (reg_addr, wata) to write, (reg_addr, None) to read,
+             (None, ms) to wait ms milliseconds before the next access
+        :return: list of the values read
+        '''
+        return self._access(self.OccupyPort, self.slave_addr,
+                            self.device.iic_sequence, self.OccupyPort,
+                            self.slave_addr, ops)
+
+    def run_sequences(self, jobs):
+        '''
+        Run register sequences of several channels interleaved, on current
+        slave address.
+        jobs: list of (channel, ops), ops as run_sequence
+        :return: list of the values read per job, or the exception
+        '''
+        address = self.slave_addr
+        results = [None] * len(jobs)
+        todo = []
+        for i, (port, ops) in enumerate(jobs):
+            if self.is_reachable(port, address):
+                todo.append(i)
+            else:
+                results[i] = self._unreachable(port, address)
+        attempt = 0
+        while todo:
+            rets = self.device.iic_sequence_many(
+                [(jobs[i][0], address, jobs[i][1]) for i in todo],
+                pause=self._pause)
+            failed = []
+            for i, ret in zip(todo, rets):
+                health = self.health(jobs[i][0], address)
+                results[i] = ret
+                if not isinstance(ret, USBI2CAdapterException):
+                    health.record(True)
+                elif attempt >= health.max_retries():
+                    self._failed(health, jobs[i][0], address)
+                else:
+                    health.retries += 1
+                    failed.append(i)
+            if not failed:
+                break
             logger.info("    IIC error occur, retrying...   ")
-            self.sleep(200)
-            val = DEFAULT_REG_VAL
-            val = self.read(reg_addr, length)
-        return val
+            self.device.stats.count_shared("retries", len(failed))
+            wait = max(self.health(jobs[i][0], address).backoff(attempt)
+                       for i in failed)
+            self._backoff(wait)
+            todo = failed
+            attempt += 1
+        return results
+
+    def _pause(self):
+        '''
+        Let the urgent requests to the board run between two batches of
+        frames of a long sequence, the selection is kept.
+        '''
+        port, address = self.OccupyPort, self.slave_addr
+        erie_io.serve_urgent(self.device)
+        self.OccupyPort, self.slave_addr = port, address
+
+    def _backoff(self, ms):
+        '''
+        Wait ms milliseconds before a retry, the urgent requests to the
+        board run meanwhile instead of waiting behind the backoff.
+        '''
+        until = self.time() + ms * 0.001
+        while True:
+            self._pause()
+            left = (until - self.time()) * 1000
+            if left <= 0:
+                break
+            self.sleep(min(left, BACKOFF_STEP))
+
+    def probe(self, targets, reg_addr=0x00):
+        '''
+        Check which slave addresses answer, one register read of every
+        target in one batch, without retry nor health record.
+        targets: list of (channel, slave_addr)
+        :return: list of bool, True if the target answered
+        '''
+        return [val is not None for val in self.poll(targets, reg_addr)]
+
+    def poll(self, targets, reg_addr):
+        '''
+        Read one register of every target in one batch, without retry nor
+        health record, e.g. of DUTs still booting.
+        targets: list of (channel, slave_addr)
+        :return: list of the values read, None if the target did not answer
+        '''
+        rets = self.device.iic_sequence_many(
+            [(port, address, [(reg_addr, None)])
+             for port, address in targets])
+        return [None if isinstance(ret, Exception) else ret[0]
+                for ret in rets]
+
+    def read_reg_async(self, reg_addr, length=1):
+        '''
+        Queue a register read on current channel and slave address.
+        :return: future of the read_reg result
+        '''
+        return erie_io.submit(self.device, self._read_reg_at,
+                              self.OccupyPort, self.slave_addr,
+                              reg_addr, length)
+
+    def _read_reg_at(self, port, slave_addr, reg_addr, length):
+        # read register ata
+        return self._access(port, slave_addr, self.device.iic_read, port,
+                            slave_addr, length, [reg_addr])
 
     def sleep(self, ms):
         '''sleep for specified number of milliseconds
         '''
-        time.sleep(ms*0.001)
+        self.device.clock.sleep(ms*0.001)
+
+    def time(self):
+        '''current time in seconds of the board clock
+        '''
+        return self.device.clock.time()
 
 
 if __name__ == "__main__":
@@ -8,14 +8,165 @@ __author__ = 'dqli'
 __all__ = ["erie"]
 
 import serial, time
+import os
 import logging
-from UFT.devices import aardvark
+from UFT.devices import aardvark, erie_trace, erie_stats
 from UFT.config import ERIE_DEBUG_INFOR, ERIE_RES_CONF_NO1, ERIE_RES_CONF_NO2, ERIE_RES_CONF_NO3, ERIE_RES_CONF_NO4
+from UFT.config import ERIE_CRC_FRAMING, ERIE_TRACE_FRAMES, ERIE_TRACE_DIR
 
 logger = logging.getLogger(__name__)
 debugOut = ERIE_DEBUG_INFOR
 Group = 0
 FirmwareVersion = [1, 3]
+FRAME_HEADER_LEN = 6
+FRAME_MAX_DATALEN = 0x200
+
+# command codes of Erie UART protocol
+CMD_SET_PRO_TYPE = 0x00
+CMD_IIC_READ = 0x01
+CMD_IIC_WRITE = 0x02
+CMD_PRESENT_PIN = 0x03
+CMD_GTG_PIN = 0x04
+CMD_OUTPUT_ON = 0x05
+CMD_OUTPUT_OFF = 0x06
+CMD_OUTPUT_STATUS = 0x07
+CMD_LED_ON = 0x08
+CMD_LED_OFF = 0x09
+CMD_INPUT_ON = 0x0A
+CMD_INPUT_OFF = 0x0B
+CMD_FIRMWARE_VERSION = 0x0C
+CMD_RESET_DUT = 0x0D
+CMD_SHUTDOWN_DUT = 0x0E
+# longest time the board takes to answer reset / shutdown, in seconds
+RESET_TIMEOUT = 8.0
+SHUTDOWN_TIMEOUT = 6.0
+# block I2C read, firmware v1.4 and later, older firmware does not answer.
+#   request data:  [slave address, register, length]
+#   response data: [status, length bytes from register onwards]
+CMD_IIC_READ_BLOCK = 0x10
+IIC_BLOCK_MAX = 32
+# register accesses of one port sent back to back by iic_sequence
+IIC_SEQUENCE_MAX = 32
+# frames in flight of one transact_many batch, the sequence number of the
+# checked framing has to be unique among them
+TRANSACT_MAX = 128
+# status of all ports, firmware v1.4 and later.
+#   request data:  none
+#   response data: [status, present pin, GTG pin, output status], each a
+#                  16 bits bitmap, low byte first, bit n for port n, raw
+#                  levels as in the single port commands 0x03/0x04/0x07.
+CMD_PORT_STATUS_ALL = 0x11
+PORT_STATUS_TTL = 0.2
+PORT_NUM = 16
+# checked framing, firmware v1.4 and later.
+#   request data:  [0x01] on, [0x00] off
+# the response is sent in the former framing, afterwards every frame in
+# both directions carries a trailer after the data:
+#   [sequence number, CRC low, CRC high]
+# CRC-16/CCITT (0x1021, init 0xFFFF) over header, data and sequence number.
+# datalen does not count the trailer. The response echoes the sequence
+# number of its request, the response of CMD_FRAMING itself uses the
+# framing of its request. The board starts in the former framing.
+CMD_FRAMING = 0x12
+FRAME_TRAILER_LEN = 3
+
+# commands after which the cached port status is out of date
+STATE_CMDS = (CMD_OUTPUT_ON, CMD_OUTPUT_OFF, CMD_INPUT_ON, CMD_INPUT_OFF,
+              CMD_RESET_DUT, CMD_SHUTDOWN_DUT)
+
+
+def _crc16_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for j in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return table
+
+CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc=0xFFFF):
+    """CRC-16/CCITT of data, bytearray or str.
+    """
+    table = CRC16_TABLE
+    for b in bytearray(data):
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+
+class Frame(object):
+    """One response frame received from Erie board.
+    The frame lives in a preallocated bytearray, frame[i] returns the i-th
+    byte as int like the former list buffer did, payload and data are
+    memoryview slices of the same buffer, no copy is made.
+    """
+    __slots__ = ["raw", "view", "seq"]
+
+    def __init__(self, raw, seq=None):
+        self.raw = raw
+        self.view = memoryview(raw)
+        # sequence number in checked framing, None otherwise
+        self.seq = seq
+
+    def __getitem__(self, idx):
+        return self.raw[idx]
+
+    def __len__(self):
+        return len(self.raw)
+
+    @property
+    def cmd(self):
+        return self.raw[2]
+
+    @property
+    def port(self):
+        return self.raw[3]
+
+    @property
+    def datalen(self):
+        return (self.raw[5] << 8) | self.raw[4]
+
+    @property
+    def status(self):
+        return self.raw[6]
+
+    @property
+    def payload(self):
+        return self.view[FRAME_HEADER_LEN:]
+
+    @property
+    def data(self):
+        return self.view[FRAME_HEADER_LEN + 1:]
+
+
+class PortStatus(object):
+    """pin status of all ports read at the same time, bit n for port n.
+    present is set when a DUT is connected (present pin is active low).
+    known has the bits of the ports read, all but on old firmware.
+    """
+    __slots__ = ["present", "gtg", "output", "time", "known"]
+
+    def __init__(self, present, gtg, output, time, known=0xFFFF):
+        self.present = present
+        self.gtg = gtg
+        self.output = output
+        self.time = time
+        self.known = known
+
+    def covers(self, ports):
+        return all((self.known >> (port + Group * 4)) & 0x01
+                   for port in ports)
+
+    def is_present(self, port):
+        return bool((self.present >> (port + Group * 4)) & 0x01)
+
+    def is_gtg(self, port):
+        return bool((self.gtg >> (port + Group * 4)) & 0x01)
+
+    def is_output_on(self, port):
+        return bool((self.output >> (port + Group * 4)) & 0x01)
 
 
 class Erie(object):
@@ -30,23 +181,65 @@ class Erie(object):
         bytesize = kvargs.get('bytesize', serial.EIGHTBITS)
         stopbits = kvargs.get('stopbits', serial.STOPBITS_ONE)
         self.boardid = kvargs.get('boardid', 1)
-        try:
-            self.ser = serial.Serial(port=port, baudrate=baudrate,
-                                     timeout=timeout, bytesize=bytesize,
-                                     parity=parity, stopbits=stopbits)
-        except Exception:
-            raise Exception("Couldn't open serial port {0} - Erie Board does NOT exist or the serial port config error!".format(port))
+        # time source, the time module or an accelerated simulation clock
+        self.clock = kvargs.get('clock', time)
+        # last frames for the dump on failure, and the optional trace file
+        trace_path = None
+        if ERIE_TRACE_DIR:
+            trace_path = os.path.join(ERIE_TRACE_DIR, "erie{0}_{1}.trc".format(
+                self.boardid, time.strftime("%Y%m%d%H%M%S")))
+        self.tracer = erie_trace.FrameTracer(self.boardid,
+                                             size=ERIE_TRACE_FRAMES,
+                                             path=trace_path,
+                                             clock=self.clock)
+        # an opened serial like object can be given instead of the port name
+        self.ser = kvargs.get('ser', None)
+        if self.ser is None:
+            try:
+                self.ser = serial.Serial(port=port, baudrate=baudrate,
+                                         timeout=timeout, bytesize=bytesize,
+                                         parity=parity, stopbits=stopbits)
+            except Exception:
+                raise Exception("Couldn't open serial port {0} - Erie Board does NOT exist or the serial port config error!".format(port))
+
+        # checked framing state, see CMD_FRAMING
+        self.crc_framing = False
+        self._seq = 0
+        self._expected = ()
+        self._rxbuf = bytearray()
+        # round trip latency and error counters
+        self.stats = erie_stats.ErieStats()
+        self._inflight = None
+        # wire time of one byte, 8N1, for the send time of batched frames
+        self.byte_time = 10.0 / getattr(self.ser, "baudrate", baudrate)
 
         if not self.ser.isOpen():
             self.ser.open()
             self._cleanbuffer_()
 
-        if not self.GetFirmwareVersion():
+        try:
+            version_ok = self.GetFirmwareVersion()
+        except Exception:
+            if not ERIE_CRC_FRAMING:
+                raise
+            # the board is still in checked framing from the last run
+            self.crc_framing = True
+            version_ok = self.GetFirmwareVersion()
+        if not version_ok:
             raise Exception("Wrong Erie firmware version, should be: v" + str(FirmwareVersion[0]) + "." + str(FirmwareVersion[1]))
 
+        # capability of the firmware, fallback to the v1.3 commands without
+        self.block_read, self.status_all, crc = self._probe_capabilities_()
+        self.crc_framing = crc
+        logger.info("Erie board {0} block IIC read: {1} port status: {2} "
+                    "CRC framing: {3}".format(self.boardid, self.block_read,
+                                              self.status_all, crc))
+        self._port_status = None
+
 
     def __del__(self):
         self.ser.close()
+        self.tracer.close()
 
 
     def _logging_(self, info):
@@ -54,23 +247,36 @@ class Erie(object):
             logger.info(info)
 
     def _displaylanguage_(self, content):
-        display = "  transfering language: "
-        for c in content:
-            tmp = ord(c)
-            display += "%x " % tmp
-        self._logging_(display)
+        if debugOut == True:
+            logger.info("  transfering language: " +
+                        erie_trace.format_frame(content))
+
+    def _sent_(self, content):
+        self.LastSending = content
+        self.tracer.record(erie_trace.TX, content)
+        self._displaylanguage_(content)
+
+    def _received_(self, content):
+        self.LastReceiving = content
+        self.tracer.record(erie_trace.RX, content)
+        self._displaylanguage_(content)
 
     def _erroroutinfor_(self):
-        display = "  last sending command : "
-        for c in self.LastSending:
-            tmp = ord(c)
-            display += "%x " % tmp
-        logger.info(display)
-        display = "  last receiving data : "
-        for c in self.LastReceiving:
-            tmp = ord(c)
-            display += "%x " % tmp
-        logger.info(display)
+        logger.info("  last sending command : " +
+                    erie_trace.format_frame(self.LastSending))
+        logger.info("  last receiving data : " +
+                    erie_trace.format_frame(self.LastReceiving))
+        self.tracer.dump()
+
+    def _commfailure_(self, iic=False):
+        """dump the last frames, and return the exception to raise.
+        """
+        self.tracer.dump()
+        self.stats.count("failures")
+        if iic:
+            return aardvark.USBI2CAdapterException(
+                "UART communication failure")
+        return Exception("UART communication failure")
 
     def GetFirmwareVersion(self):
         self._logging_("Get firmware version")
@@ -79,7 +285,7 @@ class Erie(object):
         self._transfercommand_(0x00, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x0C or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
         BoardFirmwareVersion = float(str(ret[7]) + '.' + str(ret[8]))
         if StartFirmwareVersion > BoardFirmwareVersion:
             return False
@@ -91,7 +297,7 @@ class Erie(object):
         self._transfercommand_(port, cmd, 0x01, [type])
         ret = self._receiveresult_()
         if ret[2] != 0x00 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
 
     def InputOn(self, port, loadmode):
         self._logging_("checking power on")
@@ -108,7 +314,7 @@ class Erie(object):
 
         ret = self._receiveresult_()
         if ret[2] != 0x0A or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
 
     def _load_config_resistor(self, port):
         rtn=[]
@@ -132,7 +338,7 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x0B or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
 
     def OutputOn(self, port):
         self._logging_("set power on")
@@ -140,7 +346,7 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x05 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
 
     def OutputOff(self, port):
         self._logging_("set power off")
@@ -148,7 +354,7 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x06 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
 
     def isOutputOn(self, port):
         self._logging_("Get power output Status")
@@ -156,7 +362,7 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x07 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
         if ret[7] == 0:
             return False
         else:
@@ -168,7 +374,7 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x08 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
 
     def LedOff(self, port):
         self._logging_("set LED off")
@@ -176,25 +382,51 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x09 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
-
-    def ResetDUT(self, port):
+            raise self._commfailure_()
+
+    def ResetDUT(self, port, timeout=RESET_TIMEOUT):
+        """reset DUT, returns as soon as the board answers the completion.
+        The DUT may still be booting then, wait for its hardware ready
+        before accessing it.
+        :param timeout: seconds to wait for the completion at most.
+        """
         self._logging_("reset DUT")
         cmd = 0x0d
         self._transfercommand_(port, cmd)
-        time.sleep(5)
-        ret = self._receiveresult_()
+        ret = self._receiveresult_(self.clock.time() + timeout)
         if ret[2] != 0x0d or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
 
-    def ShutdownDUT(self, port):
+    def ShutdownDUT(self, port, timeout=SHUTDOWN_TIMEOUT):
+        """shutdown DUT, returns as soon as the board answers the completion.
+        The DUT may still answer for a while, until it stops answering IIC.
+        :param timeout: seconds to wait for the completion at most.
+        """
         self._logging_("shutdown DUT")
         cmd = 0x0e
         self._transfercommand_(port, cmd)
-        time.sleep(3)
-        ret = self._receiveresult_()
+        ret = self._receiveresult_(self.clock.time() + timeout)
         if ret[2] != 0x0e or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
+
+    def ResetDUTs(self, ports, timeout=RESET_TIMEOUT):
+        """reset DUTs on several ports, the commands are sent at once and
+        the completions are collected as they arrive, see ResetDUT.
+        :param timeout: seconds to wait for the next completion at most.
+        :return: list of None, or the exception for a failed port.
+        """
+        self._logging_("reset DUTs")
+        rets = self.transact_many([(port, CMD_RESET_DUT) for port in ports],
+                                  timeout=timeout)
+        return [ret if isinstance(ret, Exception) else None for ret in rets]
+
+    def ShutdownDUTs(self, ports, timeout=SHUTDOWN_TIMEOUT):
+        """shutdown DUTs on several ports, see ResetDUTs.
+        """
+        self._logging_("shutdown DUTs")
+        rets = self.transact_many([(port, CMD_SHUTDOWN_DUT)
+                                   for port in ports], timeout=timeout)
+        return [ret if isinstance(ret, Exception) else None for ret in rets]
 
     def GetPresentPin(self, port):
         self._logging_("Get Present Pin Status")
@@ -202,7 +434,7 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x03 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
         if ret[7] == 0:
             return True
         else:
@@ -214,7 +446,7 @@ class Erie(object):
         self._transfercommand_(port, cmd)
         ret = self._receiveresult_()
         if ret[2] != 0x04 or ret[6] != 0x00:
-            raise Exception("UART communication failure")
+            raise self._commfailure_()
         if ret[7] == 1:
             return True
         else:
@@ -228,69 +460,495 @@ class Erie(object):
         self._transfercommand_(port, cmd, 0x03, [address] + data)
         ret = self._receiveresult_()
         if ret[2] != 0x02 or ret[6] != 0x00:
-            raise aardvark.USBI2CAdapterException("UART communication failure")
+            raise self._commfailure_(iic=True)
         return 0
 
     def iic_read(self, port, address, length, data):
-        if length != 1:
+        if length < 1:
             raise Exception("IIC length does not support")
+        if length > 1:
+            if self.block_read:
+                return self.iic_read_block(port, address, length, data)
+            return self._iic_read_split_(port, address, length, data)
         val = []
         self._logging_("read IIC data")
         cmd = 0x01
         self._transfercommand_(port, cmd, 0x02, [address] + data)
         ret = self._receiveresult_()
         if ret[2] != 0x01 or ret[6] != 0x00:
-            raise aardvark.USBI2CAdapterException("UART communication failure")
+            raise self._commfailure_(iic=True)
         val.append(ret[7])
         return val
 
+    def iic_read_block(self, port, address, length, data):
+        """read length bytes from register data[0] onwards in one frame,
+        needs firmware with block IIC read.
+        """
+        if length > IIC_BLOCK_MAX:
+            val = []
+            for i in range(0, length, IIC_BLOCK_MAX):
+                val += self.iic_read_block(port, address,
+                                           min(IIC_BLOCK_MAX, length - i),
+                                           [data[0] + i])
+            return val
+        self._logging_("read IIC block data")
+        cmd = CMD_IIC_READ_BLOCK
+        self._transfercommand_(port, cmd, 0x03, [address, data[0], length])
+        ret = self._receiveresult_()
+        if ret[2] != cmd or ret[6] != 0x00 or len(ret) < 7 + length:
+            raise self._commfailure_(iic=True)
+        return list(ret[7:7 + length])
+
+    def iic_sequence(self, port, address, ops):
+        """register writes and reads of one slave sent back to back, the
+        board executes them in order.
+        :param ops: list of (register, value) to write, (register, None)
+                    to read, (None, ms) to wait ms milliseconds before the
+                    next access.
+        :return: list of the values read, in order.
+        """
+        ret = self.iic_sequence_many([(port, address, ops)])[0]
+        if isinstance(ret, Exception):
+            raise ret
+        return ret
+
+    def iic_sequence_many(self, jobs, pause=None):
+        """register sequences of several ports interleaved, so one batch
+        of frames serves all of them. The order within a port is kept. A
+        port which waits sits out the batches until its wait is over, the
+        other ports go on meanwhile.
+        :param jobs: list of (port, address, ops), ops as iic_sequence.
+        :param pause: function called between two batches of frames.
+        :return: list of the values read per job, or the exception if an
+                 access of the job failed.
+        """
+        self._logging_("IIC sequence of {0} ports".format(len(jobs)))
+        results = [[] for job in jobs]
+        done = [0] * len(jobs)
+        # clock time each job waits until
+        ready_at = [0.0] * len(jobs)
+        while True:
+            now = self.clock.time()
+            chunks, waits = [], []
+            for j, (port, address, ops) in enumerate(jobs):
+                chunk, wait = [], None
+                if not isinstance(results[j], Exception) and \
+                        ready_at[j] <= now:
+                    while done[j] < len(ops) and \
+                            len(chunk) < IIC_SEQUENCE_MAX:
+                        reg, data = ops[done[j]]
+                        done[j] += 1
+                        if reg is None:
+                            wait = data
+                            break
+                        chunk.append((reg, data))
+                chunks.append(chunk)
+                waits.append(wait)
+            # one frame of each port in turn
+            commands, owners = [], []
+            for k in range(max(len(chunk) for chunk in chunks)):
+                for j, chunk in enumerate(chunks):
+                    if k >= len(chunk):
+                        continue
+                    port, address = jobs[j][0], jobs[j][1]
+                    reg, data = chunk[k]
+                    if data is None:
+                        commands.append((port, CMD_IIC_READ, [address, reg]))
+                    else:
+                        commands.append((port, CMD_IIC_WRITE,
+                                         [address, reg, data & 0xFF]))
+                    owners.append((j, data is None))
+            if commands:
+                rets = self.transact_many(commands)
+                for (j, read), ret in zip(owners, rets):
+                    if isinstance(results[j], Exception):
+                        continue
+                    if isinstance(ret, Exception):
+                        results[j] = self._commfailure_(iic=True)
+                    elif read:
+                        results[j].append(ret[7])
+            end = self.clock.time()
+            for j, wait in enumerate(waits):
+                if wait is not None:
+                    ready_at[j] = end + wait / 1000.0
+            left = [ready_at[j] for j, (port, address, ops) in enumerate(jobs)
+                    if not isinstance(results[j], Exception) and
+                    (done[j] < len(ops) or ready_at[j] > end)]
+            if not left:
+                return results
+            if pause is not None:
+                pause()
+            delay = min(left) - self.clock.time()
+            if delay > 0:
+                self.clock.sleep(delay)
+
+    def _iic_read_split_(self, port, address, length, data):
+        """block read for old firmware, one single byte read per register,
+        the frames are sent back to back.
+        """
+        self._logging_("read IIC data by single bytes")
+        commands = [(port, CMD_IIC_READ, [address, data[0] + i])
+                    for i in range(length)]
+        val = []
+        for ret in self.transact_many(commands):
+            if isinstance(ret, Exception):
+                raise self._commfailure_(iic=True)
+            val.append(ret[7])
+        return val
+
+    def _probe_capabilities_(self):
+        """check which of the v1.4 commands the firmware answers, old
+        firmware does not answer unknown commands and the probe times out.
+        an IIC failure of the block read if no DUT is on port 0 still
+        proves the support. The checked framing is switched on last, if
+        enabled in station config.
+        :return: (block IIC read, all ports status, checked framing)
+        """
+        commands = [(0x00, CMD_IIC_READ_BLOCK, [0x14, 0x20, 0x01]),
+                    (0x00, CMD_PORT_STATUS_ALL)]
+        if ERIE_CRC_FRAMING:
+            commands.append((0x00, CMD_FRAMING, [0x01]))
+        rets = self.transact_many(commands)
+        silent = [isinstance(ret, Exception) and
+                  str(ret) == "Hardware is NOT ready" for ret in rets]
+        if any(silent):
+            self._cleanbuffer_()
+        crc = ERIE_CRC_FRAMING and not isinstance(rets[2], Exception)
+        return not silent[0], not silent[1], crc
+
+    def GetPortStatusAll(self, max_age=PORT_STATUS_TTL, ports=None):
+        """present, GTG and output status of all ports.
+        :param max_age: seconds, a cached status younger than this is
+                        returned without bus traffic.
+        :param ports: ports the caller looks at, all if None. Old firmware
+                      has no all ports command, only these are read there,
+                      3 frames per port.
+        :return: PortStatus
+        """
+        now = self.clock.time()
+        if ports is None:
+            ports = range(PORT_NUM)
+        cached = self._port_status
+        if cached is not None and now - cached.time > max_age:
+            cached = None
+        if cached is not None and cached.covers(ports):
+            return cached
+        if self.status_all:
+            self._logging_("Get all ports status")
+            cmd = CMD_PORT_STATUS_ALL
+            self._transfercommand_(0x00, cmd)
+            ret = self._receiveresult_()
+            if ret[2] != cmd or ret[6] != 0x00 or len(ret) < 13:
+                raise self._commfailure_()
+            present = ~(ret[7] | (ret[8] << 8)) & 0xFFFF
+            gtg = ret[9] | (ret[10] << 8)
+            output = ret[11] | (ret[12] << 8)
+            self._port_status = PortStatus(present, gtg, output, now)
+            return self._port_status
+        # old firmware, the bitmaps of the ports asked from the single port
+        # reads, added to the ports still cached
+        commands = []
+        for port in ports:
+            commands += [(port, CMD_PRESENT_PIN), (port, CMD_GTG_PIN),
+                         (port, CMD_OUTPUT_STATUS)]
+        rets = self.transact_many(commands)
+        if cached is None:
+            cached = PortStatus(0, 0, 0, now, known=0)
+        present, gtg, output = cached.present, cached.gtg, cached.output
+        known = cached.known
+        for i, port in enumerate(ports):
+            pin, gtg_pin, out = rets[i * 3:i * 3 + 3]
+            for ret in (pin, gtg_pin, out):
+                if isinstance(ret, Exception):
+                    raise ret
+            bit = 1 << (port + Group * 4)
+            present &= ~bit
+            gtg &= ~bit
+            output &= ~bit
+            if pin[7] == 0:
+                present |= bit
+            if gtg_pin[7] == 1:
+                gtg |= bit
+            if out[7] != 0:
+                output |= bit
+            known |= bit
+        # as old as its oldest port
+        self._port_status = PortStatus(present, gtg, output, cached.time,
+                                       known)
+        return self._port_status
+
     def _cleanbuffer_(self):
         self.ser.flushInput()
         self.ser.flushOutput()
 
-    def _transfercommand_(self, port, cmd, datalen = 0, data = None):
+    def _buildcommand_(self, port, cmd, datalen=0, data=None):
         port += Group * 4
-        header0 = 0x55
-        header1 = 0x77
-        content = chr(header0) + chr(header1) + chr(cmd) + chr(port)
-        content += chr(datalen & 0xFF)
-        content += chr((datalen >> 8) & 0xFF)
-
+        content = bytearray((0x55, 0x77, cmd, port,
+                             datalen & 0xFF, (datalen >> 8) & 0xFF))
         if (datalen != 0) and (data is not None):
-            for d in data:
-                content += chr(d)
+            content.extend(data)
+        return str(content)
 
-        self.LastSending = content
-        self._displaylanguage_(content)
-        self._cleanbuffer_()
+    def _nextseq_(self):
+        self._seq = (self._seq + 1) & 0xFF
+        return self._seq
+
+    def _addtrailer_(self, content, seq):
+        content += chr(seq)
+        crc = crc16(content)
+        return content + chr(crc & 0xFF) + chr(crc >> 8)
+
+    def _transfercommand_(self, port, cmd, datalen = 0, data = None):
+        content = self._buildcommand_(port, cmd, datalen, data)
+        if cmd in STATE_CMDS:
+            self._port_status = None
+
+        if self.crc_framing:
+            # stale responses are dropped by sequence number, no flush
+            seq = self._nextseq_()
+            content = self._addtrailer_(content, seq)
+            self._expected = (seq,)
+        self._sent_(content)
+        if not self.crc_framing:
+            self._cleanbuffer_()
+        self._inflight = (cmd, port + Group * 4, self.clock.time())
         self.ser.write(content)
 
-    def _receiveresult_(self):
-        buff = []
+    @staticmethod
+    def _failure_(cmd):
+        if cmd in (CMD_IIC_READ, CMD_IIC_WRITE):
+            return aardvark.USBI2CAdapterException("UART communication failure")
+        return Exception("UART communication failure")
+
+    def transact_many(self, commands, timeout=None):
+        """write a batch of command frames back to back, then collect the
+        responses and match them to the requests by command code and port.
+        :param commands: list of (port, cmd) or (port, cmd, data) tuples.
+        :param timeout: seconds to wait for the next response at most, for
+                        slow commands, the serial timeout if None.
+        :return: list in the same order as commands, the response Frame for
+                 a successful command, or the exception for a failed one.
+        The latency of each command is recorded from the time its frame is
+        out on the wire, not from the start of the batch.
+        """
+        if not commands:
+            return []
+        if len(commands) > TRANSACT_MAX:
+            results = []
+            for i in range(0, len(commands), TRANSACT_MAX):
+                results += self.transact_many(commands[i:i + TRANSACT_MAX],
+                                              timeout)
+            return results
+        results = [None] * len(commands)
+        pending = []
         content = ""
-        idx = 0
-        datalen = 255
-
-        while(datalen > 0):
-            tmp = self.ser.read(1)
-            if tmp == "":
+        # bytes up to the end of each frame
+        ends = []
+        crc_framing = self.crc_framing
+        for idx, command in enumerate(commands):
+            port, cmd = command[0], command[1]
+            data = command[2] if len(command) > 2 else None
+            datalen = len(data) if data else 0
+            frame = self._buildcommand_(port, cmd, datalen, data)
+            if crc_framing:
+                seq = self._nextseq_()
+                frame = self._addtrailer_(frame, seq)
+            else:
+                seq = None
+            content += frame
+            ends.append(len(content))
+            pending.append((idx, cmd, (port + Group * 4) & 0xFF, seq))
+            if cmd in STATE_CMDS:
+                self._port_status = None
+        if crc_framing:
+            self._expected = set(p[3] for p in pending)
+
+        self._sent_(content)
+        if not crc_framing:
+            self._cleanbuffer_()
+        self._inflight = None
+        start = self.clock.time()
+        self.ser.write(content)
+        sent = [start + end * self.byte_time for end in ends]
+
+        dropped = 0
+        while pending:
+            deadline = None
+            if timeout is not None:
+                deadline = self.clock.time() + timeout
+            try:
+                ret = self._receiveresult_(deadline)
+            except Exception as e:
+                # no more response, fail all the commands left
+                for idx, cmd, port, seq in pending:
+                    results[idx] = e
                 break
-            idx += 1
-            datalen -= 1
-            content += tmp
-            buff.append(ord(tmp))
-            if idx == 5:
-                datalenlow = tmp
-            if idx == 6:
-                datalenhigh = tmp
-                datalen = (ord(datalenhigh) * 256) + ord(datalenlow)
-
-        self.LastReceiving = content
-        self._displaylanguage_(content)
+            match = None
+            for i, (idx, cmd, port, seq) in enumerate(pending):
+                if ret.seq is not None:
+                    if seq == ret.seq:
+                        match = i
+                        break
+                elif cmd == ret.cmd and port == ret.port:
+                    match = i
+                    break
+            if match is None and ret.seq is None:
+                # port not echoed as expected, take the oldest same command
+                for i, (idx, cmd, port, seq) in enumerate(pending):
+                    if cmd == ret.cmd:
+                        match = i
+                        break
+            if match is None:
+                self._logging_("drop unexpected response of command 0x%x"
+                               % ret.cmd)
+                dropped += 1
+                if dropped > len(commands):
+                    # not the responses of this batch, give up
+                    for idx, cmd, port, seq in pending:
+                        results[idx] = self._failure_(cmd)
+                    break
+                continue
+            idx, cmd, port, seq = pending.pop(match)
+            self.stats.record(cmd, port, self.clock.time() - sent[idx])
+            if crc_framing:
+                self._expected.discard(seq)
+            if ret.status != 0x00:
+                self.stats.count("failures")
+                results[idx] = self._failure_(cmd)
+            else:
+                results[idx] = ret
+        return results
+
+    def _readserial_(self, size, deadline=None):
+        """read size bytes, keeps waiting after a serial timeout until the
+        deadline, if any.
+        """
+        data = self.ser.read(size)
+        while len(data) < size and deadline is not None and \
+                self.clock.time() < deadline:
+            data += self.ser.read(size - len(data))
+        return data
+
+    def _receiveresult_(self, deadline=None):
+        """receive one response frame from Erie board, and record the
+        round trip latency of the command sent last.
+        :param deadline: clock time to wait for the frame until, for slow
+                         commands, one serial timeout if None.
+        :return: Frame object, frame[i] is the i-th byte of the response.
+        """
+        inflight = self._inflight
+        self._inflight = None
+        if self.crc_framing:
+            ret = self._receivechecked_(deadline)
+        else:
+            ret = self._receiveframe_(deadline)
+        if inflight is not None:
+            self.stats.record(inflight[0], inflight[1],
+                              self.clock.time() - inflight[2])
+        return ret
+
+    def _receiveframe_(self, deadline=None):
+        """receive one frame in the former framing.
+        the 6 bytes header is read in one call, then the payload of datalen
+        bytes in a second call, into a preallocated bytearray.
+        """
+        header = self._readserial_(FRAME_HEADER_LEN, deadline)
+        if len(header) == FRAME_HEADER_LEN:
+            datalen = (ord(header[5]) << 8) | ord(header[4])
+        else:
+            datalen = 0
+        buff = bytearray(len(header) + datalen)
+        buff[0:len(header)] = header
+        if datalen > 0:
+            payload = self.ser.read(datalen)
+            buff[FRAME_HEADER_LEN:FRAME_HEADER_LEN + len(payload)] = payload
+            if len(payload) < datalen:
+                del buff[FRAME_HEADER_LEN + len(payload):]
+                self.stats.count("short_frames")
+
+        self._received_(buff)
         if len(buff) < 7:
+            self.stats.count("timeouts" if not header else "short_frames")
             self._erroroutinfor_()
             raise Exception("Hardware is NOT ready")
         if buff[0] != 0x55 or buff[1] != 0x77:
+            self.stats.count("bad_frames")
             self._erroroutinfor_()
-            raise Exception("UART communication failure")
-        return buff
+            raise self._commfailure_()
+        return Frame(buff)
+
+    def _fillbuffer_(self, size, deadline=None):
+        """read until the receive buffer holds size bytes.
+        :return: False on serial timeout, past the deadline if any.
+        """
+        while len(self._rxbuf) < size:
+            data = self._readserial_(size - len(self._rxbuf), deadline)
+            if not data:
+                return False
+            self._rxbuf += data
+        return True
+
+    def _desync_(self, skip):
+        """drop skip bytes of garbage or a corrupt frame, the scanner goes
+        on with the next 0x55 0x77 in the buffer.
+        """
+        self.stats.count("resyncs")
+        self._logging_("resync, drop {0} bytes".format(skip))
+        self.tracer.record(erie_trace.DROP, self._rxbuf[:skip])
+        del self._rxbuf[:skip]
+
+    def _receivechecked_(self, deadline=None):
+        """receive the next response frame with good CRC and an expected
+        sequence number, in checked framing. Garbage, corrupt frames and
+        stale responses are skipped, the buffers are only flushed if the
+        line stays silent.
+        :return: Frame object, without the trailer. The frames are traced
+                 as received, with the trailer.
+        """
+        buf = self._rxbuf
+        while True:
+            if not self._fillbuffer_(FRAME_HEADER_LEN, deadline):
+                break
+            start = buf.find("\x55\x77")
+            if start != 0:
+                if start < 0:
+                    # keep a trailing 0x55, might be the next header
+                    start = len(buf) - 1 if buf[-1] == 0x55 else len(buf)
+                self._desync_(start)
+                continue
+            datalen = (buf[5] << 8) | buf[4]
+            if datalen > FRAME_MAX_DATALEN:
+                self._desync_(2)
+                continue
+            total = FRAME_HEADER_LEN + datalen + FRAME_TRAILER_LEN
+            if not self._fillbuffer_(total):
+                break
+            crc = buf[total - 2] | (buf[total - 1] << 8)
+            if crc16(buf[:total - 2]) != crc:
+                self.stats.count("bad_frames")
+                self._desync_(2)
+                continue
+            seq = buf[total - 3]
+            raw = buf[:total]
+            del buf[:total]
+            self._received_(raw)
+            frame = raw[:total - FRAME_TRAILER_LEN]
+            if seq not in self._expected:
+                self.stats.count("stale")
+                self._logging_("drop stale response, sequence {0}".format(seq))
+                continue
+            if len(frame) < 7:
+                self.stats.count("short_frames")
+                self._erroroutinfor_()
+                raise self._commfailure_()
+            return Frame(frame, seq)
+
+        # line is silent, whatever is left is garbage
+        self.LastReceiving = bytearray(buf)
+        if buf:
+            self.tracer.record(erie_trace.DROP, self.LastReceiving)
+        del buf[:]
+        self.stats.count("timeouts")
+        self._cleanbuffer_()
+        self._erroroutinfor_()
+        raise Exception("Hardware is NOT ready")
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""erie_io.py: I/O worker for Erie board.
+One worker thread per board owns the Erie object and its serial port,
+requests from any thread go through a priority queue and return futures.
+"""
+
+__version__ = "0.0.1"
+__author__ = 'dqli'
+__all__ = ["ErieWorker", "Future", "submit", "call", "wait_all",
+           "serve_urgent"]
+
+import sys
+import itertools
+import threading
+import logging
+from Queue import PriorityQueue
+
+logger = logging.getLogger(__name__)
+
+# lower value goes first
+PRIORITY_SAFETY = 0         # load off, power off
+PRIORITY_NORMAL = 10
+PRIORITY_BACKGROUND = 20
+_PRIORITY_STOP = 100
+
+
+class Future(object):
+    """result of a request executed by the worker.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exc_info = None
+
+    def set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def set_exception(self, exc_info):
+        self._exc_info = exc_info
+        self._event.set()
+
+    def done(self):
+        return self._event.is_set()
+
+    def exception(self, timeout=None):
+        if not self._event.wait(timeout):
+            raise RuntimeError("Erie request timeout")
+        return self._exc_info[1] if self._exc_info else None
+
+    def result(self, timeout=None):
+        """wait for the request, raise its exception if it failed.
+        """
+        if not self._event.wait(timeout):
+            raise RuntimeError("Erie request timeout")
+        if self._exc_info:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        return self._result
+
+
+class ErieWorker(object):
+    """owns one Erie board, executes the requests one by one in its own
+    thread. Method calls on the worker are forwarded to the board and
+    wait for the result, so the worker is a drop-in device for Adapter,
+    PowerSupply and DCLoad.
+    """
+
+    def __init__(self, board, name=None):
+        self.board = board
+        self.queue = PriorityQueue()
+        self._seq = itertools.count()
+        # priority of the request running
+        self._running = PRIORITY_NORMAL
+        if name is None:
+            name = "ERIE_IO_{0}".format(board.boardid)
+        self.thread = threading.Thread(target=self._run, name=name)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __getattr__(self, name):
+        if name == "board":
+            raise AttributeError(name)
+        attr = getattr(self.board, name)
+        if not callable(attr):
+            return attr
+
+        def proxy(*args, **kvargs):
+            return self.call(name, *args, **kvargs)
+        return proxy
+
+    def submit(self, method, *args, **kvargs):
+        """queue a request.
+        :param method: name of the Erie method, or a callable which will be
+                       executed in the worker thread.
+        :param priority: keyword only, PRIORITY_SAFETY goes first.
+        :return: Future
+        """
+        priority = kvargs.pop("priority", PRIORITY_NORMAL)
+        future = Future()
+        if threading.current_thread() is self.thread:
+            # called from a request running in the worker, no queueing
+            self._execute(method, args, kvargs, future)
+        else:
+            self.queue.put((priority, next(self._seq), method, args, kvargs,
+                            future))
+        return future
+
+    def call(self, method, *args, **kvargs):
+        return self.submit(method, *args, **kvargs).result()
+
+    def serve_urgent(self):
+        """run the requests queued with a higher priority than the one
+        running, if called from a request executed by the worker. A long
+        request calls it between its batches of frames.
+        """
+        if threading.current_thread() is not self.thread:
+            return
+        running = self._running
+        while True:
+            with self.queue.mutex:
+                if not self.queue.queue or self.queue.queue[0][0] >= running:
+                    break
+            priority, seq, method, args, kvargs, future = self.queue.get()
+            self._running = priority
+            self._execute(method, args, kvargs, future)
+        self._running = running
+
+    def stop(self):
+        """stop the worker after the requests already queued.
+        """
+        self.queue.put((_PRIORITY_STOP, next(self._seq), None, None, None,
+                        None))
+
+    def _execute(self, method, args, kvargs, future):
+        try:
+            if not callable(method):
+                method = getattr(self.board, method)
+            future.set_result(method(*args, **kvargs))
+        except Exception:
+            future.set_exception(sys.exc_info())
+
+    def _run(self):
+        while True:
+            priority, seq, method, args, kvargs, future = self.queue.get()
+            if method is None:
+                break
+            self._running = priority
+            self._execute(method, args, kvargs, future)
+
+
+def submit(device, method, *args, **kvargs):
+    """queue a request to device if it is an ErieWorker, or execute it
+    right now on a plain Erie board.
+    :return: Future
+    """
+    if isinstance(device, ErieWorker):
+        return device.submit(method, *args, **kvargs)
+    kvargs.pop("priority", None)
+    future = Future()
+    try:
+        if not callable(method):
+            method = getattr(device, method)
+        future.set_result(method(*args, **kvargs))
+    except Exception:
+        future.set_exception(sys.exc_info())
+    return future
+
+
+def serve_urgent(device):
+    """let the urgent requests to device run, if device is an ErieWorker.
+    """
+    if isinstance(device, ErieWorker):
+        device.serve_urgent()
+
+
+def call(device, method, *args, **kvargs):
+    return submit(device, method, *args, **kvargs).result()
+
+
+def wait_all(futures, timeout=None):
+    """wait for all the futures.
+    :return: list of results, or the exception for a failed request.
+    """
+    results = []
+    for future in futures:
+        exc = future.exception(timeout)
+        results.append(exc if exc is not None else future.result())
+    return results
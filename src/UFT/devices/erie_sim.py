@@ -0,0 +1,561 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""erie_sim.py: in-process simulator of Erie board and the PGEMs on it.
+The simulator is a serial like object speaking the 0x55/0x77 framing of
+erie.py, so Erie(ser=ErieSimulator()) runs the whole test flow without
+hardware. Time is simulated by SimClock and can be accelerated.
+"""
+
+__version__ = "0.0.1"
+__author__ = 'dqli'
+__all__ = ["SimClock", "PGEMModel", "SharedEEPROMModel", "ErieSimulator"]
+
+import math
+import time
+import random
+import logging
+import threading
+from UFT.devices import erie
+
+logger = logging.getLogger(__name__)
+
+# wire time of one byte, 115200 baud 8N1
+BYTE_TIME = 10.0 / 115200
+# firmware handling time of one command
+TURNAROUND = 0.0005
+# extra time for one I2C transaction on the PGEM bus
+IIC_TIME = 0.0003
+# the board completes a reset once the DUT took it, before the DUT booted
+RESET_ACK_TIME = 0.1
+# VPD EEPROM behind register 0x02: time to fetch the byte of a new address
+# for a read, and write cycle of a byte
+EEP_LATCH_TIME = 0.0005
+EEP_WRITE_TIME = 0.004
+# write cycle of a byte of the shared port EEPROM at 0x54..0x56, the part
+# does not acknowledge its address until the cycle is over
+SHARED_EEP_WRITE_TIME = 0.005
+
+PGEM_SLAVE = 0x14
+HWREADY_VALUE = 0xA5
+EEP_SIZE = 0x1000
+
+
+class SimClock(object):
+    """time source running speedup times faster than the wall clock.
+    has time() and sleep() like the time module, so it can be used
+    anywhere the time module is used as clock.
+    """
+
+    def __init__(self, speedup=1.0):
+        self.speedup = float(speedup)
+        self.real_start = time.time()
+        self.sim_start = self.real_start
+
+    def time(self):
+        return self.sim_start + (time.time() - self.real_start) * self.speedup
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            time.sleep(seconds / self.speedup)
+
+
+class PGEMModel(object):
+    """PGEM register file at slave 0x14 with VPD EEPROM behind register
+    0x00/0x01 (address) and 0x02 (data), and a RC model of the capacitor.
+    A read of register 0x02 before the byte of a new address is fetched
+    returns the former byte, a write during the write cycle of the byte
+    before is lost.
+    """
+
+    VCAP_FULL = 5.5         # charge target voltage
+    CHARGED_RATIO = 0.97    # vcap/VCAP_FULL to report charged
+    VBOOST_MIN = 1.0        # boost converter stops below this vcap
+    VIN = 12.0
+    TAU_SELF = 3600.0       # self discharge time constant
+
+    def __init__(self, clock, capacitance=40, tau_charge=20.0,
+                 tau_discharge=15.0, boot_time=1.0, cap_time=30.0,
+                 temperature=25.0, vpd_autoinc=False):
+        self.clock = clock
+        self.capacitance = capacitance
+        self.tau_charge = tau_charge
+        self.tau_discharge = tau_discharge
+        self.boot_time = boot_time
+        self.cap_time = cap_time
+        self.temperature = temperature
+
+        self.eeprom = bytearray([0xFF] * EEP_SIZE)
+        self.eep_addr = 0
+        self.eep_write_enable = False
+        # register 0x02, the time its byte is fetched for a read, and the
+        # end of the write cycle
+        self.eep_data = 0xFF
+        self.eep_fetched_at = 0.0
+        self.eep_busy_until = 0.0
+        # the address latch steps on every access of register 0x02
+        self.vpd_autoinc = vpd_autoinc
+
+        self.powered = False
+        self.load_on = False
+        self.shutdown = False
+        self.vcap = 0.0
+        self.boot_at = 0.0
+        self.charge_start = None
+        self.charge_end = None
+        self.cap_done_at = None
+        self.last_update = clock.time()
+
+    def _charged(self):
+        return self.vcap >= self.VCAP_FULL * self.CHARGED_RATIO
+
+    def alive(self):
+        return self.powered or \
+            (not self.shutdown and self.vcap > self.VBOOST_MIN)
+
+    def update(self):
+        now = self.clock.time()
+        dt = now - self.last_update
+        self.last_update = now
+        if dt <= 0:
+            return now
+        if self.powered:
+            self.vcap = self.VCAP_FULL - \
+                (self.VCAP_FULL - self.vcap) * math.exp(-dt / self.tau_charge)
+            if self.charge_end is None and self._charged():
+                self.charge_end = now
+        elif self.load_on and self.alive():
+            self.vcap *= math.exp(-dt / self.tau_discharge)
+        else:
+            self.vcap *= math.exp(-dt / self.TAU_SELF)
+        if self.cap_done_at is not None and now >= self.cap_done_at:
+            self.cap_done_at = None
+            self.eeprom[0x100] = self.capacitance & 0xFF
+        return now
+
+    def power(self, on):
+        now = self.update()
+        if on and not self.powered:
+            if not self.alive():
+                self.boot_at = now + self.boot_time
+                self.eep_write_enable = False
+            self.shutdown = False
+            self.charge_start = now
+            self.charge_end = None
+        self.powered = on
+
+    def load(self, on):
+        self.update()
+        self.load_on = on
+
+    def reset(self):
+        now = self.update()
+        self.boot_at = now + self.boot_time
+        self.eep_write_enable = False
+
+    def hard_reset(self):
+        """reset from Erie board, the capacitor is drained and the charge
+        restarts from empty, so every DUT goes through a full charge.
+        """
+        self.reset()
+        self.vcap = 0.0
+        if self.powered:
+            self.charge_start = self.last_update
+            self.charge_end = None
+
+    def do_shutdown(self):
+        self.update()
+        if not self.powered:
+            self.shutdown = True
+
+    def gtg_pin(self):
+        self.update()
+        return self.alive() and self._charged()
+
+    def read_reg(self, reg):
+        now = self.update()
+        if reg == 0x00:
+            return self.eep_addr & 0xFF
+        if reg == 0x01:
+            return (self.eep_addr >> 8) & 0xFF
+        if reg == 0x02:
+            if now >= self.eep_fetched_at:
+                self.eep_data = self.eeprom[self.eep_addr % EEP_SIZE]
+                # the next byte is fetched ahead
+                if self.vpd_autoinc:
+                    self.eep_addr = (self.eep_addr + 1) & 0xFFFF
+            return self.eep_data
+        if reg == 0x20:
+            return HWREADY_VALUE if now >= self.boot_at else 0x00
+        if reg == 0x21:
+            return 0x0B if self._charged() else 0x00
+        if reg == 0x22:
+            return 0x00
+        if reg == 0x23:
+            val = 0x00
+            if self.powered and not self._charged():
+                val |= 0x01
+            if self.cap_done_at is not None:
+                val |= 0x04
+            return val
+        if reg in (0x24, 0x25):
+            raw = (int(self.temperature * 4) & 0x3FF) << 2
+            return raw & 0xFF if reg == 0x24 else (raw >> 8) & 0xFF
+        if reg == 0x26:
+            return int(round(self.VIN * 10)) if self.alive() else 0
+        if reg == 0x27:
+            return min(int(round(self.vcap * 10)), 0xFF)
+        if reg == 0x28:
+            if self.charge_start is None:
+                return 0
+            end = self.charge_end if self.charge_end is not None else now
+            return min(int(end - self.charge_start), 0xFF)
+        return 0x00
+
+    def write_reg(self, reg, val):
+        now = self.update()
+        if reg in (0x00, 0x01):
+            if reg == 0x00:
+                self.eep_addr = (self.eep_addr & 0xFF00) | val
+            else:
+                self.eep_addr = (self.eep_addr & 0x00FF) | (val << 8)
+            self.eep_fetched_at = max(now, self.eep_busy_until) + \
+                EEP_LATCH_TIME
+        elif reg == 0x02:
+            if now < self.eep_busy_until:
+                return
+            self.eep_data = val
+            if self.eep_write_enable:
+                self.eeprom[self.eep_addr % EEP_SIZE] = val
+                self.eep_busy_until = now + EEP_WRITE_TIME
+                self.eep_fetched_at = self.eep_busy_until
+            if self.vpd_autoinc:
+                self.eep_addr = (self.eep_addr + 1) & 0xFFFF
+        elif reg == 0x03:
+            self.cap_done_at = self.last_update + self.cap_time
+        elif reg == 0x04 and val == 0xF4:
+            self.reset()
+        elif reg == 0x06 and val == 0xB4:
+            self.do_shutdown()
+        elif reg == 0x40 and val == 0x45:
+            self.eep_write_enable = True
+
+
+class SharedEEPROMModel(object):
+    """256 byte I2C EEPROM of a shared port of Amber 4x/e, register address
+    is the byte address. A byte written starts a write cycle, during which
+    the part does not answer.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = bytearray([0xFF] * 256)
+        self.busy_until = 0.0
+
+    def busy(self):
+        return self.clock.time() < self.busy_until
+
+    def read_reg(self, reg):
+        return self.data[reg & 0xFF]
+
+    def write_reg(self, reg, val):
+        self.data[reg & 0xFF] = val
+        self.busy_until = self.clock.time() + SHARED_EEP_WRITE_TIME
+
+
+class PortModel(object):
+    """one port of Erie board: power and load switches, LED, present pin,
+    and the I2C devices behind the port, {slave address: model}.
+    """
+
+    def __init__(self, present=True):
+        self.present = present
+        self.output_on = False
+        self.load_on = False
+        self.led_on = False
+        self.protype = None
+        self.pgem = None
+        self.eeproms = {}
+
+
+class ErieSimulator(object):
+    """serial like object simulating one Erie board with 16 ports.
+    :param clock: SimClock, a new real time clock if None.
+    :param present: list of bool, the DUT is present on the port or not.
+    :param mode4in1: Amber 4x/e, every 4 ports share one PGEM, the shared
+                     ports 1..3 have an EEPROM at 0x54..0x56.
+    :param firmware: firmware version reported, (major, minor), commands
+                     of later firmware are not answered, like the real
+                     old firmware does.
+    :param seed: seed of the random spread of the DUT parameters.
+    :param vpd_autoinc: keyword, the PGEM VPD address steps on every
+                        access of register 0x02.
+    """
+
+    def __init__(self, clock=None, ports=16, present=None, mode4in1=False,
+                 firmware=(1, 4), seed=None, **kvargs):
+        self.clock = clock if clock is not None else SimClock()
+        self.timeout = kvargs.get("timeout", 1)
+        self.firmware = tuple(firmware)
+        self.byte_time = kvargs.get("byte_time", BYTE_TIME)
+        self.turnaround = kvargs.get("turnaround", TURNAROUND)
+        self.lock = threading.Lock()
+
+        rnd = random.Random(seed)
+        if present is None:
+            present = [True] * ports
+        self.ports = [PortModel(p) for p in present]
+        for i, port in enumerate(self.ports):
+            if not port.present:
+                continue
+            if mode4in1 and (i % 4) != 0:
+                port.pgem = self.ports[i - i % 4].pgem
+                port.eeproms[0x54 + (i % 4) - 1] = \
+                    SharedEEPROMModel(self.clock)
+            else:
+                port.pgem = PGEMModel(self.clock,
+                                      tau_charge=rnd.uniform(12.0, 30.0),
+                                      tau_discharge=rnd.uniform(10.0, 20.0),
+                                      vpd_autoinc=kvargs.get("vpd_autoinc",
+                                                             False))
+        self.mode4in1 = mode4in1
+
+        self._inbuf = bytearray()
+        self.crc_framing = False
+        self._seq = 0
+        self.crc_errors = 0
+        # responses waiting to be read, [ready_time, bytearray]
+        self._outbuf = []
+        self._busy_until = 0.0
+
+        # counters for benchmark
+        self.frames = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    # serial port API used by erie.py
+
+    def isOpen(self):
+        return True
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def flushInput(self):
+        with self.lock:
+            self._outbuf = []
+
+    def flushOutput(self):
+        pass
+
+    def inWaiting(self):
+        with self.lock:
+            now = self.clock.time()
+            return sum(len(d) for t, d in self._outbuf if t <= now)
+
+    def write(self, content):
+        with self.lock:
+            self._inbuf.extend(bytearray(content))
+            self.bytes_written += len(content)
+            self._parse()
+        return len(content)
+
+    def read(self, size=1):
+        deadline = None
+        if self.timeout is not None:
+            deadline = self.clock.time() + self.timeout
+        out = bytearray()
+        while len(out) < size:
+            with self.lock:
+                now = self.clock.time()
+                while self._outbuf and self._outbuf[0][0] <= now and \
+                        len(out) < size:
+                    ready, data = self._outbuf[0]
+                    n = size - len(out)
+                    out.extend(data[:n])
+                    if n >= len(data):
+                        self._outbuf.pop(0)
+                    else:
+                        self._outbuf[0][1] = data[n:]
+                nxt = self._outbuf[0][0] if self._outbuf else None
+            if len(out) >= size:
+                break
+            if nxt is None or (deadline is not None and nxt > deadline):
+                if deadline is not None:
+                    self.clock.sleep(deadline - now)
+                break
+            self.clock.sleep(nxt - now)
+        self.bytes_read += len(out)
+        return str(out)
+
+    # board model
+
+    def _parse(self):
+        buf = self._inbuf
+        while len(buf) >= 6:
+            if buf[0] != 0x55 or buf[1] != 0x77:
+                # hunt for the next header
+                del buf[0]
+                continue
+            datalen = buf[4] | (buf[5] << 8)
+            trailer = 3 if self.crc_framing else 0
+            total = 6 + datalen + trailer
+            if len(buf) < total:
+                return
+            if self.crc_framing:
+                crc = buf[total - 2] | (buf[total - 1] << 8)
+                if erie.crc16(buf[:total - 2]) != crc:
+                    # corrupt frame, no answer
+                    self.crc_errors += 1
+                    del buf[:2]
+                    continue
+                self._seq = buf[total - 3]
+            cmd, port = buf[2], buf[3]
+            data = buf[6:6 + datalen]
+            del buf[:total]
+            self.frames += 1
+            self._execute(cmd, port, data, total)
+
+    def _respond(self, cmd, port, status, data, service):
+        payload = bytearray([status]) + bytearray(data)
+        frame = bytearray([0x55, 0x77, cmd, port,
+                           len(payload) & 0xFF, (len(payload) >> 8) & 0xFF])
+        frame += payload
+        if self.crc_framing:
+            frame.append(self._seq)
+            crc = erie.crc16(frame)
+            frame += bytearray([crc & 0xFF, crc >> 8])
+        now = self.clock.time()
+        start = max(now, self._busy_until)
+        ready = start + service + len(frame) * self.byte_time
+        self._busy_until = ready
+        self._outbuf.append([ready, frame])
+
+    def _execute(self, cmd, port, data, reqlen):
+        service = self.turnaround + reqlen * self.byte_time
+        if cmd == 0x0C:
+            self._respond(cmd, port, 0x00, self.firmware, service)
+            return
+        if cmd == 0x11 and self.firmware >= (1, 4):
+            self._respond(cmd, port, 0x00, self._port_status_all(), service)
+            return
+        if cmd == 0x12 and self.firmware >= (1, 4):
+            # answered in the framing of the request, then switched
+            self._respond(cmd, port, 0x00, [], service)
+            self.crc_framing = bool(data) and data[0] == 0x01
+            return
+        if port >= len(self.ports):
+            self._respond(cmd, port, 0x01, [], service)
+            return
+        p = self.ports[port]
+        pgem = p.pgem
+        status = 0x00
+        out = []
+        if cmd == 0x00:
+            p.protype = data[0] if data else None
+        elif cmd == 0x01:
+            status, out = self._iic_read(p, data)
+            service += IIC_TIME * 2
+        elif cmd == 0x02:
+            status = self._iic_write(p, data)
+            service += IIC_TIME * 3
+        elif cmd == 0x10 and self.firmware >= (1, 4):
+            status, out = self._iic_read_block(p, data)
+            service += IIC_TIME * (2 + len(out))
+        elif cmd == 0x03:
+            out = [0 if p.present else 1]
+        elif cmd == 0x04:
+            out = [1 if (pgem is not None and pgem.gtg_pin()) else 0]
+        elif cmd in (0x05, 0x06):
+            p.output_on = (cmd == 0x05)
+            if pgem is not None:
+                pgem.power(self._group_powered(port))
+        elif cmd == 0x07:
+            out = [1 if p.output_on else 0]
+        elif cmd in (0x08, 0x09):
+            p.led_on = (cmd == 0x08)
+        elif cmd == 0x0A:
+            if p.output_on:
+                status = 0x01
+            else:
+                p.load_on = True
+                if pgem is not None:
+                    pgem.load(True)
+        elif cmd == 0x0B:
+            p.load_on = False
+            if pgem is not None:
+                pgem.load(self._group_loaded(port))
+        elif cmd == 0x0D:
+            if pgem is not None:
+                pgem.hard_reset()
+                # completion of the reset, the DUT is still booting
+                service += RESET_ACK_TIME
+        elif cmd == 0x0E:
+            if pgem is not None:
+                pgem.do_shutdown()
+                service += 0.5
+        else:
+            # unknown command, firmware does not answer
+            return
+        self._respond(cmd, port, status, out, service)
+
+    def _port_status_all(self):
+        present = gtg = output = 0
+        for i, p in enumerate(self.ports):
+            if not p.present:
+                present |= 1 << i
+            if p.pgem is not None and p.pgem.gtg_pin():
+                gtg |= 1 << i
+            if p.output_on:
+                output |= 1 << i
+        return [present & 0xFF, present >> 8, gtg & 0xFF, gtg >> 8,
+                output & 0xFF, output >> 8]
+
+    def _group(self, port):
+        if self.mode4in1:
+            first = port - port % 4
+            return self.ports[first:first + 4]
+        return [self.ports[port]]
+
+    def _group_powered(self, port):
+        return any(p.output_on for p in self._group(port))
+
+    def _group_loaded(self, port):
+        return any(p.load_on for p in self._group(port))
+
+    def _iic_device(self, p, address):
+        if address == PGEM_SLAVE and p.pgem is not None and p.pgem.alive():
+            return p.pgem
+        dev = p.eeproms.get(address)
+        if dev is not None and dev.busy():
+            # in write cycle, the address is not acknowledged
+            return None
+        return dev
+
+    def _iic_read(self, p, data):
+        if len(data) < 2:
+            return 0x01, []
+        dev = self._iic_device(p, data[0])
+        if dev is None:
+            return 0x01, []
+        return 0x00, [dev.read_reg(data[1])]
+
+    def _iic_read_block(self, p, data):
+        if len(data) < 3:
+            return 0x01, []
+        dev = self._iic_device(p, data[0])
+        if dev is None:
+            return 0x01, []
+        reg, length = data[1], data[2]
+        return 0x00, [dev.read_reg((reg + i) & 0xFF) for i in range(length)]
+
+    def _iic_write(self, p, data):
+        if len(data) < 3:
+            return 0x01
+        dev = self._iic_device(p, data[0])
+        if dev is None:
+            return 0x01
+        dev.write_reg(data[1], data[2])
+        return 0x00
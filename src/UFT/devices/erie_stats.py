@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""erie_stats.py: latency histograms and error counters of Erie board.
+Only the I/O thread of the board records the latencies and the frame
+errors, readers take a snapshot, so no lock is needed there. The retries
+and unreachable DUTs of the I2C adapter are counted from the channel
+threads too, they have their own counters under a lock.
+"""
+
+__version__ = "0.0.1"
+__author__ = 'dqli'
+__all__ = ["LatencyHistogram", "ErieStats"]
+
+import threading
+
+# sub buckets per power of 2, values within 1/SUB_BUCKETS of their bucket
+SUB_BITS = 3
+SUB_BUCKETS = 1 << SUB_BITS
+# 1 microsecond resolution, 2 ** MAX_EXP us (~ 4.7 h) at most
+UNIT = 1e-6
+MAX_EXP = 34
+
+# counters kept by ErieStats, written by the I/O thread
+COUNTERS = ("timeouts", "short_frames", "bad_frames", "resyncs", "stale",
+            "failures")
+# counters of the I2C adapter, written from any thread
+SHARED_COUNTERS = ("retries", "unreachable")
+
+
+def _bucket(us):
+    """HDR style bucket index, linear below 2 * SUB_BUCKETS, then
+    SUB_BUCKETS buckets per power of 2.
+    """
+    if us < 2 * SUB_BUCKETS:
+        return us
+    exp = us.bit_length() - SUB_BITS - 1
+    return (exp + 1) * SUB_BUCKETS + (us >> exp) - SUB_BUCKETS
+
+
+def _bucket_value(idx):
+    """highest value in us of bucket idx.
+    """
+    if idx < 2 * SUB_BUCKETS:
+        return idx
+    exp = idx // SUB_BUCKETS - 1
+    mantissa = idx % SUB_BUCKETS + SUB_BUCKETS
+    return ((mantissa + 1) << exp) - 1
+
+
+class LatencyHistogram(object):
+    """latency histogram with logarithmic buckets, in seconds.
+    """
+    __slots__ = ["counts", "count", "total", "min", "max"]
+
+    def __init__(self):
+        self.counts = [0] * ((MAX_EXP - SUB_BITS + 1) * SUB_BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        us = int(seconds / UNIT)
+        if us < 0:
+            us = 0
+        idx = _bucket(us)
+        if idx >= len(self.counts):
+            idx = len(self.counts) - 1
+        self.counts[idx] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None \
+                else min(self.min, other.min)
+            self.max = other.max if self.max is None \
+                else max(self.max, other.max)
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        """latency in seconds p percent of the samples are below.
+        """
+        if not self.count:
+            return 0.0
+        target = max(1, int(round(self.count * p / 100.0)))
+        seen = 0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(_bucket_value(idx) * UNIT, self.max)
+        return self.max
+
+
+class ErieStats(object):
+    """round trip latency per (command code, port), and error counters.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.counters = dict((name, 0) for name in COUNTERS)
+        self.shared_counters = dict((name, 0) for name in SHARED_COUNTERS)
+        self.shared_lock = threading.Lock()
+
+    def record(self, cmd, port, seconds):
+        hist = self.histograms.get((cmd, port))
+        if hist is None:
+            hist = self.histograms[(cmd, port)] = LatencyHistogram()
+        hist.record(seconds)
+
+    def count(self, name, n=1):
+        """count an error of the I/O thread.
+        """
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def count_shared(self, name, n=1):
+        """count an event from any thread, e.g. a retry of the adapter.
+        """
+        with self.shared_lock:
+            self.shared_counters[name] = \
+                self.shared_counters.get(name, 0) + n
+
+    def histogram(self, cmd=None, port=None):
+        """merged histogram of a command code and/or port, all if None.
+        """
+        merged = LatencyHistogram()
+        for (c, p), hist in self.histograms.items():
+            if (cmd is None or c == cmd) and (port is None or p == port):
+                merged.merge(hist)
+        return merged
+
+    def summary(self, by="cmd"):
+        """summary table, one line per command code or port.
+        :param by: "cmd" or "port".
+        :return: list of lines.
+        """
+        keys = sorted(set(k[0 if by == "cmd" else 1]
+                          for k in self.histograms.keys()))
+        counters = dict(self.counters)
+        with self.shared_lock:
+            counters.update(self.shared_counters)
+        lines = ["{0:>6s} {1:>8s} {2:>9s} {3:>9s} {4:>9s} {5:>9s} {6:>9s}".
+                 format(by, "count", "mean ms", "p50 ms", "p99 ms", "max ms",
+                        "total s")]
+        for key in keys:
+            if by == "cmd":
+                hist = self.histogram(cmd=key)
+                name = "0x{0:02x}".format(key)
+            else:
+                hist = self.histogram(port=key)
+                name = str(key)
+            lines.append("{0:>6s} {1:8d} {2:9.2f} {3:9.2f} {4:9.2f} {5:9.2f} "
+                         "{6:9.1f}".format(name, hist.count,
+                                           hist.mean() * 1e3,
+                                           hist.percentile(50) * 1e3,
+                                           hist.percentile(99) * 1e3,
+                                           hist.max * 1e3, hist.total))
+        lines.append(" ".join("{0}: {1}".format(name, counters[name])
+                              for name in sorted(counters)))
+        return lines
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""erie_trace.py: frame tracing for Erie board.
+The last frames of each board are kept in a ring buffer and dumped to the
+log when the UART communication fails. Optionally all the frames are
+written to a binary trace file, decoded offline by:
+    python -m UFT.devices.erie_trace <trace file>
+"""
+
+__version__ = "0.0.1"
+__author__ = 'dqli'
+__all__ = ["FrameTracer", "read_trace", "format_frame"]
+
+import sys
+import struct
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+TX = 0
+RX = 1
+# bytes received and dropped by the resync, garbage or corrupt frames
+DROP = 2
+DIRECTION = {TX: "TX", RX: "RX", DROP: "DROP"}
+
+TRACE_MAGIC = "ERIETRC1"
+# file header: magic, board id
+FILE_HEADER = struct.Struct("<8sB")
+# record header: time, direction, length, then length bytes of the frame
+RECORD_HEADER = struct.Struct("<dBH")
+
+
+def format_frame(data):
+    """hex string of a frame, only built when somebody looks at it.
+    """
+    return " ".join("%02x" % b for b in bytearray(data))
+
+
+class FrameTracer(object):
+    """record the frames of one board.
+    :param size: number of frames in the ring buffer.
+    :param path: binary trace file, no file if None.
+    :param clock: time source, the time module or a simulation clock.
+    """
+
+    def __init__(self, boardid, size=64, path=None, clock=None):
+        self.boardid = boardid
+        self.ring = deque(maxlen=size)
+        self.clock = clock
+        self.file = None
+        if path:
+            self.file = open(path, "wb")
+            self.file.write(FILE_HEADER.pack(TRACE_MAGIC, boardid & 0xFF))
+        # frames recorded, to skip dumps without anything new
+        self.count = 0
+        self._dumped = 0
+
+    def record(self, direction, data):
+        """keep the frame, data is a str or bytearray and is not copied,
+        the caller must not change it afterwards.
+        """
+        t = self.clock.time()
+        self.ring.append((t, direction, data))
+        self.count += 1
+        if self.file is not None:
+            self.file.write(RECORD_HEADER.pack(t, direction, len(data)))
+            self.file.write(str(data))
+
+    def dump(self, log=logger):
+        """write the frames in the ring buffer to the log, once for the
+        frames recorded since the last dump.
+        """
+        if self._dumped == self.count:
+            return
+        self._dumped = self.count
+        log.info("Erie board {0}: last {1} frames".format(
+            self.boardid, len(self.ring)))
+        for t, direction, data in self.ring:
+            log.info("  {0:.4f} {1} {2}".format(t, DIRECTION[direction],
+                                                format_frame(data)))
+        if self.file is not None:
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def read_trace(f):
+    """decode a binary trace file.
+    :param f: opened file.
+    :return: board id, and generator of (time, direction, bytearray).
+    """
+    magic, boardid = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != TRACE_MAGIC:
+        raise ValueError("not an Erie trace file")
+
+    def records():
+        while True:
+            head = f.read(RECORD_HEADER.size)
+            if len(head) < RECORD_HEADER.size:
+                return
+            t, direction, length = RECORD_HEADER.unpack(head)
+            yield t, direction, bytearray(f.read(length))
+    return boardid, records()
+
+
+def main(path):
+    with open(path, "rb") as f:
+        boardid, records = read_trace(f)
+        print "Erie board {0}".format(boardid)
+        start = None
+        for t, direction, data in records:
+            if start is None:
+                start = t
+            info = ""
+            if len(data) >= 6 and data[0] == 0x55 and data[1] == 0x77:
+                info = "cmd 0x{0:02x} port {1:2d} len {2:3d}".format(
+                    data[2], data[3], data[4] | (data[5] << 8))
+            print "{0:12.4f} {1:4s} {2:28s} {3}".format(
+                t - start, DIRECTION.get(direction, "??"), info,
+                format_frame(data))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print "usage: python -m UFT.devices.erie_trace <trace file>"
+        sys.exit(1)
+    main(sys.argv[1])
@@ -8,6 +8,7 @@ __author__ = "@fanmuzhi, @boqiling"
 __all__ = ["DCLoad"]
 
 import logging
+from UFT.devices import erie_io
 
 logger = logging.getLogger(__name__)
 
@@ -72,5 +73,5 @@ class DCLoad(object):
         pass
 
     def input_off(self):
-        self.device.InputOff(self.OccupyPort)
-        pass
+        erie_io.call(self.device, "InputOff", self.OccupyPort,
+                     priority=erie_io.PRIORITY_SAFETY)
@@ -9,6 +9,7 @@ __author__ = "@fanmuzhi, @boqiling"
 __all__ = ["PowerSupply"]
 
 import logging
+from UFT.devices import erie_io
 
 logger = logging.getLogger(__name__)
 
@@ -66,8 +67,12 @@ class PowerSupply(object):
         pass
 
     def deactivateOutput(self):
-        self.device.OutputOff(self.OccupyPort)
-        pass
+        erie_io.call(self.device, "OutputOff", self.OccupyPort,
+                     priority=erie_io.PRIORITY_SAFETY)
 
     def isOutputOn(self):
-        return self.device.isOutputOn(self.OccupyPort)
+        """read from the all ports status cached by the board, refreshed
+        once the cache is older than erie.PORT_STATUS_TTL.
+        """
+        port = self.OccupyPort
+        return self.device.GetPortStatusAll(ports=[port]).is_output_on(port)
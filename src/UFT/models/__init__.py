@@ -4,9 +4,13 @@
 """
 __version__ = "0.1"
 __author__ = "@fanmuzhi, @boqiling"
-__all__ = ["PGEMBase", "DUT", "DUT_STATUS", "Cycle"]
+__all__ = ["PGEMBase", "StatusBlock", "DUT", "DUT_STATUS", "Cycle",
+           "read_vpd_many", "write_vpd_many", "discover_shared_ports",
+           "write_shared_vpd_many", "SHARED_EEP_ADDRESSES"]
 
-from base import PGEMBase, Diamond4
+from base import PGEMBase, Diamond4, StatusBlock
+from base import read_vpd_many, write_vpd_many, discover_shared_ports
+from base import write_shared_vpd_many, SHARED_EEP_ADDRESSES
 from dut import DUT, DUT_STATUS, Cycle
 
 
@@ -4,13 +4,21 @@
 """
 __version__ = "0.1"
 __author__ = "@fanmuzhi, @boqiling"
-__all__ = ["PGEMBase"]
+__all__ = ["PGEMBase", "StatusBlock",
+           "read_vpd_many", "write_vpd_many", "discover_shared_ports",
+           "write_shared_vpd_many", "SHARED_EEP_ADDRESSES"]
 
 import logging
 import struct
 import re
 import time
+from collections import namedtuple
 from dut import DUT
+from vpd import VPDCache, FieldTable, VPD_CRC_ADDR, diff_ranges, vpd_crc, \
+    stored_crc
+import regs
+from regs import StatusBlock, HWREADY_VALUE, STATUS_BLOCK_ADDR, \
+    STATUS_BLOCK_LEN
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +55,13 @@ EEP_MAP = [{"name": "MODEL", "addr": 0x000, "length": 16, "type": "str"},
            {"name": "PWRCYCS", "addr": 0x206, "length": 2, "type": "int"},
            {"name": "RUNLOG_IDX", "addr": 0x300, "length": 2, "type": "int"}
            ]
+# EEP_MAP compiled, EEP_TABLE["SN"].decode(...)
+EEP_TABLE = FieldTable(EEP_MAP)
+
+# slave addresses of the EEPROM of 4-in-1 shared ports, in probe order, and
+# the fields read back once they are written
+SHARED_EEP_ADDRESSES = (0x54, 0x55, 0x56)
+SHARED_CHECK_FIELDS = ("SN", "MFDATE", "MFNAME")
 
 # PGEM ID write to saphire.
 PGEM_ID = {0: "A", 1: "B", 2: "C", 3: "D"}
@@ -56,6 +71,14 @@ BARCODE_PATTERN = re.compile(
     r'(?P<WW>[0-4][0-9]|5[0-3])(?P<ID>\d{8})-(?P<RR>\d{2}))$')
 
 
+# gap between two VPD fields read as one range rather than two, with
+# address auto increment: 1 frame per byte vs. 6 frames per range.
+VPD_RANGE_GAP = 6
+# ms for register 0x02 to fetch the EEPROM byte of a new address, or to
+# finish the write cycle of a byte, as the former byte by byte access slept
+VPD_WAIT = 5
+
+
 class PGEMException(Exception):
     """PGEM Exception
     """
@@ -85,110 +108,180 @@ class PGEMBase(DUT):
         else:
             raise PGEMException("Unvalide barcode.")
 
-    @staticmethod
-    def _query_map(mymap, **kvargs):
-        """method to search the map (the list of dict, [{}, {}])
-        :params mymap:  the map to search
-                kvargs: query conditon key=value, key should be in the dict.
-        :return: the dict match the query contdtion or None.
-        """
-        r = mymap
-        for k, v in kvargs.items():
-            r = filter(lambda row: row[k] == v, r)
-        return r
+        # shadow copy of VPD, read_vpd_* are served from it
+        self.vpd_cache = VPDCache()
+        # VPD address steps on read of register 0x02, None if not probed
+        self.vpd_autoinc = None
+        # bytes written and seconds taken by the last write_vpd
+        self.vpd_written = None
+        self.vpd_write_time = None
+
+    def to_dict(self):
+        result = super(PGEMBase, self).to_dict()
+        # VPD image known so far, no extra bus access
+        result["vpd_image"] = self.vpd_cache.export()
+        result["vpd_written"] = self.vpd_written
+        return result
 
     def read_vpd_byname(self, reg_name):
         """method to read eep_data according to eep_name
-        eep is one dict in eep_map, for example:
+        eep is one field of EEP_TABLE, compiled from EEP_MAP, for example:
         {"name": "CINT", "addr": 0x02B3, "length": 1, "type": "int"}
         :param reg_name: register name, e.g. "PCA"
         :return value of the register
         """
-        eep = self._query_map(EEP_MAP, name=reg_name)[0]
-        start = eep["addr"]  # start_address
-        length = eep["length"]  # length
-        typ = eep["type"]  # type
-        datas=[]
-        self.device.slave_addr = 0x14
+        field = EEP_TABLE[reg_name]
+        return field.decode(self.read_vpd_range(field.addr, field.length))
+
+    def read_vpd_range(self, start, length):
+        """read length VPD bytes from start on. Bytes in the shadow cache
+        are not read again, the others are streamed in one sequence.
+        :return: bytes
+        """
+        cache = self.vpd_cache
+        vals = [cache.get(a) for a in range(start, start + length)]
+        missing = [i for i, v in enumerate(vals) if v is None]
+        if missing:
+            first, last = missing[0], missing[-1] + 1
+            data = self._stream_vpd(start + first, last - first)
+            for i, v in enumerate(data):
+                cache.put(start + first + i, v)
+                vals[first + i] = v
+        return bytes(bytearray(vals))
+
+    def _probe_vpd_autoinc(self):
+        """check if the VPD address steps on a read of register 0x02.
+        """
+        vals = self.device.run_sequence([(0x00, 0x00), (0x01, 0x00),
+                                         (None, VPD_WAIT), (0x02, None),
+                                         (0x00, None), (0x01, None)])
+        autoinc = (vals[1] == 0x01 and vals[2] == 0x00)
+        logger.debug("VPD address auto increment: {0}".format(autoinc))
+        return autoinc
+
+    @staticmethod
+    def _vpd_bytes_ops(start, length, byte_ops):
+        """register sequence accessing VPD bytes one address at a time, the
+        high address byte is only written when it changes.
+        :param byte_ops: function of the index of the byte, returning the
+                         ops after its low address byte.
+        """
+        ops = []
+        high = None
         for i in range(length):
-            self.device.write_reg(0x00,(start+i) & 0xFF)
-            self.device.write_reg(0x01,((start+i)>>8) & 0xFF)
-            #print start+i
-            self.device.sleep(5)
-            temp=self.device.read_reg(0x02)
-            datas.append(temp[0])
+            addr = start + i
+            if (addr >> 8) != high:
+                high = addr >> 8
+                ops.append((0x01, high & 0xFF))
+            ops.append((0x00, addr & 0xFF))
+            ops += byte_ops(i)
+        return ops
 
-        if (typ == "word"):
-            val = 0
-            for i in range(0, len(datas)):
-                val += datas[i] << 8 * i
-        if (typ == "str"):
-            val = ''.join(chr(i) for i in datas if 0x1F < i < 0x7F)
-        if (typ == "int"):
-            val = 0
-            for i in range(0, len(datas)):
-                val += datas[i] << 8 * i
-        return val
+    @staticmethod
+    def _vpd_read_ops(start, length, autoinc):
+        """register sequence reading VPD bytes from EEPROM.
+        With address auto increment the address is written once, and the
+        address is read back after the data to check it stepped on every
+        byte. Without, the address is written for every byte. The EEPROM
+        is given VPD_WAIT ms to fetch the byte after the address written.
+        """
+        if autoinc:
+            ops = [(0x00, start & 0xFF), (0x01, (start >> 8) & 0xFF),
+                   (None, VPD_WAIT)]
+            ops += [(0x02, None)] * length
+            ops += [(0x00, None), (0x01, None)]
+            return ops
+        return PGEMBase._vpd_bytes_ops(
+            start, length, lambda i: [(None, VPD_WAIT), (0x02, None)])
+
+    def _vpd_read_result(self, start, length, autoinc, vals):
+        """VPD bytes from the values read by the _vpd_read_ops sequence.
+        :return: list of int, None if the address auto increment failed.
+        """
+        if autoinc:
+            end = (start + length) & 0xFFFF
+            if (vals[-2] | (vals[-1] << 8)) == end:
+                return vals[:-2]
+            logger.info("VPD address auto increment failed, "
+                        "read byte by byte")
+            return None
+        return vals
+
+    def _stream_vpd(self, start, length):
+        """read VPD bytes from EEPROM, in one register sequence.
+        :return: list of int
+        """
+        self.device.slave_addr = 0x14
+        if self.vpd_autoinc is None:
+            self.vpd_autoinc = self._probe_vpd_autoinc()
+        if self.vpd_autoinc:
+            vals = self.device.run_sequence(
+                self._vpd_read_ops(start, length, True))
+            datas = self._vpd_read_result(start, length, True, vals)
+            if datas is not None:
+                return datas
+        vals = self.device.run_sequence(
+            self._vpd_read_ops(start, length, False))
+        return self._vpd_read_result(start, length, False, vals)
+
+    def _read_vpd_slow(self, address):
+        self.device.write_reg(0x00,address & 0xFF)
+        self.device.write_reg(0x01,(address>>8) & 0xFF)
+        self.device.sleep(VPD_WAIT)
+        return self.device.read_reg(0x02)[0]
 
     def read_eep_byname(self, reg_name, addr):
         """method to read eep_data according to eep_name
-        eep is one dict in eep_map, for example:
+        eep is one field of EEP_TABLE, compiled from EEP_MAP, for example:
         {"name": "CINT", "addr": 0x02B3, "length": 1, "type": "int"}
         :param reg_name: register name, e.g. "PCA"
         :return value of the register
         """
-        eep = self._query_map(EEP_MAP, name=reg_name)[0]
-        start = eep["addr"]  # start_address
-        length = eep["length"]  # length
-        typ = eep["type"]  # type
+        field = EEP_TABLE[reg_name]
         datas=[]
         self.device.slave_addr = addr
-        for i in range(length):
+        for i in range(field.length):
             #self.device.write_reg(0x00,(start+i) & 0xFF)
             #self.device.write_reg(0x01,((start+i)>>8) & 0xFF)
             #print start+i
             #self.device.sleep(5)
-            temp=self.device.read_reg((start+i) & 0xFF)
+            temp=self.device.read_reg((field.addr+i) & 0xFF)
             datas.append(temp[0])
-
-        if (typ == "word"):
-            val = 0
-            for i in range(0, len(datas)):
-                val += datas[i] << 8 * i
-        if (typ == "str"):
-            val = ''.join(chr(i) for i in datas if 0x1F < i < 0x7F)
-        if (typ == "int"):
-            val = 0
-            for i in range(0, len(datas)):
-                val += datas[i] << 8 * i
-        return val
+        return field.decode(datas)
 
     def read_vpd_byaddress(self, address):
         """method to read eep_data according to eep_address
         :return value of the register
         added by pzho
         """
-        self.device.write_reg(0x00,address & 0xFF)
-        self.device.write_reg(0x01,(address>>8) & 0xFF)
-        val = self.device.read_reg(0x02)
-        return val
+        return list(bytearray(self.read_vpd_range(address, 1)))
 
-    def dump_vpd(self):
-        ret = []
-        self.device.slave_addr = 0x14
-        for i in range(0x000, 0xFFF):
-            ret.append(self.read_vpd_byaddress(i)[0])
-        logger.info(ret)
+    def dump_vpd(self, start=0x000, length=0xFFF):
+        """read a VPD range, see vpd_dump to save it to a file.
+        :return: list of int
+        """
+        ret = list(bytearray(self.read_vpd_range(start, length)))
+        logger.info("dut: {0} VPD 0x{1:03x} - 0x{2:03x}: {3}".format(
+            self.slotnum, start, start + length - 1,
+            "".join("%02X" % b for b in ret)))
         return ret
 
     def read_vpd(self):
         """method to read out EEPROM info from dut
         :return a dict of vpd names and values.
         """
-        dut = {}
-        for eep in EEP_MAP:
-            reg_name = eep["name"]
-            dut.update({reg_name.lower(): self.read_vpd_byname(reg_name)})
+        if self.vpd_autoinc is None:
+            self.device.slave_addr = 0x14
+            self.vpd_autoinc = self._probe_vpd_autoinc()
+        # read the fields in as few ranges as possible, with address auto
+        # increment a small gap is cheaper than one more range.
+        gap = VPD_RANGE_GAP if self.vpd_autoinc else 0
+        image = bytearray(EEP_TABLE.end)
+        for start, end in EEP_TABLE.spans(gap):
+            image[start:end] = self.read_vpd_range(start, end - start)
+
+        dut = dict((name.lower(), val) for name, val in
+                   EEP_TABLE.decode_image(image).items())
         # set self.values to write to database later.
         for k, v in dut.items():
             setattr(self, k, v)
@@ -232,92 +325,208 @@ class PGEMBase(DUT):
     def write_vpd_byaddress(self, address, data):
         self.device.write_reg(0x00,address & 0xFF)
         self.device.write_reg(0x01,(address>>8) & 0xFF)
-        self.device.sleep(5)
+        self.device.sleep(VPD_WAIT)
         self.device.write_reg(0x02,data & 0xFF)
+        self.vpd_cache.write(address, data)
 
-    def write_vpd(self, filepath):
-        """method to write barcode information to PGEM EEPROM
-        :param filepath: the ebf file location.
+    def _vpd_image(self, filepath):
+        """ebf image with the SN, MFDATE and MFNAME of the barcode.
+        :return: list of int
         """
         buffebf = self.load_bin_file(filepath)
-        # [ord(x) for x in string]
-        id = [ord(x) for x in self.barcode_dict['ID']]
-        yyww = [ord(x) for x in (self.barcode_dict['YY'] +
-                                 self.barcode_dict['WW'])]
-        vv = [ord(x) for x in self.barcode_dict['VV']]
-
         # id == SN == Product Serial Number
-        eep = self._query_map(EEP_MAP, name="SN")[0]
-        buffebf[eep["addr"]: eep["addr"] + eep["length"]] = id
-
+        EEP_TABLE.encode_into(buffebf, "SN", self.barcode_dict['ID'])
         # yyww == MFDATE == Manufacture Date YY WW
-        eep = self._query_map(EEP_MAP, name="MFDATE")[0]
-        buffebf[eep["addr"]: eep["addr"] + eep["length"]] = yyww
-
+        EEP_TABLE.encode_into(buffebf, "MFDATE", self.barcode_dict['YY'] +
+                              self.barcode_dict['WW'])
         # vv == ENDUSR == Manufacturer Name
-        eep = self._query_map(EEP_MAP, name="MFNAME")[0]
-        buffebf[eep["addr"]: eep["addr"] + eep["length"]] = vv
+        EEP_TABLE.encode_into(buffebf, "MFNAME", self.barcode_dict['VV'])
+        return buffebf
 
+    @staticmethod
+    def _vpd_write_ops(start, datas, autoinc):
+        """register sequence writing VPD bytes, then reading them back as
+        _vpd_read_ops does. Every byte written is given VPD_WAIT ms for its
+        write cycle, which also covers the address of the next byte. With
+        address auto increment the address is written once and read back
+        after the data, without it is written for every byte.
+        """
+        if autoinc:
+            ops = [(0x00, start & 0xFF), (0x01, (start >> 8) & 0xFF)]
+            for d in datas:
+                ops += [(0x02, d & 0xFF), (None, VPD_WAIT)]
+            ops += [(0x00, None), (0x01, None)]
+        else:
+            ops = PGEMBase._vpd_bytes_ops(
+                start, len(datas),
+                lambda i: [(0x02, datas[i] & 0xFF), (None, VPD_WAIT)])
+        return ops + PGEMBase._vpd_read_ops(start, len(datas), autoinc)
+
+    def _vpd_write_result(self, start, datas, autoinc, vals):
+        """bytes read back by the _vpd_write_ops sequence.
+        :return: list of int, None if the address auto increment failed.
+        """
+        length = len(datas)
+        if autoinc:
+            end = (start + length) & 0xFFFF
+            if (vals[0] | (vals[1] << 8)) != end:
+                logger.info("VPD address auto increment failed, "
+                            "write byte by byte")
+                return None
+            vals = vals[2:]
+        return self._vpd_read_result(start, length, autoinc, vals)
+
+    def _write_vpd_range(self, start, datas):
+        """write VPD bytes in one register sequence and read them back in
+        the same sequence.
+        :return: list of int, the bytes read back.
+        """
         self.device.slave_addr = 0x14
-        # can be start with 0x41, 0x00 for ensurance.
-        self.device.write_reg(0x40,0x45) # enable EEP write
-
-        for i in range(0x00, len(buffebf)):
-            self.write_vpd_byaddress(i, buffebf[i])
-            #self.device.sleep(25)
-            #print str(i)
-            #print buffebf[i]
-        # readback to check
-        #print self.barcode_dict
+        if self.vpd_autoinc:
+            vals = self.device.run_sequence(
+                self._vpd_write_ops(start, datas, True))
+            readback = self._vpd_write_result(start, datas, True, vals)
+            if readback is not None:
+                return readback
+        vals = self.device.run_sequence(
+            self._vpd_write_ops(start, datas, False))
+        return self._vpd_write_result(start, datas, False, vals)
+
+    def _prepare_vpd(self, filepath):
+        """image to program. The ebf CRC, see vpd_crc, covers the image
+        without the barcode fields, VPD_CRC is updated for them, unless the
+        ebf comes without a valid CRC.
+        :return: (list of int, True if VPD_CRC is valid)
+        """
+        image = self._vpd_image(filepath)
+        buffebf = self.load_bin_file(filepath)
+        has_crc = len(image) >= VPD_CRC_ADDR + 2 and \
+            stored_crc(buffebf) == vpd_crc(buffebf)
+        if has_crc:
+            crc = vpd_crc(image)
+            image[VPD_CRC_ADDR: VPD_CRC_ADDR + 2] = [crc & 0xFF, crc >> 8]
+        return image, has_crc
+
+    def _verify_vpd_range(self, start, datas, readback):
+        """verify as we go, a byte which did not stick is written again the
+        former way once.
+        """
+        for i in range(len(datas)):
+            if readback[i] != datas[i]:
+                self.write_vpd_byaddress(start + i, datas[i])
+                readback[i] = self._read_vpd_slow(start + i)
+            assert readback[i] == datas[i], \
+                "VPD 0x{0:03x} verify failed".format(start + i)
+            self.vpd_cache.put(start + i, readback[i])
+
+    def _check_vpd_image(self, image, has_crc, current):
+        """the whole image read again from the EEPROM, current, against the
+        programmed one and VPD_CRC, then the barcode fields.
+        """
+        assert list(current) == image
+        if has_crc:
+            assert stored_crc(current) == vpd_crc(current), \
+                "VPD_CRC mismatch"
+        else:
+            logger.info("dut: {0} ebf has no valid VPD_CRC, not checked".
+                        format(self.slotnum))
         assert self.barcode_dict["ID"] == self.read_vpd_byname("SN")
         assert (self.barcode_dict["YY"] + self.barcode_dict["WW"]) == \
                self.read_vpd_byname("MFDATE")
         assert self.barcode_dict["VV"] == self.read_vpd_byname("MFNAME")
 
-    def write_shared_vpd(self, filepath):
-        """method to write barcode information to PGEM EEPROM
+    def _vpd_done(self, image, ranges, start_time):
+        self.vpd_written = sum(length for start, length in ranges)
+        self.vpd_write_time = self.device.time() - start_time
+        logger.info("dut: {0} VPD {1} of {2} bytes written in {3} ranges, "
+                    "{4:.2f} s".format(self.slotnum, self.vpd_written,
+                                       len(image), len(ranges),
+                                       self.vpd_write_time))
+        return self.vpd_written
+
+    def write_vpd(self, filepath):
+        """method to write barcode information to PGEM EEPROM.
+        Only the bytes which differ from the EEPROM are written, each range
+        is read back once written, then the whole image is checked against
+        VPD_CRC. The image is read from the EEPROM once, before the writes
+        if it is not cached, after them if it is.
         :param filepath: the ebf file location.
+        :return: number of bytes written.
         """
-        buffebf = self.load_bin_file(filepath)
-        # [ord(x) for x in string]
-        id = [ord(x) for x in self.barcode_dict['ID']]
-        yyww = [ord(x) for x in (self.barcode_dict['YY'] +
-                                 self.barcode_dict['WW'])]
-        vv = [ord(x) for x in self.barcode_dict['VV']]
-
-        # id == SN == Product Serial Number
-        eep = self._query_map(EEP_MAP, name="SN")[0]
-        buffebf[eep["addr"]: eep["addr"] + eep["length"]] = id
+        start_time = self.device.time()
+        image, has_crc = self._prepare_vpd(filepath)
 
-        # yyww == MFDATE == Manufacture Date YY WW
-        eep = self._query_map(EEP_MAP, name="MFDATE")[0]
-        buffebf[eep["addr"]: eep["addr"] + eep["length"]] = yyww
-
-        # vv == ENDUSR == Manufacturer Name
-        eep = self._query_map(EEP_MAP, name="MFNAME")[0]
-        buffebf[eep["addr"]: eep["addr"] + eep["length"]] = vv
-
-        for rtn in [0x54, 0x55, 0x56]:
-            self.device.slave_addr = rtn
-            try:
-                self.device.read_reg(0x00)
-                break
-            except Exception:
-                continue
+        self.device.slave_addr = 0x14
+        if self.vpd_autoinc is None:
+            self.vpd_autoinc = self._probe_vpd_autoinc()
+        cached = self.vpd_cache.get_range(0x00, len(image)) is not None
+        if not cached:
+            self.vpd_cache.invalidate(0x00, len(image))
+        current = bytearray(self.read_vpd_range(0x00, len(image)))
+        gap = VPD_RANGE_GAP if self.vpd_autoinc else 0
+        ranges = diff_ranges(current, image, gap)
+
+        if ranges:
+            self.device.slave_addr = 0x14
+            # can be start with 0x41, 0x00 for ensurance.
+            self.device.write_reg(0x40,0x45) # enable EEP write
+        for start, length in ranges:
+            datas = image[start: start + length]
+            self._verify_vpd_range(start, datas,
+                                   self._write_vpd_range(start, datas))
+
+        # the bytes were read from the EEPROM, or read back once written,
+        # unless the image came from the cache
+        if cached:
+            self.vpd_cache.invalidate(0x00, len(image))
+        current = bytearray(self.read_vpd_range(0x00, len(image)))
+        self._check_vpd_image(image, has_crc, current)
+        return self._vpd_done(image, ranges, start_time)
 
-        for i in range(0x00, len(buffebf)):
-            #self.write_vpd_byaddress(i, buffebf[i])
-            self.device.write_reg(i, buffebf[i] & 0xFF)
-            #self.device.sleep(25)
-            #print str(i)
-            #print buffebf[i]
-        # readback to check
-        #print self.barcode_dict
-        assert self.barcode_dict["ID"] == self.read_eep_byname("SN", rtn)
+    @staticmethod
+    def _shared_vpd_ops(image):
+        """register sequence writing the image to a shared port EEPROM,
+        waiting out the write cycle of every byte, then reading back the
+        barcode fields.
+        """
+        ops = []
+        for i in range(len(image)):
+            ops += [(i, image[i] & 0xFF), (None, VPD_WAIT)]
+        for name in SHARED_CHECK_FIELDS:
+            field = EEP_TABLE[name]
+            ops += [((field.addr + i) & 0xFF, None)
+                    for i in range(field.length)]
+        return ops
+
+    def _check_shared_vpd(self, vals):
+        """the barcode fields read back by the _shared_vpd_ops sequence.
+        """
+        fields = {}
+        for name in SHARED_CHECK_FIELDS:
+            field = EEP_TABLE[name]
+            fields[name] = field.decode(vals[:field.length])
+            vals = vals[field.length:]
+        assert self.barcode_dict["ID"] == fields["SN"]
         assert (self.barcode_dict["YY"] + self.barcode_dict["WW"]) == \
-               self.read_eep_byname("MFDATE", rtn)
-        assert self.barcode_dict["VV"] == self.read_eep_byname("MFNAME", rtn)
-        return rtn
+               fields["MFDATE"]
+        assert self.barcode_dict["VV"] == fields["MFNAME"]
+
+    def write_shared_vpd(self, filepath, address=None):
+        """method to write barcode information to PGEM EEPROM
+        :param filepath: the ebf file location.
+        :param address: slave address of the EEPROM on current channel,
+                        probed if None.
+        :return: the slave address written.
+        """
+        buffebf = self._vpd_image(filepath)
+        if address is None:
+            port = self.device.OccupyPort
+            address = discover_shared_ports(self.device, [port]).get(
+                port, SHARED_EEP_ADDRESSES[-1])
+        self.device.slave_addr = address
+        vals = self.device.run_sequence(self._shared_vpd_ops(buffebf))
+        self._check_shared_vpd(vals)
+        return address
 
     def control_led(self, status="off"):
         """method to control the LED on DUT chip PCA9536DP
@@ -349,45 +558,24 @@ class PGEMBase(DUT):
         """
         self.device.slave_addr = 0x14
         # check temp value
-        val1 = self.device.read_reg(0x24, length=1)[0]
-        val2 = self.device.read_reg(0x25, length=1)[0]
-        temp=0.0
-        if val1&0x04==0x04:
-            temp=0.25
-        if val1&0x08==0x08:
-            temp = temp + 0.5
-        if val1&0x10==0x10:
-            temp = temp + 1
-        if val1&0x20==0x20:
-            temp = temp + 2
-        if val1&0x40==0x40:
-            temp = temp + 4
-        if val1&0x80==0x80:
-            temp = temp + 8
-        if val2&0x01==0x01:
-            temp = temp + 16
-        if val2&0x02==0x02:
-            temp = temp + 32
-        if val2&0x04==0x04:
-            temp = temp + 64
-        if val2&0x08==0x08:
-            temp = temp + 128
+        val = self.device.read_reg(regs.TEMP_LSB, length=2)
+        temp = regs.decode_temp(val[0], val[1])
         logger.debug("temp value: {0}".format(temp))
         return temp
 
     def meas_vcap(self):
         self.device.slave_addr = 0x14
         # check temp value
-        val = self.device.read_reg(0x27, length=1)[0]
-        temp = float(val)/10
+        val = self.device.read_reg(regs.VCAP, length=1)[0]
+        temp = regs.decode_volt(val)
         logger.debug("Vcap value: {0}".format(temp))
         return temp
 
     def meas_vin(self):
         self.device.slave_addr = 0x14
         # check temp value
-        val = self.device.read_reg(0x26, length=1)[0]
-        temp = float(val)/10
+        val = self.device.read_reg(regs.VIN, length=1)[0]
+        temp = regs.decode_volt(val)
         logger.debug("Vcap value: {0}".format(temp))
         return temp
 
@@ -405,7 +593,7 @@ class PGEMBase(DUT):
         val = self.device.read_reg(0x20, length=1)[0]
         logger.debug("HWready value: {0}".format(val))
         #logger.info("HWready value: {0}".format(val))
-        if val==0xA5:
+        if val==HWREADY_VALUE:
             return True
         else:
             return False
@@ -438,20 +626,22 @@ class PGEMBase(DUT):
         self.device.slave_addr = 0x14
         self.device.write_reg(0x05, 0xE6)
         logger.info("reset min max")
-        time.sleep(5)
+        self.device.sleep(5000)
 
     def flush_ee(self):
         self.device.slave_addr = 0x14
         self.device.write_reg(0x41, 0x3A)
         logger.info("flush eeprom")
-        time.sleep(1)
+        self.device.sleep(1000)
+        self.vpd_cache.invalidate()
 
     def reset_sys(self):
         self.device.slave_addr = 0x14
         # reset register
         self.device.write_reg(0x04, 0xF4)
         logger.info("reset system")
-        time.sleep(5)
+        self.device.sleep(5000)
+        self.vpd_cache.invalidate()
 
     def start_cap(self):
         self.device.slave_addr = 0x14
@@ -471,17 +661,227 @@ class PGEMBase(DUT):
 
     def charge_status(self):
         self.device.slave_addr = 0x14
-        # check temp value
-        val1 = self.device.read_reg(0x23, length=1)[0]
-        #logger.info("PGEMSTAT value: {0}".format(val1))
-        logger.debug("PGEMSTAT value: {0}".format(val1))
-        val2 = self.device.read_reg(0x21, length=1)[0]
-        #logger.info("GTG value: {0}".format(val2))
-        logger.debug("GTG value: {0}".format(val2))
-        if ((val1|0xFE)==0xFE) & ((val2&0x09)==0x09):
-            return True
+        # GTG, GTG_WARN and PGEMSTAT in one read
+        val = self.device.read_reg(regs.GTG, length=3)
+        logger.debug("PGEMSTAT value: {0}".format(val[2]))
+        logger.debug("GTG value: {0}".format(val[0]))
+        return regs.is_charged(val[2], val[0])
+
+    def read_status_block(self):
+        """read the status registers 0x20 - 0x28 in one block read, the
+        erie board falls back to single register reads on old firmware.
+        :return: StatusBlock
+        """
+        self.device.slave_addr = 0x14
+        raw = self.device.read_reg(STATUS_BLOCK_ADDR, length=STATUS_BLOCK_LEN)
+        status = StatusBlock.decode(raw)
+        logger.debug("status block: {0}".format(status))
+        return status
+
+
+def read_vpd_many(duts, start, length):
+    """read the same VPD range of several DUTs on one Erie board, the
+    register sequences of all the slots interleaved in one batch of frames,
+    while a slot waits VPD_WAIT for its EEPROM the frames of the others go
+    on. The bytes are read from EEPROM even if cached, and refresh the
+    cache.
+    :param duts: PGEMBase objects sharing one adapter.
+    :return: list of the bytes (list of int) of each DUT, or the exception
+             which failed it.
+    """
+    if not duts:
+        return []
+    adapter = duts[0].device
+    adapter.slave_addr = 0x14
+    results = [None] * len(duts)
+    for i, dut in enumerate(duts):
+        if dut.vpd_autoinc is None:
+            adapter.select_channel(dut.slotnum)
+            try:
+                dut.vpd_autoinc = dut._probe_vpd_autoinc()
+            except Exception as e:
+                results[i] = e
+    todo = [i for i in range(len(duts)) if results[i] is None]
+    jobs = [(duts[i].slotnum,
+             PGEMBase._vpd_read_ops(start, length, duts[i].vpd_autoinc))
+            for i in todo]
+    for i, vals in zip(todo, adapter.run_sequences(jobs)):
+        dut = duts[i]
+        if isinstance(vals, Exception):
+            results[i] = vals
+            continue
+        adapter.select_channel(dut.slotnum)
+        try:
+            datas = dut._vpd_read_result(start, length, dut.vpd_autoinc,
+                                         vals)
+            if datas is None:
+                vals = adapter.run_sequence(
+                    PGEMBase._vpd_read_ops(start, length, False))
+                datas = dut._vpd_read_result(start, length, False, vals)
+        except Exception as e:
+            results[i] = e
+            continue
+        for j, v in enumerate(datas):
+            dut.vpd_cache.put(start + j, v)
+        results[i] = datas
+    return results
+
+
+def write_vpd_many(duts, filepaths):
+    """program the VPD of several DUTs on one Erie board, as write_vpd does
+    for one. The register sequences of all the slots are interleaved frame
+    by frame, while a slot waits VPD_WAIT for the write cycle of a byte
+    the frames of the others go on. Each DUT is verified and fails on its
+    own.
+    :param duts: PGEMBase objects sharing one adapter.
+    :param filepaths: ebf file of each DUT.
+    :return: list of the bytes written to each DUT, or the exception which
+             failed it, AssertionError if the verification failed.
+    """
+    if not duts:
+        return []
+    adapter = duts[0].device
+    start_time = adapter.time()
+    results = [None] * len(duts)
+    images = [dut._prepare_vpd(f) for dut, f in zip(duts, filepaths)]
+
+    # current images, from the cache if complete, the others read at once
+    currents = [dut.vpd_cache.get_range(0x00, len(image))
+                for dut, (image, has_crc) in zip(duts, images)]
+    todo = [i for i, current in enumerate(currents) if current is None]
+    cached = [current is not None for current in currents]
+    length = max([len(images[i][0]) for i in todo] or [0])
+    for i, ret in zip(todo, read_vpd_many([duts[i] for i in todo], 0x00,
+                                          length)):
+        if isinstance(ret, Exception):
+            results[i] = ret
         else:
-            return False
+            currents[i] = ret
+
+    ranges = [[]] * len(duts)
+    jobs, owners = [], []
+    for i, dut in enumerate(duts):
+        if results[i] is not None:
+            continue
+        image = images[i][0]
+        gap = VPD_RANGE_GAP if dut.vpd_autoinc else 0
+        ranges[i] = diff_ranges(currents[i][:len(image)], image, gap)
+        if not ranges[i]:
+            continue
+        # can be start with 0x41, 0x00 for ensurance.
+        ops = [(0x40, 0x45)]  # enable EEP write
+        for start, n in ranges[i]:
+            ops += PGEMBase._vpd_write_ops(start, image[start:start + n],
+                                           dut.vpd_autoinc)
+        jobs.append((dut.slotnum, ops))
+        owners.append(i)
+    adapter.slave_addr = 0x14
+    for i, vals in zip(owners, adapter.run_sequences(jobs)):
+        if isinstance(vals, Exception):
+            results[i] = vals
+            continue
+        dut, image = duts[i], images[i][0]
+        adapter.select_channel(dut.slotnum)
+        adapter.slave_addr = 0x14
+        try:
+            for start, n in ranges[i]:
+                datas = image[start:start + n]
+                reads = len([op for op in PGEMBase._vpd_write_ops(
+                    start, datas, dut.vpd_autoinc) if op[1] is None])
+                readback = dut._vpd_write_result(start, datas,
+                                                 dut.vpd_autoinc,
+                                                 vals[:reads])
+                vals = vals[reads:]
+                if readback is None:
+                    readback = dut._write_vpd_range(start, datas)
+                dut._verify_vpd_range(start, datas, readback)
+        except Exception as e:
+            results[i] = e
+
+    # the bytes were read from the EEPROMs, or read back once written, the
+    # images which came from the cache are read again at once
+    for i, dut in enumerate(duts):
+        if results[i] is None and not cached[i]:
+            currents[i] = dut.vpd_cache.get_range(0x00, len(images[i][0]))
+    todo = [i for i in range(len(duts))
+            if results[i] is None and (cached[i] or currents[i] is None)]
+    for i in todo:
+        duts[i].vpd_cache.invalidate(0x00, len(images[i][0]))
+    length = max([len(images[i][0]) for i in todo] or [0])
+    for i, ret in zip(todo, read_vpd_many([duts[i] for i in todo], 0x00,
+                                          length)):
+        currents[i] = ret
+    for i, dut in enumerate(duts):
+        if results[i] is not None:
+            continue
+        if isinstance(currents[i], Exception):
+            results[i] = currents[i]
+            continue
+        image, has_crc = images[i]
+        adapter.select_channel(dut.slotnum)
+        try:
+            dut._check_vpd_image(image, has_crc,
+                                 bytearray(currents[i][:len(image)]))
+            results[i] = dut._vpd_done(image, ranges[i], start_time)
+        except Exception as e:
+            results[i] = e
+    return results
+
+
+def discover_shared_ports(adapter, ports,
+                          addresses=SHARED_EEP_ADDRESSES):
+    """slave address of the EEPROM of 4-in-1 shared ports, every port and
+    address probed in one batch.
+    :param ports: shared port numbers.
+    :return: dict of port and address, a port where no address answers is
+             left out.
+    """
+    targets = [(port, address) for port in ports for address in addresses]
+    found = {}
+    for (port, address), ok in zip(targets, adapter.probe(targets)):
+        if ok and port not in found:
+            found[port] = address
+    return found
+
+
+def write_shared_vpd_many(duts, filepaths, shared):
+    """program the shared port EEPROMs of several 4-in-1 masters, as
+    write_shared_vpd does for one port. The ports at the same address are
+    written as one interleaved batch, one batch per address.
+    :param duts: master PGEMBase objects sharing one adapter.
+    :param filepaths: ebf file of each DUT.
+    :param shared: dict of shared port and EEPROM address, from
+                   discover_shared_ports.
+    :return: list of None for each DUT written, or the exception which
+             failed it, AssertionError if the readback failed.
+    """
+    if not duts:
+        return []
+    adapter = duts[0].device
+    results = [None] * len(duts)
+    batches = {}
+    for i, (dut, filepath) in enumerate(zip(duts, filepaths)):
+        ops = dut._shared_vpd_ops(dut._vpd_image(filepath))
+        for port in range(dut.slotnum + 1, dut.slotnum + 4):
+            batches.setdefault(shared[port], []).append((i, port, ops))
+    for address in sorted(batches):
+        jobs = [(port, ops) for i, port, ops in batches[address]
+                if results[i] is None]
+        owners = [(i, port) for i, port, ops in batches[address]
+                  if results[i] is None]
+        adapter.slave_addr = address
+        for (i, port), vals in zip(owners, adapter.run_sequences(jobs)):
+            if isinstance(vals, Exception):
+                results[i] = vals
+                continue
+            try:
+                duts[i]._check_shared_vpd(vals)
+            except AssertionError as e:
+                results[i] = e
+                continue
+            logger.info("shared port: {0} writed at address 0x{1:x}...".
+                        format(port, address))
+    return results
 
 
 class Diamond4(PGEMBase):
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""regs.py: codec of the status registers of PGEM at slave 0x14.
+The decoders work on register values already read, one register or a
+whole status block, and look the values up in tables computed once.
+"""
+__version__ = "0.1"
+__author__ = "@fanmuzhi, @boqiling"
+__all__ = ["BitField", "StatusBlock", "decode_temp", "decode_volt",
+           "is_charged", "CHARGE_DONE", "CAP_MEAS_DONE", "GTG_CHARGED",
+           "GTG_CAP_OK", "GTG_NO_WARNING"]
+
+from collections import namedtuple
+
+SLAVE_ADDR = 0x14
+
+# status registers
+HWREADY = 0x20
+GTG = 0x21
+GTG_WARN = 0x22
+PGEMSTAT = 0x23
+TEMP_LSB = 0x24
+TEMP_MSB = 0x25
+VIN = 0x26
+VCAP = 0x27
+CHG_TIME = 0x28
+
+HWREADY_VALUE = 0xA5
+
+# status registers 0x20 - 0x28, read in one block
+STATUS_BLOCK_ADDR = HWREADY
+STATUS_BLOCK_LEN = CHG_TIME - HWREADY + 1
+
+# temperature of SE97B, 0.25 degree per bit from lsb bit 2 up to msb bit 3
+TEMP_LSB_TABLE = tuple((v >> 2) * 0.25 for v in range(256))
+TEMP_MSB_TABLE = tuple((v & 0x0F) * 16.0 for v in range(256))
+# VIN and VCAP, 0.1V per bit
+VOLT_TABLE = tuple(v / 10.0 for v in range(256))
+
+
+class BitField(object):
+    """bits of a register, set if raw & mask == value, the result of the
+    256 register values computed once.
+    """
+    __slots__ = ("name", "reg", "mask", "value", "table")
+
+    def __init__(self, name, reg, mask, value=None):
+        self.name = name
+        self.reg = reg
+        self.mask = mask
+        self.value = mask if value is None else value
+        self.table = tuple((v & mask) == self.value for v in range(256))
+
+    def __call__(self, raw):
+        return self.table[raw]
+
+    def __repr__(self):
+        return "BitField({0}, 0x{1:02x}, 0x{2:02x}, 0x{3:02x})".format(
+            self.name, self.reg, self.mask, self.value)
+
+
+# PGEMSTAT.bit0 == 0, the charge is done
+CHARGE_DONE = BitField("CHARGE_DONE", PGEMSTAT, 0x01, 0x00)
+# PGEMSTAT.bit2 == 0, the capacitance measure is complete
+CAP_MEAS_DONE = BitField("CAP_MEAS_DONE", PGEMSTAT, 0x04, 0x00)
+# GTG.bit0 and GTG.bit3, charged
+GTG_CHARGED = BitField("GTG_CHARGED", GTG, 0x09)
+# GTG.bit1, the capacitance is good
+GTG_CAP_OK = BitField("GTG_CAP_OK", GTG, 0x02)
+# GTG_WARNING == 0x00
+GTG_NO_WARNING = BitField("GTG_NO_WARNING", GTG_WARN, 0xFF, 0x00)
+
+_CHARGE_DONE = CHARGE_DONE.table
+_GTG_CHARGED = GTG_CHARGED.table
+
+
+def decode_temp(lsb, msb):
+    """temperature of SE97B, registers 0x24 (lsb) and 0x25 (msb).
+    """
+    return TEMP_LSB_TABLE[lsb] + TEMP_MSB_TABLE[msb]
+
+
+def decode_volt(raw):
+    """VIN or VCAP, registers 0x26 and 0x27.
+    """
+    return VOLT_TABLE[raw]
+
+
+def is_charged(pgemstat, gtg):
+    """charge done, PGEMSTAT.bit0 == 0 and GTG.bit0, GTG.bit3 set.
+    """
+    return _CHARGE_DONE[pgemstat] and _GTG_CHARGED[gtg]
+
+
+_new = tuple.__new__
+
+
+class StatusBlock(namedtuple("StatusBlock",
+                             ["hwready", "gtg", "gtg_warn", "pgemstat",
+                              "temperature", "vin", "vcap", "chg_time",
+                              "raw"])):
+    """snapshot of the status registers 0x20 - 0x28, decoded.
+    """
+    __slots__ = ()
+    ADDR = STATUS_BLOCK_ADDR
+    LEN = STATUS_BLOCK_LEN
+
+    @classmethod
+    def decode(cls, raw):
+        """
+        :param raw: the 9 register values from 0x20 on.
+        """
+        raw = tuple(raw)
+        return _new(cls, (raw[0] == HWREADY_VALUE, raw[1], raw[2], raw[3],
+                          TEMP_LSB_TABLE[raw[4]] + TEMP_MSB_TABLE[raw[5]],
+                          VOLT_TABLE[raw[6]], VOLT_TABLE[raw[7]],
+                          int(raw[8]), raw))
+
+    @property
+    def charged(self):
+        return _CHARGE_DONE[self.pgemstat] and _GTG_CHARGED[self.gtg]
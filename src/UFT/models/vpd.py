@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Shadow copy of the PGEM VPD address space, and the compiled table of
+its fields.
+"""
+__version__ = "0.1"
+__author__ = "@fanmuzhi, @boqiling"
+__all__ = ["VPDCache", "VPDField", "FieldTable", "diff_ranges", "vpd_crc",
+           "stored_crc"]
+
+import struct
+import binascii
+
+# VPD address space behind register 0x00/0x01/0x02 of slave 0x14
+VPD_SIZE = 0x1000
+# 0x000 - 0x0FF is the programmed image, from 0x100 on the PGEM firmware
+# keeps its runtime data (LASTCAP, PWRCYCS, ...), never cached.
+VPD_CACHEABLE = 0x100
+# VPD_CRC field, CRC of the image bytes before it, low byte first
+VPD_CRC_ADDR = 0x0FE
+
+# characters dropped from a str field, all but 0x20 - 0x7E
+NON_PRINTABLE = "".join(chr(c) for c in range(256) if not 0x1F < c < 0x7F)
+# struct format of an int field by length, little endian
+INT_FORMATS = {1: "B", 2: "H", 4: "I"}
+
+
+class VPDField(object):
+    """one field of a VPD map, {"name", "addr", "length", "type"}, with its
+    struct format compiled. "int" and "word" are little endian unsigned,
+    "str" keeps the printable characters only.
+    """
+    __slots__ = ["name", "addr", "length", "typ", "end", "fmt", "struct"]
+
+    def __init__(self, eep):
+        self.name = eep["name"]
+        self.addr = eep["addr"]
+        self.length = eep["length"]
+        self.typ = eep["type"]
+        self.end = self.addr + self.length
+        if self.typ == "str":
+            self.fmt = "{0}s".format(self.length)
+        elif self.length in INT_FORMATS:
+            self.fmt = INT_FORMATS[self.length]
+        else:
+            # odd length int, unpacked as bytes and shifted together
+            self.fmt = "{0}s".format(self.length)
+        self.struct = struct.Struct("<" + self.fmt)
+
+    def convert(self, raw):
+        """value of the field from what its format unpacked.
+        """
+        if self.typ == "str":
+            return raw.translate(None, NON_PRINTABLE)
+        if isinstance(raw, str):
+            val = 0
+            for i, b in enumerate(bytearray(raw)):
+                val += b << 8 * i
+            return val
+        return raw
+
+    def decode(self, datas, offset=0):
+        """value of the field from its bytes, datas is a str, bytearray or
+        list of int, the field starts at datas[offset].
+        """
+        if isinstance(datas, list):
+            datas = bytearray(datas[offset:offset + self.length])
+            offset = 0
+        return self.convert(self.struct.unpack_from(bytes(datas), offset)[0])
+
+    def encode(self, value):
+        """bytes of value, a str is padded with 0x00.
+        :return: list of int
+        """
+        if self.typ == "str":
+            if len(value) > self.length:
+                raise ValueError("{0} longer than {1} bytes".format(
+                    self.name, self.length))
+            raw = value.ljust(self.length, "\0")
+        elif self.fmt in ("B", "H", "I"):
+            raw = self.struct.pack(value)
+        else:
+            raw = "".join(chr((value >> 8 * i) & 0xFF)
+                          for i in range(self.length))
+        return list(bytearray(raw))
+
+
+class FieldTable(object):
+    """VPD map compiled once: fields by name, and one struct over the
+    whole image to decode all the fields in one unpack.
+    """
+
+    def __init__(self, eep_map):
+        self.fields = [VPDField(eep) for eep in eep_map]
+        self.by_name = dict((f.name, f) for f in self.fields)
+        ordered = sorted(self.fields, key=lambda f: f.addr)
+        self.end = max(f.end for f in ordered)
+        fmt = "<"
+        pos = 0
+        for f in ordered:
+            if f.addr < pos:
+                raise ValueError("VPD field {0} overlaps".format(f.name))
+            if f.addr > pos:
+                fmt += "{0}x".format(f.addr - pos)
+            fmt += f.fmt
+            pos = f.end
+        self.image_struct = struct.Struct(fmt)
+        self.ordered = ordered
+        self._spans = {}
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def decode_image(self, image):
+        """all the fields of an image from address 0 on, str or bytearray
+        of self.end bytes at least.
+        :return: dict of field name and value.
+        """
+        raws = self.image_struct.unpack_from(bytes(image))
+        return dict((f.name, f.convert(raw))
+                    for f, raw in zip(self.ordered, raws))
+
+    def encode_into(self, image, name, value):
+        """write the bytes of field name into image, list or bytearray.
+        """
+        f = self.by_name[name]
+        image[f.addr:f.end] = f.encode(value)
+
+    def spans(self, gap=0):
+        """address ranges covering all the fields, fields closer than gap
+        bytes are in one range.
+        :return: list of (start, end)
+        """
+        if gap not in self._spans:
+            spans = []
+            for f in self.ordered:
+                if spans and f.addr <= spans[-1][1] + gap:
+                    spans[-1][1] = max(spans[-1][1], f.end)
+                else:
+                    spans.append([f.addr, f.end])
+            self._spans[gap] = [tuple(s) for s in spans]
+        return self._spans[gap]
+
+
+def diff_ranges(old, new, gap=0):
+    """byte ranges where new differs from old, ranges closer than gap
+    bytes are merged.
+    :return: list of (start, length)
+    """
+    ranges = []
+    for addr in range(len(new)):
+        if addr < len(old) and old[addr] == new[addr]:
+            continue
+        if ranges and addr <= ranges[-1][1] + gap:
+            ranges[-1][1] = addr + 1
+        else:
+            ranges.append([addr, addr + 1])
+    return [(start, end - start) for start, end in ranges]
+
+
+def vpd_crc(image):
+    """VPD_CRC of image, CRC-16/XMODEM (0x1021, init 0, not reflected) of
+    image[0:VPD_CRC_ADDR], the algorithm of test/testCRC.py the ebf files
+    are made with. Not to be mixed up with erie.crc16 of the Erie framing,
+    which starts from 0xFFFF.
+    """
+    return binascii.crc_hqx(bytes(bytearray(image[:VPD_CRC_ADDR])), 0)
+
+
+def stored_crc(image):
+    """VPD_CRC field of image.
+    """
+    return image[VPD_CRC_ADDR] | (image[VPD_CRC_ADDR + 1] << 8)
+
+
+class VPDCache(object):
+    """bytearray image of the VPD with a validity and a dirty bitmap,
+    one bit per byte. A valid byte was read from or verified against the
+    EEPROM and is served from the cache. A dirty byte was written but not
+    read back yet, it is not served until it is read again.
+    """
+
+    def __init__(self, size=VPD_SIZE, cacheable=VPD_CACHEABLE):
+        self.size = size
+        self.cacheable = cacheable
+        self.image = bytearray(size)
+        self.valid = bytearray((size + 7) >> 3)
+        self.dirty = bytearray((size + 7) >> 3)
+
+    def get(self, addr):
+        """cached value of addr, None if it must be read from the EEPROM.
+        """
+        if addr >= self.cacheable:
+            return None
+        if self.valid[addr >> 3] & (1 << (addr & 7)):
+            return self.image[addr]
+        return None
+
+    def get_range(self, addr, length):
+        """cached values of addr .. addr + length - 1, or None if any of
+        them must be read from the EEPROM.
+        """
+        vals = []
+        for a in range(addr, addr + length):
+            val = self.get(a)
+            if val is None:
+                return None
+            vals.append(val)
+        return vals
+
+    def put(self, addr, value):
+        """value read from the EEPROM at addr.
+        """
+        if addr >= self.cacheable:
+            return
+        self.image[addr] = value & 0xFF
+        self.valid[addr >> 3] |= 1 << (addr & 7)
+        self.dirty[addr >> 3] &= ~(1 << (addr & 7)) & 0xFF
+
+    def write(self, addr, value):
+        """value written to the EEPROM at addr, valid once read back.
+        """
+        if addr >= self.cacheable:
+            return
+        self.image[addr] = value & 0xFF
+        self.valid[addr >> 3] &= ~(1 << (addr & 7)) & 0xFF
+        self.dirty[addr >> 3] |= 1 << (addr & 7)
+
+    def is_dirty(self, addr):
+        return bool(self.dirty[addr >> 3] & (1 << (addr & 7)))
+
+    def dirty_addresses(self):
+        return [a for a in range(self.cacheable) if self.is_dirty(a)]
+
+    def invalidate(self, addr=None, length=1):
+        """forget addr .. addr + length - 1, or the whole image if addr is
+        None, e.g. after the DUT was reset.
+        """
+        if addr is None:
+            self.valid[:] = bytearray(len(self.valid))
+            self.dirty[:] = bytearray(len(self.dirty))
+            return
+        for a in range(addr, min(addr + length, self.size)):
+            self.valid[a >> 3] &= ~(1 << (a & 7)) & 0xFF
+            self.dirty[a >> 3] &= ~(1 << (a & 7)) & 0xFF
+
+    def export(self):
+        """hex string of the cacheable image, 2 characters per byte, "??"
+        for a byte not known, up to the last known byte.
+        """
+        out = []
+        for a in range(self.cacheable):
+            val = self.get(a)
+            out.append("??" if val is None else "%02X" % val)
+        while out and out[-1] == "??":
+            out.pop()
+        return "".join(out)
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""vpd_dump.py: VPD images of PGEM saved to binary files, and their diff.
+A dump file is named after the barcode and the time of the dump,
+<barcode>_<YYYYmmdd_HHMMSS_mmm>.vpd, and shown or compared offline by:
+    python -m UFT.models.vpd_dump <dump file> [<other dump file>]
+"""
+__version__ = "0.1"
+__author__ = "@fanmuzhi, @boqiling"
+__all__ = ["VPDDump", "VPDDiff", "read_duts", "save_dump", "load_dump",
+           "diff_dumps", "format_diff"]
+
+import os
+import sys
+import time
+import struct
+import logging
+from collections import namedtuple
+from base import EEP_TABLE, read_vpd_many
+from vpd import VPD_SIZE
+
+logger = logging.getLogger(__name__)
+
+DUMP_MAGIC = "PGEMVPD1"
+DUMP_SUFFIX = ".vpd"
+# file header: magic, barcode, time of the dump, start address, length,
+# then length bytes of VPD
+DUMP_HEADER = struct.Struct("<8s40sdHH")
+
+
+class VPDDump(namedtuple("VPDDump", ["barcode", "time", "start", "data"])):
+    """VPD bytes data of a DUT from address start on, read at time.
+    """
+    __slots__ = ()
+
+    @property
+    def end(self):
+        return self.start + len(self.data)
+
+    def byte(self, addr):
+        return ord(self.data[addr - self.start])
+
+
+# one difference, decoded value of the field, or hex bytes if no field of
+# EEP_TABLE covers it (name is None)
+VPDDiff = namedtuple("VPDDiff", ["name", "addr", "length", "old", "new"])
+
+
+def read_duts(duts, start=0x000, length=VPD_SIZE):
+    """read the same VPD range of several DUTs on one Erie board at once,
+    see read_vpd_many.
+    :param duts: PGEMBase objects sharing one adapter.
+    :return: list of VPDDump, or the exception if the DUT failed.
+    """
+    dumps = []
+    for dut, ret in zip(duts, read_vpd_many(duts, start, length)):
+        if not isinstance(ret, Exception):
+            ret = VPDDump(dut.barcode, time.time(), start,
+                          bytes(bytearray(ret)))
+        dumps.append(ret)
+    return dumps
+
+
+def dump_name(barcode, timestamp):
+    ms = int(timestamp * 1000) % 1000
+    return "{0}_{1}_{2:03d}{3}".format(
+        barcode, time.strftime("%Y%m%d_%H%M%S", time.localtime(timestamp)),
+        ms, DUMP_SUFFIX)
+
+
+def save_dump(dump, directory):
+    """write dump to a binary file in directory.
+    :return: path of the file.
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    path = os.path.join(directory, dump_name(dump.barcode, dump.time))
+    with open(path, "wb") as f:
+        f.write(DUMP_HEADER.pack(DUMP_MAGIC, dump.barcode, dump.time,
+                                 dump.start, len(dump.data)))
+        f.write(dump.data)
+    return path
+
+
+def load_dump(path):
+    """read a dump file.
+    :return: VPDDump
+    """
+    with open(path, "rb") as f:
+        head = f.read(DUMP_HEADER.size)
+        if len(head) < DUMP_HEADER.size:
+            raise ValueError("not a VPD dump file")
+        magic, barcode, t, start, length = DUMP_HEADER.unpack(head)
+        if magic != DUMP_MAGIC:
+            raise ValueError("not a VPD dump file")
+        data = f.read(length)
+    return VPDDump(barcode.rstrip("\0"), t, start, data)
+
+
+def diff_dumps(old, new, table=EEP_TABLE):
+    """differences of two dumps where their ranges overlap, by field of
+    table, the bytes outside of the fields by contiguous runs.
+    :return: list of VPDDiff in address order.
+    """
+    start, end = max(old.start, new.start), min(old.end, new.end)
+    changed = [a for a in range(start, end) if old.byte(a) != new.byte(a)]
+    if not changed:
+        return []
+    diffs = []
+    named = set()
+    for field in table.fields:
+        if field.addr < start or field.end > end:
+            continue
+        addrs = range(field.addr, field.end)
+        if not any(old.byte(a) != new.byte(a) for a in addrs):
+            continue
+        named.update(addrs)
+        diffs.append(VPDDiff(
+            field.name, field.addr, field.length,
+            field.decode(old.data, field.addr - old.start),
+            field.decode(new.data, field.addr - new.start)))
+    runs = []
+    for a in changed:
+        if a in named:
+            continue
+        if runs and runs[-1][1] == a:
+            runs[-1][1] = a + 1
+        else:
+            runs.append([a, a + 1])
+    for a, b in runs:
+        diffs.append(VPDDiff(
+            None, a, b - a,
+            " ".join("%02X" % old.byte(x) for x in range(a, b)),
+            " ".join("%02X" % new.byte(x) for x in range(a, b))))
+    return sorted(diffs, key=lambda d: d.addr)
+
+
+def format_diff(diffs):
+    """one line per difference.
+    """
+    lines = []
+    for d in diffs:
+        name = d.name if d.name is not None else "-"
+        lines.append("0x{0:03X} {1:3d} {2:22s} {3!r} -> {4!r}".format(
+            d.addr, d.length, name, d.old, d.new))
+    return lines
+
+
+def format_dump(dump):
+    """hex dump, 16 bytes per line.
+    """
+    data = bytearray(dump.data)
+    lines = []
+    for i in range(0, len(data), 16):
+        row = data[i:i + 16]
+        lines.append("0x{0:03X}: {1}".format(
+            dump.start + i, " ".join("%02X" % b for b in row)))
+    return lines
+
+
+def main(paths):
+    dumps = [load_dump(p) for p in paths]
+    for dump in dumps:
+        print "{0} {1} 0x{2:03X} - 0x{3:03X}".format(
+            dump.barcode, time.strftime("%Y-%m-%d %H:%M:%S",
+                                        time.localtime(dump.time)),
+            dump.start, dump.end - 1)
+    if len(dumps) == 1:
+        for line in format_dump(dumps[0]):
+            print line
+        return
+    diffs = diff_dumps(dumps[0], dumps[1])
+    if not diffs:
+        print "no difference"
+    for line in format_diff(diffs):
+        print line
+
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print "usage: python -m UFT.models.vpd_dump <dump file> " \
+              "[<other dump file>]"
+        sys.exit(1)
+    main(sys.argv[1:])
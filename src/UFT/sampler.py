@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""sampler.py: adaptive vcap sampling of the charge and discharge phases.
+The slope of vcap is estimated from the recent Cycle samples of a DUT, the
+next sample is taken at a part of the time predicted to the threshold, so
+the samples are sparse far from the threshold and dense at the crossing.
+The status reads of all the DUTs of a board are kept under a maximum rate.
+"""
+
+__version__ = "0.1"
+__author__ = "@fanmuzhi, @boqiling"
+__all__ = ["VcapSampler", "SampleBudget"]
+
+from collections import deque
+
+# samples the slope is estimated from
+WINDOW = 5
+# the next sample is taken at this part of the time to the threshold
+LEAD = 0.5
+# vcap resolution of the status registers, in V
+RESOLUTION = 0.1
+
+
+class VcapSampler(object):
+    """next sample interval of one DUT, from its vcap trajectory.
+    :param threshold: vcap the phase waits for, in V.
+    :param interval: interval while no crossing is predicted.
+    :param floor: shortest interval, at the crossing.
+    :param ceiling: longest interval, far from the threshold.
+    """
+
+    def __init__(self, threshold, interval, floor, ceiling):
+        self.threshold = threshold
+        self.interval = interval
+        self.floor = floor
+        self.ceiling = max(ceiling, interval)
+        self.samples = deque(maxlen=WINDOW)
+        self.slope = None
+
+    def add(self, cycle):
+        """add a sample.
+        :param cycle: Cycle with time and vcap.
+        """
+        self.samples.append((cycle.time, cycle.vcap))
+        slope = self._fit()
+        # the vcap steps are coarse, a flat fit near the threshold keeps
+        # the slope estimated before.
+        if slope is not None and self._towards(slope):
+            self.slope = slope
+
+    def _fit(self):
+        """least squares slope of the samples, in V/s.
+        """
+        n = len(self.samples)
+        if n < 2:
+            return None
+        mt = sum(t for t, v in self.samples) / n
+        mv = sum(v for t, v in self.samples) / n
+        stt = sum((t - mt) ** 2 for t, v in self.samples)
+        if stt <= 0:
+            return None
+        return sum((t - mt) * (v - mv) for t, v in self.samples) / stt
+
+    def _towards(self, slope):
+        if self.threshold is None:
+            return False
+        vcap = self.samples[-1][1]
+        return (self.threshold - vcap) * slope > 0
+
+    def time_to_threshold(self):
+        """predicted seconds to the crossing, None if not predicted. vcap
+        read at the threshold is taken half a step away from it.
+        """
+        if not self.samples or self.threshold is None or not self.slope:
+            return None
+        delta = self.threshold - self.samples[-1][1]
+        if delta * self.slope < 0:
+            return None
+        return (abs(delta) + RESOLUTION / 2) / abs(self.slope)
+
+    def next_interval(self):
+        eta = self.time_to_threshold()
+        if eta is None:
+            return self.interval
+        return min(max(eta * LEAD, self.floor), self.ceiling)
+
+
+class SampleBudget(object):
+    """shares a maximum rate of status reads between the DUTs sampled on a
+    board. A DUT gets the interval it asks for if the rates of the others
+    leave room, at least its fair share of the rate otherwise.
+    :param max_rate: status reads per second.
+    """
+
+    def __init__(self, max_rate):
+        self.max_rate = float(max_rate)
+        self.rates = {}
+
+    def grant(self, slot, interval):
+        """
+        :param interval: interval slot asks for.
+        :return: interval granted to slot.
+        """
+        others = sum(r for s, r in self.rates.items() if s != slot)
+        share = self.max_rate / (len(self.rates) + (slot not in self.rates))
+        spare = max(self.max_rate - others, share)
+        granted = max(interval, 1.0 / spare)
+        self.rates[slot] = 1.0 / granted
+        return granted
+
+    def release(self, slot):
+        self.rates.pop(slot, None)
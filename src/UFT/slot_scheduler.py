@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""slot_scheduler.py: per slot state machines of a channel.
+Each DUT goes through its own list of phases, a phase is a generator which
+yields what it waits for, and the DUT moves on to its next phase as soon
+as the phase returns, whatever the other DUTs do. The status blocks, and
+the hardware ready flags, of all the DUTs due at the same time are read in
+one batch, the steps of the phases run one at a time in the channel
+thread, so the power and load switching of the board never overlaps.
+"""
+
+__version__ = "0.1"
+__author__ = "@fanmuzhi, @boqiling"
+__all__ = ["SlotScheduler", "Sleep", "Status", "Wait", "Ready"]
+
+import sys
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# DUTs due within TICK seconds are served together
+TICK = 0.05
+# longest wait between two calls of feed
+FEED_INTERVAL = 1.0
+# the DUTs waiting for hardware ready are read every READY_POLL seconds
+READY_POLL = 0.2
+
+
+class Sleep(namedtuple("Sleep", ["seconds"])):
+    """the phase resumes after seconds.
+    """
+    __slots__ = ()
+
+
+class Status(namedtuple("Status", ["interval"])):
+    """the phase resumes with the status block of its DUT, read interval
+    seconds later together with the other DUTs due, or the exception of the
+    read thrown into the phase.
+    """
+    __slots__ = ()
+
+
+class Wait(namedtuple("Wait", ["future"])):
+    """the phase resumes with the result of an erie_io future once it is
+    done, or its exception thrown into the phase.
+    """
+    __slots__ = ()
+
+
+class Ready(namedtuple("Ready", ["timeout"])):
+    """the phase resumes with True as soon as its DUT reports hardware
+    ready, or after timeout seconds with the last flag read, False, or None
+    if the DUT did not answer. The DUTs waiting are read together every
+    READY_POLL seconds.
+    """
+    __slots__ = ()
+
+
+class _Slot(object):
+    __slots__ = ("dut", "phases", "index", "gen", "request", "wake_at",
+                 "deadline")
+
+    def __init__(self, dut, phases):
+        self.dut = dut
+        self.phases = phases
+        self.index = -1
+        self.gen = None
+        self.request = None
+        self.wake_at = 0.0
+        self.deadline = 0.0
+
+
+class SlotScheduler(object):
+    """runs the phases of several DUTs interleaved.
+    :param clock: time source with time() and sleep().
+    :param read_status: function of a list of DUTs returning a dict of slot
+                        number and StatusBlock or exception.
+    :param on_phase: function called with the DUT and the phase function
+                     when the DUT finished a phase.
+    :param read_ready: function of a list of DUTs returning a dict of slot
+                       number and True if the DUT is hardware ready, False
+                       if it is not, None if it did not answer.
+    """
+
+    def __init__(self, clock, read_status, on_phase=None, read_ready=None):
+        self.clock = clock
+        self.read_status = read_status
+        self.on_phase = on_phase
+        self.read_ready = read_ready
+        self.slots = []
+
+    def add(self, dut, phases):
+        """add a DUT, also while the scheduler runs.
+        :param phases: list of functions of the DUT, returning a generator
+                       of Sleep, Status, Wait and Ready, or None if the
+                       phase has nothing to wait for.
+        """
+        self.slots.append(_Slot(dut, phases))
+
+    def run(self, feed=None):
+        """run all the phases of all the DUTs, an exception of a phase
+        other than the ones thrown into it stops the scheduler.
+        :param feed: function called at least every FEED_INTERVAL seconds,
+                     which may add DUTs. The scheduler returns once all the
+                     DUTs are done after a call of feed.
+        """
+        while True:
+            if feed is not None:
+                feed()
+            now = self.clock.time()
+            for slot in self.slots:
+                if slot.index < 0:
+                    self._step(slot, now, None, None)
+            self.slots = [s for s in self.slots if s.gen is not None]
+            active = self.slots
+            if not active:
+                return
+            now = self.clock.time()
+            due = [s for s in active if s.wake_at <= now + TICK and
+                   (not isinstance(s.request, Wait) or
+                    s.request.future.done())]
+            if not due:
+                # futures are checked every TICK
+                delays = [s.wake_at - now for s in active
+                          if not isinstance(s.request, Wait)]
+                if len(delays) < len(active):
+                    delays.append(TICK)
+                if feed is not None:
+                    delays.append(FEED_INTERVAL)
+                self.clock.sleep(max(min(delays), 0))
+                continue
+            polled = [s.dut for s in due if isinstance(s.request, Status)]
+            blocks = self.read_status(polled) if polled else {}
+            booting = [s.dut for s in due if isinstance(s.request, Ready)]
+            ready = self.read_ready(booting) if booting else {}
+            now = self.clock.time()
+            for slot in due:
+                value, exc_info = None, None
+                if isinstance(slot.request, Ready):
+                    value = ready.get(slot.dut.slotnum)
+                    if not value and now < slot.deadline:
+                        slot.wake_at = now + READY_POLL
+                        continue
+                elif isinstance(slot.request, Status):
+                    value = blocks.get(slot.dut.slotnum)
+                    if isinstance(value, Exception):
+                        value, exc_info = None, (type(value), value, None)
+                elif isinstance(slot.request, Wait):
+                    try:
+                        value = slot.request.future.result()
+                    except Exception:
+                        exc_info = sys.exc_info()
+                self._step(slot, self.clock.time(), value, exc_info)
+
+    def _step(self, slot, now, value, exc_info):
+        """resume the phase of slot until its next request, starting the
+        next phases of the DUT when it returns.
+        """
+        while True:
+            try:
+                if slot.gen is None:
+                    slot.index += 1
+                    if slot.index >= len(slot.phases):
+                        return
+                    gen = slot.phases[slot.index](slot.dut)
+                    if gen is None:
+                        raise StopIteration
+                    slot.gen = gen
+                    request = gen.next()
+                elif exc_info is not None:
+                    request = slot.gen.throw(*exc_info)
+                else:
+                    request = slot.gen.send(value)
+            except StopIteration:
+                slot.gen = None
+                value, exc_info = None, None
+                if self.on_phase is not None:
+                    self.on_phase(slot.dut, slot.phases[slot.index])
+                continue
+            slot.request = request
+            if isinstance(request, Sleep):
+                slot.wake_at = now + request.seconds
+            elif isinstance(request, Status):
+                slot.wake_at = now + request.interval
+            elif isinstance(request, Wait):
+                slot.wake_at = now
+            elif isinstance(request, Ready) and self.read_ready is not None:
+                # read at once, the DUT may be ready already
+                slot.wake_at = now
+                slot.deadline = now + request.timeout
+            else:
+                raise TypeError("unknown request of a slot phase: "
+                                "{0!r}".format(request))
+            return
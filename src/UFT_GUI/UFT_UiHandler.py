@@ -11,6 +11,7 @@ import re
 from PyQt4 import QtCore, QtGui, QtSql
 from UFT_GUI.UFT_Ui import Ui_Form as UFT_UiForm
 from UFT.config import RESULT_DB, CONFIG_DB, RESOURCE, CONFIG_FILE, CYCLE_MODE
+from UFT.config import CONTINUOUS_FLOW
 from UFT.backend import sync_config
 
 BARCODE_PATTERN = re.compile(r'^(?P<SN>(?P<PN>AGIGA\d{4}-\d{3}\w{3})'
@@ -148,8 +149,11 @@ class UFT_UiHandler(UFT_UiForm):
 
     def auto_enable_disable_widgets(self, ch_is_alive):
         if ch_is_alive:
-            self.start_pushButton.setDisabled(True)
             self.Mode4in1.setDisabled(True)
+            if CONTINUOUS_FLOW:
+                # start loads the slots done while the others are testing
+                return
+            self.start_pushButton.setDisabled(True)
             self.tab_EB1.setDisabled(True)
             self.tab_EB2.setDisabled(True)
             self.tab_EB3.setDisabled(True)
@@ -14,11 +14,13 @@ sys.path.append("./src/")
 
 import logging
 import time
+from Queue import Queue
 from PyQt4.QtGui import QApplication
 from PyQt4 import QtGui, QtCore
 from UFT_GUI.UFT_UiHandler import UFT_UiHandler
 from UFT_GUI import log_handler
 from UFT.config import CYCLE_MODE, CYCLE_TIMES, CYCLE_INTERVAL
+from UFT.config import CONTINUOUS_FLOW
 
 app = QApplication(sys.argv)
 app.setStyle("Plastique")
@@ -86,6 +88,12 @@ class MainWidget(QtGui.QWidget):
             cb_4 = self.ui.cabel_barcodes_4()
             bb_4 = self.ui.capacitor_barcodes_4()
 
+            if CONTINUOUS_FLOW and self.u.isRunning():
+                # load the slots done while the others are testing
+                self.u.refill(db_1, cb_1, bb_1, db_2, cb_2, bb_2,
+                              db_3, cb_3, bb_3, db_4, cb_4, bb_4)
+                return
+
             self.u.loaddata(db_1, cb_1, bb_1, db_2, cb_2, bb_2, db_3, cb_3, bb_3, db_4, cb_4, bb_4, mode4in1)
             self.connect(self.u, QtCore.SIGNAL('progress_bar'),
                          self.ui.progressBar.setValue)
@@ -123,6 +131,8 @@ class MainWidget(QtGui.QWidget):
 class Update(QtCore.QThread):
     def __init__(self):
         QtCore.QThread.__init__(self)
+        # barcodes of the 4 boards to load in continuous flow
+        self.refills = Queue()
 
     def isEmpty(self, bclist):
         rtn = True
@@ -158,6 +168,18 @@ class Update(QtCore.QThread):
         self.erie4_is_empty = self.isEmpty(barcodes_4)
         self.mode = mode
 
+    def refill(self, barcodes_1, cable_barcodes_1, capacitor_barcodes_1,
+               barcodes_2, cable_barcodes_2, capacitor_barcodes_2,
+               barcodes_3, cable_barcodes_3, capacitor_barcodes_3,
+               barcodes_4, cable_barcodes_4, capacitor_barcodes_4):
+        loads = [(barcodes_1, cable_barcodes_1, capacitor_barcodes_1),
+                 (barcodes_2, cable_barcodes_2, capacitor_barcodes_2),
+                 (barcodes_3, cable_barcodes_3, capacitor_barcodes_3),
+                 (barcodes_4, cable_barcodes_4, capacitor_barcodes_4)]
+        # None for a board without new DUT
+        self.refills.put([None if self.isEmpty(load[0]) else load
+                          for load in loads])
+
     def getcurrentprocessbar(self, f_ch1, bar1,
                              f_ch2, bar2,
                              f_ch3, bar3,
@@ -259,8 +281,92 @@ class Update(QtCore.QThread):
         #self.terminate()
         self.emit(QtCore.SIGNAL("is_alive"), 0)
 
+    def start_channel(self, board, barcodes, cable_barcodes,
+                      capacitor_barcodes):
+        ch = Channel(barcode_list=barcodes, cable_barcodes_list=cable_barcodes,
+                     capacitor_barcodes_list=capacitor_barcodes,
+                     channel_id=board, name="UFT_CHANNEL", mode4in1=self.mode,
+                     continuous=True)
+        ch.auto_test()
+        return ch
+
+    def new_barcodes(self, ch, barcodes):
+        """barcodes without the DUTs ch already tested.
+        """
+        done = [dut.barcode for dut in ch.finished] if ch is not None else []
+        return [bc if bc not in done else "" for bc in barcodes]
+
+    def emit_status(self, channels):
+        for i, ch in enumerate(channels):
+            if ch is None:
+                continue
+            for dut in ch.dut_list:
+                if dut is not None:
+                    self.emit(QtCore.SIGNAL("dut_status_{0}".format(i + 1)),
+                              dut.slotnum, dut.status)
+            self.emit(QtCore.SIGNAL("board_status_{0}".format(i + 1)),
+                      ch.channelresult)
+
+    def continuous_run(self):
+        """the boards keep on testing, start loads new DUTs in the slots
+        done while the other slots are testing. A board whose slots are all
+        done is started again with the new DUTs.
+        """
+        sec_count = 0
+        loads = [(self.barcodes_1, self.cable_barcodes_1, self.capacitor_barcodes_1),
+                 (self.barcodes_2, self.cable_barcodes_2, self.capacitor_barcodes_2),
+                 (self.barcodes_3, self.cable_barcodes_3, self.capacitor_barcodes_3),
+                 (self.barcodes_4, self.cable_barcodes_4, self.capacitor_barcodes_4)]
+        channels = [None] * 4
+        for i, load in enumerate(loads):
+            if not self.isEmpty(load[0]):
+                channels[i] = self.start_channel(i, *load)
+        pending = [None] * 4
+        self.emit(QtCore.SIGNAL("is_alive"), 1)
+        while any(ch is not None and ch.isAlive() for ch in channels) or \
+                any(load is not None for load in pending):
+            while not self.refills.empty():
+                # a load still pending is kept unless the board got a new one
+                for i, load in enumerate(self.refills.get()):
+                    if load is not None:
+                        pending[i] = load
+            for i, load in enumerate(pending):
+                if load is None:
+                    continue
+                ch = channels[i]
+                if ch is not None and ch.isAlive():
+                    if ch.refill_slots(*load) is None:
+                        # the board is finishing, start it again after
+                        continue
+                else:
+                    barcodes = self.new_barcodes(ch, load[0])
+                    if not self.isEmpty(barcodes):
+                        if ch is not None:
+                            ch.save_db()
+                        channels[i] = self.start_channel(i, barcodes,
+                                                         load[1], load[2])
+                pending[i] = None
+
+            sec_count += 1
+            bars = [ch.progressbar for ch in channels
+                    if ch is not None and ch.isAlive()]
+            self.emit(QtCore.SIGNAL("progress_bar"), min(bars or [100]))
+            self.emit(QtCore.SIGNAL("time_used"), sec_count)
+            self.emit_status(channels)
+            time.sleep(1)
+
+        self.emit(QtCore.SIGNAL("progress_bar"), 100)
+        self.emit_status(channels)
+        # the DUTs are saved when done, only the ones left by an error here
+        for ch in channels:
+            if ch is not None:
+                ch.save_db()
+        self.emit(QtCore.SIGNAL("is_alive"), 0)
+
     def run(self):
-        if CYCLE_MODE:
+        if CONTINUOUS_FLOW:
+            self.continuous_run()
+        elif CYCLE_MODE:
             for i in range(0, CYCLE_TIMES):
                 self.emit(QtCore.SIGNAL("cycle_looped"), i+1, CYCLE_TIMES)
                 self.single_run()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: micro benchmark for Erie response frame receiving,
+one byte serial reads (former implementation) vs. framed bulk reads.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import time
+from bench_sim_station import station_workdir
+
+# iic_read response: header, status, 1 data byte
+IIC_READ_FRAME = "\x55\x77\x01\x00\x02\x00\x00\xa5"
+# firmware version response: header, status, major, minor
+VERSION_FRAME = "\x55\x77\x0c\x00\x03\x00\x00\x01\x03"
+
+
+class FakeSerial(object):
+    """serial port replaying the same response frame forever.
+    """
+
+    def __init__(self, frame):
+        self.stream = frame * 1024
+        self.pos = 0
+        self.timeout = 1
+
+    def isOpen(self):
+        return True
+
+    def flushInput(self):
+        pass
+
+    def flushOutput(self):
+        pass
+
+    def write(self, content):
+        return len(content)
+
+    def read(self, size=1):
+        if self.pos + size > len(self.stream):
+            self.pos = 0
+        data = self.stream[self.pos:self.pos + size]
+        self.pos += size
+        return data
+
+    def close(self):
+        pass
+
+
+def legacy_receiveresult(board):
+    """the former Erie._receiveresult_, kept here for comparison.
+    """
+    buff = []
+    content = ""
+    idx = 0
+    datalen = 255
+
+    while(datalen > 0):
+        tmp = board.ser.read(1)
+        if tmp == "":
+            break
+        idx += 1
+        datalen -= 1
+        content += tmp
+        buff.append(ord(tmp))
+        if idx == 5:
+            datalenlow = tmp
+        if idx == 6:
+            datalenhigh = tmp
+            datalen = (ord(datalenhigh) * 256) + ord(datalenlow)
+
+    board.LastReceiving = content
+    board._displaylanguage_(content)
+    if len(buff) < 7:
+        board._erroroutinfor_()
+        raise Exception("Hardware is NOT ready")
+    if buff[0] != 0x55 or buff[1] != 0x77:
+        board._erroroutinfor_()
+        raise Exception("UART communication failure")
+    return buff
+
+
+def run(func, board, frames):
+    start = time.time()
+    for i in xrange(frames):
+        func(board)
+    return frames / (time.time() - start)
+
+
+if __name__ == "__main__":
+    frames = 100000
+    with station_workdir():
+        from UFT.devices import erie
+        for name, frame in [("iic_read", IIC_READ_FRAME),
+                            ("version", VERSION_FRAME)]:
+            board = erie.Erie(ser=FakeSerial(VERSION_FRAME))
+            board.ser = FakeSerial(frame)
+            old = run(legacy_receiveresult, board, frames)
+            board.ser = FakeSerial(frame)
+            new = run(erie.Erie._receiveresult_, board, frames)
+            print "{0:10s} one byte reads: {1:10.0f} frames/s  " \
+                  "framed reads: {2:10.0f} frames/s  x{3:.1f}".\
+                format(name, old, new, new / old)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: micro benchmark of the status register decoders of
+UFT.models.regs against the former branch and arithmetic decoders, which
+are checked to give the same values for every register value first.
+usage: python bench_regs.py [loops]
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import sys
+import random
+import timeit
+
+from UFT.models import regs
+
+
+def temp_branches(val1, val2):
+    """former check_temp, one branch per bit."""
+    temp = 0.0
+    for bit, weight in ((0x04, 0.25), (0x08, 0.5), (0x10, 1), (0x20, 2),
+                        (0x40, 4), (0x80, 8)):
+        if val1 & bit == bit:
+            temp = temp + weight
+    for bit, weight in ((0x01, 16), (0x02, 32), (0x04, 64), (0x08, 128)):
+        if val2 & bit == bit:
+            temp = temp + weight
+    return temp
+
+
+def temp_arith(lsb, msb):
+    return (lsb >> 2) * 0.25 + (msb & 0x0F) * 16
+
+
+def charged_arith(pgemstat, gtg):
+    return ((pgemstat | 0xFE) == 0xFE) & ((gtg & 0x09) == 0x09)
+
+
+def status_arith(raw):
+    """former StatusBlock.decode."""
+    raw = tuple(raw)
+    return regs.StatusBlock(hwready=(raw[0] == regs.HWREADY_VALUE),
+                            gtg=raw[1],
+                            gtg_warn=raw[2],
+                            pgemstat=raw[3],
+                            temperature=temp_arith(raw[4], raw[5]),
+                            vin=float(raw[6]) / 10,
+                            vcap=float(raw[7]) / 10,
+                            chg_time=int(raw[8]),
+                            raw=raw)
+
+
+def check():
+    for a in range(256):
+        assert regs.decode_volt(a) == float(a) / 10
+        for b in range(256):
+            assert regs.decode_temp(a, b) == temp_arith(a, b) == \
+                temp_branches(a, b)
+            assert regs.is_charged(a, b) == charged_arith(a, b)
+    raw = range(regs.STATUS_BLOCK_LEN)
+    assert regs.StatusBlock.decode(raw) == status_arith(raw)
+
+
+if __name__ == "__main__":
+    loops = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    check()
+    rnd = random.Random(1)
+    raws = [[rnd.randint(0, 255) for i in range(regs.STATUS_BLOCK_LEN)]
+            for j in range(64)]
+    cases = [
+        ("temperature, branches", "for r in raws: temp_branches(r[4], r[5])"),
+        ("temperature, arithmetic", "for r in raws: temp_arith(r[4], r[5])"),
+        ("temperature, tables", "for r in raws: regs.decode_temp(r[4], r[5])"),
+        ("charged, arithmetic", "for r in raws: charged_arith(r[3], r[1])"),
+        ("charged, tables", "for r in raws: regs.is_charged(r[3], r[1])"),
+        ("status block, arithmetic", "for r in raws: status_arith(r)"),
+        ("status block, tables",
+         "for r in raws: regs.StatusBlock.decode(r)"),
+    ]
+    setup = "from __main__ import raws, regs, temp_branches, temp_arith, " \
+            "charged_arith, status_arith"
+    n = max(1, loops // len(raws))
+    for name, stmt in cases:
+        t = min(timeit.Timer(stmt, setup).repeat(3, n))
+        print "{0:26s} {1:7.3f} us".format(name, t * 1e6 / (n * len(raws)))
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: time the shared port VPD programming of the 4-in-1 masters
+of a simulated Erie board, port after port with
+PGEMBase.write_shared_vpd(), and with one discover_shared_ports() sweep
+then write_shared_vpd_many(), in simulated seconds and UART frames.
+usage: python bench_shared_vpd.py [masters] [speedup]
+keep the speedup low, python overhead is counted as simulated time.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import os
+import sys
+import logging
+
+from bench_sim_station import make_ebf, station_workdir
+from bench_vpd_read import timed
+
+BARCODE = "AGIGA9831-001BCA02143900000{0:03d}-01"
+
+
+def make_masters(masters, speedup):
+    from UFT.devices import erie, erie_sim, aardvark
+    from UFT.models import PGEMBase
+    sim = erie_sim.ErieSimulator(clock=erie_sim.SimClock(speedup),
+                                 mode4in1=True)
+    board = erie.Erie(ser=sim, clock=sim.clock)
+    for slot in range(0, masters * 4, 4):
+        board.OutputOn(slot)
+    sim.clock.sleep(2)
+    adk = aardvark.Adapter(board)
+    return sim, adk, [PGEMBase(adk, BARCODE.format(slot), slot=slot)
+                      for slot in range(0, masters * 4, 4)]
+
+
+def write_one_by_one(duts, ebf):
+    for dut in duts:
+        for port in range(dut.slotnum + 1, dut.slotnum + 4):
+            dut.device.select_channel(port)
+            dut.write_shared_vpd(ebf)
+
+
+def write_batched(adk, duts, ebf):
+    from UFT.models import discover_shared_ports, write_shared_vpd_many
+    ports = [dut.slotnum + i for dut in duts for i in range(1, 4)]
+    shared = discover_shared_ports(adk, ports)
+    return write_shared_vpd_many(duts, [ebf] * len(duts), shared)
+
+
+if __name__ == "__main__":
+    masters = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    speedup = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    logging.getLogger("UFT").setLevel(logging.WARNING)
+
+    with station_workdir() as workdir:
+        ebf = os.path.join(workdir, "sim.ebf")
+        make_ebf(ebf)
+        sim, adk, duts = make_masters(masters, speedup)
+        t, n = timed(sim, lambda: write_one_by_one(duts, ebf))
+        print "write_shared_vpd() x {0}: {1:.3f} s  {2} frames".format(
+            masters * 3, t, n)
+        sim, adk, duts = make_masters(masters, speedup)
+        results = []
+        t, n = timed(sim, lambda: results.extend(
+            write_batched(adk, duts, ebf)))
+        print "write_shared_vpd_many() of {0}: {1:.3f} s  {2} frames".format(
+            masters * 3, t, n)
+        for dut, ret in zip(duts, results):
+            if ret is not None:
+                print "  slot {0}: {1!r}".format(dut.slotnum, ret)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: run Channel.auto_test() end to end on simulated Erie boards,
+and report the throughput and the vcap sampling of the test flow.
+usage: python bench_sim_station.py [speedup] [channels] [dead slots] [4in1]
+                                   [board] [refill]
+the DUTs of the last dead slots never answer on IIC, 4in1 runs Amber 4x/e
+masters on every 4th slot, board runs each test phase on the whole board
+instead of per slot, refill runs the continuous flow and loads a new DUT
+in a slot as soon as it is done, REFILL_ROUNDS DUTs per slot.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import os
+import sys
+import time
+import shutil
+import random
+import tempfile
+import logging
+from contextlib import contextmanager
+
+PARTNUMBER = "AGIGA9831-001BCA"
+PARTNUMBER_4IN1 = "AGIGA9823-003JCA"
+REVISION = "01"
+REFILL_ROUNDS = 3
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+TEST_ITEMS = [
+    # name, min, max, misc
+    ("Program_VPD", None, None, "File={ebf}"),
+    ("Charge", 1.0, 300.0, "Threshold=5.0V;Ceiling=5.8V"),
+    ("Capacitor", 20.0, 60.0, "Overtime=600"),
+    ("Discharge", 2.0, 120.0, "Threshold=3.0V;Current=1.0A"),
+    ("Recharge", 1.0, 300.0, "Threshold=5.0V;Ceiling=5.8V;Shutdown=Yes"),
+]
+
+
+def make_ebf(path):
+    """VPD image of 256 bytes for the simulated DUTs."""
+    from UFT.models import vpd
+    image = bytearray(256)
+    image[0x00:0x10] = PARTNUMBER
+    image[0x10] = 0x01  # ES_FWREV0
+    image[0x11] = 0x10  # ES_FWREV1
+    image[0x12] = 0x01  # ES_HWREV
+    crc = vpd.vpd_crc(image)
+    image[vpd.VPD_CRC_ADDR] = crc & 0xFF
+    image[vpd.VPD_CRC_ADDR + 1] = crc >> 8
+    with open(path, "wb") as f:
+        f.write(image)
+
+
+def make_station_cfg(workdir, speedup=1, slot_flow=True):
+    """xml/station.cfg in workdir, the one of the package running on
+    simulated Erie boards."""
+    src = os.path.join(HERE, "..", "src", "UFT", "backend", "station.cfg")
+    os.makedirs(os.path.join(workdir, "xml"))
+    with open(src) as f:
+        cfg = f.read()
+    cfg = cfg.replace("ERIE_SIMULATION = False", "ERIE_SIMULATION = True")
+    cfg = cfg.replace("ERIE_SIM_SPEEDUP = 1",
+                      "ERIE_SIM_SPEEDUP = {0}".format(speedup))
+    cfg = cfg.replace("SLOT_FLOW = True",
+                      "SLOT_FLOW = {0}".format(slot_flow))
+    with open(os.path.join(workdir, "xml", "station.cfg"), "w") as f:
+        f.write(cfg)
+
+
+@contextmanager
+def station_workdir(speedup=1, slot_flow=True):
+    """temporary working directory with xml/station.cfg, UFT reads its
+    station config and writes its runtime logs relative to the working
+    directory, so UFT modules are imported inside."""
+    workdir = tempfile.mkdtemp(prefix="uft_sim_")
+    cwd = os.getcwd()
+    try:
+        make_station_cfg(workdir, speedup, slot_flow)
+        os.chdir(workdir)
+        yield workdir
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def make_station(workdir, partnumber=PARTNUMBER):
+    """configuration db and ebf file in workdir."""
+    os.makedirs(os.path.join(workdir, "db"))
+    ebf = os.path.join(workdir, "xml", "sim.ebf")
+    make_ebf(ebf)
+
+    from UFT.backend.session import SessionManager
+    from UFT.backend.configuration import PGEMConfig, TestItem
+
+    dburi = "sqlite:///" + os.path.join(workdir, "db", "pgem_config.db")
+    sm = SessionManager()
+    sm.prepare_db(dburi, [PGEMConfig, TestItem])
+    session = sm.get_session(dburi)
+    config = PGEMConfig()
+    config.partnumber = partnumber
+    config.description = "Simulated Garnet"
+    config.revision = REVISION
+    for name, mn, mx, misc in TEST_ITEMS:
+        item = TestItem()
+        item.name = name
+        item.enable = True
+        item.stoponfail = True
+        item.min = mn
+        item.max = mx
+        item.misc = misc.format(ebf=ebf)
+        config.testitems.append(item)
+    session.add(config)
+    session.commit()
+    session.close()
+
+
+def barcodes(channel, mode4in1=False, rounds=0):
+    if mode4in1:
+        return ["{0}02{1}39{2:08d}-{3}".format(PARTNUMBER_4IN1, 14,
+                                               channel * 100 + i, REVISION)
+                if i % 4 == 0 else "" for i in range(16)]
+    return ["{0}02{1}39{2:08d}-{3}".format(PARTNUMBER, 14,
+                                           channel * 100 + rounds * 16 + i,
+                                           REVISION)
+            for i in range(16)]
+
+
+def refill(ch, index, rounds):
+    """load a new simulated DUT in the slots of ch done, up to
+    REFILL_ROUNDS DUTs per slot.
+    :param rounds: DUTs loaded so far in each slot.
+    """
+    from UFT.devices import erie_sim
+    wanted = [""] * 16
+    for dut in ch.finished:
+        slot = dut.slotnum
+        if ch.dut_list[slot] is not dut or rounds[slot] >= REFILL_ROUNDS:
+            continue
+        if dut.barcode != barcodes(index, rounds=rounds[slot] - 1)[slot]:
+            continue
+        wanted[slot] = barcodes(index, rounds=rounds[slot])[slot]
+    if not any(wanted):
+        return
+    sim = ch.erie.ser
+    for slot, bc in enumerate(wanted):
+        if bc:
+            sim.ports[slot].pgem = erie_sim.PGEMModel(
+                sim.clock, tau_charge=random.uniform(12.0, 30.0),
+                tau_discharge=random.uniform(10.0, 20.0))
+    loaded = ch.refill_slots(wanted, [""] * 16, [""] * 16)
+    for slot in loaded or []:
+        rounds[slot] += 1
+
+
+def sampling(duts, state):
+    """vcap samples of a phase per DUT, and the mean interval before the
+    last sample, which bounds the error of the phase time.
+    """
+    counts, lasts = [], []
+    for dut in duts:
+        times = [c.time for c in dut.cycles if c.state == state]
+        if len(times) < 2:
+            continue
+        counts.append(len(times))
+        lasts.append(times[-1] - times[-2])
+    if not counts:
+        return 0.0, 0.0
+    return (float(sum(counts)) / len(counts),
+            sum(lasts) / len(lasts))
+
+
+if __name__ == "__main__":
+    speedup = float(sys.argv[1]) if len(sys.argv) > 1 else 50
+    channels = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    dead = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    mode4in1 = "4in1" in sys.argv[4:]
+    slot_flow = "board" not in sys.argv[4:]
+    continuous = "refill" in sys.argv[4:]
+    logging.basicConfig(level=logging.WARNING)
+
+    with station_workdir(speedup, slot_flow) as workdir:
+        make_station(workdir, PARTNUMBER_4IN1 if mode4in1 else PARTNUMBER)
+        from UFT.channel import Channel
+        from UFT.models import DUT_STATUS
+        from UFT.devices import erie_sim
+        logging.getLogger("UFT").setLevel(logging.WARNING)
+
+        if dead:
+            sim_init = erie_sim.ErieSimulator.__init__
+
+            def dead_init(self, *args, **kvargs):
+                sim_init(self, *args, **kvargs)
+                for port in self.ports[-dead:]:
+                    port.pgem = None
+            erie_sim.ErieSimulator.__init__ = dead_init
+
+        chs = []
+        for i in range(channels):
+            bc = barcodes(i, mode4in1)
+            chs.append(Channel(name="SIM_CHANNEL_{0}".format(i),
+                               barcode_list=bc,
+                               cable_barcodes_list=[""] * 16,
+                               capacitor_barcodes_list=[""] * 16,
+                               mode4in1=mode4in1, channel_id=i,
+                               continuous=continuous))
+        start = time.time()
+        for ch in chs:
+            ch.auto_test()
+        rounds = [[1] * 16 for ch in chs]
+        while continuous and any(ch.isAlive() for ch in chs):
+            for i, ch in enumerate(chs):
+                if ch.isAlive():
+                    refill(ch, i, rounds[i])
+            time.sleep(0.01)
+        for ch in chs:
+            ch.join()
+        wall = time.time() - start
+
+        if continuous:
+            duts = [d for ch in chs for d in ch.finished]
+        else:
+            duts = [d for ch in chs for d in ch.dut_list if d is not None]
+        passed = len([d for d in duts if d.status == DUT_STATUS.Pass])
+        frames = sum(ch.erie.ser.frames for ch in chs)
+        print "DUTs: {0}  passed: {1}".format(len(duts), passed)
+        for d in duts:
+            if d.status != DUT_STATUS.Pass:
+                print "  slot {0}: {1}".format(d.slotnum, d.errormessage)
+        print "wall time: {0:.1f} s  simulated time: {1:.1f} s".format(
+            wall, wall * speedup)
+        print "UART frames: {0}  units per simulated hour: {1:.1f}".format(
+            frames, len(duts) * 3600.0 / (wall * speedup))
+        for state in ("charge", "discharge"):
+            print "{0}: samples per DUT: {1:.1f}  last interval: " \
+                "{2:.2f} s".format(state, *sampling(duts, state))
+        print "Erie latency of channel 0, simulated time:"
+        for line in chs[0].erie_stats().summary():
+            print "  " + line
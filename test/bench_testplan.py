@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: per poll CPU time of the test item settings in the charge
+loop of Channel, load_test_item and parsing the thresholds of every slot
+on every poll, against the TestPlan compiled once per DUT.
+usage: python bench_testplan.py [slots] [polls]
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import sys
+import time
+
+from UFT.backend import load_test_item, compile_test_plan
+from UFT.backend.configuration import PGEMConfig, TestItem
+from bench_sim_station import TEST_ITEMS, PARTNUMBER, REVISION
+
+
+def make_config():
+    config = PGEMConfig()
+    config.partnumber = PARTNUMBER
+    config.revision = REVISION
+    for name, mn, mx, misc in TEST_ITEMS:
+        item = TestItem()
+        item.name = name
+        item.enable = True
+        item.stoponfail = True
+        item.min = mn
+        item.max = mx
+        item.misc = misc.format(ebf="sim.ebf")
+        config.testitems.append(item)
+    return config
+
+
+def poll_load_test_item(configs):
+    for config_item in configs:
+        config = load_test_item(config_item, "Charge")
+        if (not config["enable"]):
+            continue
+        threshold = float(config["Threshold"].strip("aAvV"))
+        ceiling = float(config["Ceiling"].strip("aAvV"))
+        max_chargetime = config["max"]
+        min_chargetime = config["min"]
+
+
+def poll_plan(plans):
+    for plan in plans:
+        config = plan["Charge"]
+        if (not config.enable):
+            continue
+        threshold = config.threshold
+        ceiling = config.ceiling
+        max_chargetime = config.max
+        min_chargetime = config.min
+
+
+def timed(func, arg, polls):
+    start = time.time()
+    for i in range(polls):
+        func(arg)
+    return (time.time() - start) / polls
+
+
+if __name__ == "__main__":
+    slots = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    polls = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    configs = [make_config() for i in range(slots)]
+    start = time.time()
+    plans = [compile_test_plan(c) for c in configs]
+    compile_time = time.time() - start
+    old = timed(poll_load_test_item, configs, polls)
+    new = timed(poll_plan, plans, polls)
+    print "compile {0} plans once: {1:.3f} ms".format(slots,
+                                                     compile_time * 1e3)
+    print "poll of {0} slots, load_test_item: {1:.3f} ms".format(slots,
+                                                                 old * 1e3)
+    print "poll of {0} slots, TestPlan:       {1:.3f} ms".format(slots,
+                                                                 new * 1e3)
+    print "saved per poll: {0:.3f} ms ({1:.0f}x)".format((old - new) * 1e3,
+                                                         old / new)
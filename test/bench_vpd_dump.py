@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: time a full VPD dump of several DUTs on a simulated Erie
+board, slot after slot with PGEMBase.dump_vpd() and interleaved with
+vpd_dump.read_duts(), then save the dumps and diff two of them. The
+simulated EEPROM takes 0.5 ms to fetch an address, the interleaving gains
+by spending the waits for it on the other slots.
+usage: python bench_vpd_dump.py [slots] [length] [autoinc] [speedup]
+keep the speedup low, python overhead is counted as simulated time.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import os
+import sys
+import logging
+
+from bench_sim_station import station_workdir
+from bench_vpd_read import timed
+
+BARCODE = "AGIGA9831-001BCA02143900000{0:03d}-01"
+
+
+def make_duts(slots, autoinc, speedup):
+    from UFT.devices import erie, erie_sim, aardvark
+    from UFT.models import PGEMBase
+    sim = erie_sim.ErieSimulator(clock=erie_sim.SimClock(speedup),
+                                 vpd_autoinc=autoinc)
+    board = erie.Erie(ser=sim, clock=sim.clock)
+    for slot in range(slots):
+        board.OutputOn(slot)
+    sim.clock.sleep(2)
+    adk = aardvark.Adapter(board)
+    adk.slave_addr = 0x14
+    duts = []
+    for slot in range(slots):
+        adk.select_channel(slot)
+        adk.write_reg(0x40, 0x45)
+        # a different serial number in every DUT
+        adk.write_reg(0x00, 0x37)
+        adk.write_reg(0x01, 0x00)
+        adk.write_reg(0x02, 0x30 + slot)
+        duts.append(PGEMBase(adk, BARCODE.format(slot), slot=slot))
+    return sim, adk, duts
+
+
+def dump_one_by_one(duts, length):
+    for dut in duts:
+        dut.vpd_cache.invalidate()
+        dut.device.select_channel(dut.slotnum)
+        dut.dump_vpd(0x000, length)
+
+
+if __name__ == "__main__":
+    slots = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    length = int(sys.argv[2], 0) if len(sys.argv) > 2 else 0x1000
+    autoinc = bool(int(sys.argv[3])) if len(sys.argv) > 3 else False
+    speedup = float(sys.argv[4]) if len(sys.argv) > 4 else 10
+    logging.getLogger("UFT").setLevel(logging.WARNING)
+
+    with station_workdir() as workdir:
+        from UFT.models import vpd_dump
+        sim, adk, duts = make_duts(slots, autoinc, speedup)
+        t, n = timed(sim, lambda: dump_one_by_one(duts, length))
+        print "dump_vpd() x {0}: {1:.3f} s  {2} frames".format(slots, t, n)
+        one_by_one = t
+        dumps = []
+        t, n = timed(sim, lambda: dumps.extend(
+            vpd_dump.read_duts(duts, 0x000, length)))
+        print "read_duts() of {0}: {1:.3f} s  {2} frames, {3:.2f}x".format(
+            slots, t, n, one_by_one / t)
+
+        dumpdir = os.path.join(workdir, "dumps")
+        os.makedirs(dumpdir)
+        paths = [vpd_dump.save_dump(d, dumpdir) for d in dumps]
+        old, new = vpd_dump.load_dump(paths[0]), vpd_dump.load_dump(paths[-1])
+        for line in vpd_dump.format_diff(vpd_dump.diff_dumps(old, new)):
+            print line
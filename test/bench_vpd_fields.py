@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: decode the EEP_MAP fields of random VPD images, the former
+way (filter over EEP_MAP and shift loops) and with EEP_TABLE, check both
+agree and print the time per image.
+usage: python bench_vpd_fields.py [images]
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import os
+import sys
+import timeit
+
+from UFT.models.base import EEP_MAP, EEP_TABLE
+
+
+def query_map(mymap, **kvargs):
+    r = mymap
+    for k, v in kvargs.items():
+        r = filter(lambda row: row[k] == v, r)
+    return r
+
+
+def decode_loop(typ, datas):
+    if typ == "str":
+        return ''.join(chr(i) for i in datas if 0x1F < i < 0x7F)
+    val = 0
+    for i in range(0, len(datas)):
+        val += datas[i] << 8 * i
+    return val
+
+
+def former(image):
+    datas = list(bytearray(image))
+    dut = {}
+    for eep in EEP_MAP:
+        eep = query_map(EEP_MAP, name=eep["name"])[0]
+        dut[eep["name"]] = decode_loop(
+            eep["type"], datas[eep["addr"]:eep["addr"] + eep["length"]])
+    return dut
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    images = [os.urandom(EEP_TABLE.end) for i in range(50)]
+    for image in images:
+        assert former(image) == EEP_TABLE.decode_image(image)
+        for name in ("SN", "CINIT", "T_LASTPF"):
+            assert EEP_TABLE[name].decode(image, EEP_TABLE[name].addr) == \
+                former(image)[name]
+
+    for name, func in (("former", former),
+                       ("decode_image", EEP_TABLE.decode_image)):
+        t = timeit.timeit(lambda: [func(i) for i in images],
+                          number=max(1, count // len(images)))
+        print "{0:>12s}: {1:8.1f} us per image".format(
+            name, t * 1e6 / (max(1, count // len(images)) * len(images)))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: time the VPD programming of several blank DUTs on a
+simulated Erie board, slot after slot with PGEMBase.write_vpd() and
+interleaved with write_vpd_many(), in simulated seconds and UART frames.
+The simulated EEPROM takes 0.5 ms to fetch an address and 4 ms to write a
+byte, the interleaving gains by spending these waits on the other slots.
+usage: python bench_vpd_program.py [slots] [autoinc] [speedup]
+keep the speedup low, python overhead is counted as simulated time.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import os
+import sys
+import logging
+
+from bench_sim_station import make_ebf, station_workdir
+from bench_vpd_dump import make_duts
+from bench_vpd_read import timed
+
+
+def write_one_by_one(duts, ebf):
+    for dut in duts:
+        dut.device.select_channel(dut.slotnum)
+        dut.write_vpd(ebf)
+
+
+if __name__ == "__main__":
+    slots = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    autoinc = bool(int(sys.argv[2])) if len(sys.argv) > 2 else False
+    speedup = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    logging.getLogger("UFT").setLevel(logging.WARNING)
+
+    with station_workdir() as workdir:
+        from UFT.models import write_vpd_many
+        ebf = os.path.join(workdir, "sim.ebf")
+        make_ebf(ebf)
+        sim, adk, duts = make_duts(slots, autoinc, speedup)
+        t, n = timed(sim, lambda: write_one_by_one(duts, ebf))
+        print "write_vpd() x {0}: {1:.3f} s  {2} frames".format(slots, t, n)
+        one_by_one = t
+
+        sim, adk, duts = make_duts(slots, autoinc, speedup)
+        results = []
+        t, n = timed(sim, lambda: results.extend(
+            write_vpd_many(duts, [ebf] * slots)))
+        print "write_vpd_many() of {0}: {1:.3f} s  {2} frames, " \
+              "{3:.2f}x".format(slots, t, n, one_by_one / t)
+        for dut, ret in zip(duts, results):
+            if isinstance(ret, Exception):
+                print "  slot {0}: {1!r}".format(dut.slotnum, ret)
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: time PGEMBase.read_vpd() and dump_vpd() of one DUT on a
+simulated Erie board, in simulated seconds and UART frames.
+usage: python bench_vpd_read.py [firmware minor] [autoinc] [speedup]
+keep the speedup low, python overhead is counted as simulated time.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import sys
+import logging
+
+from bench_sim_station import station_workdir
+
+BARCODE = "AGIGA9831-001BCA02143900000001-01"
+
+
+def make_dut(firmware, autoinc, speedup):
+    from UFT.devices import erie, erie_sim, aardvark
+    from UFT.models import PGEMBase
+    sim = erie_sim.ErieSimulator(clock=erie_sim.SimClock(speedup),
+                                 firmware=firmware, vpd_autoinc=autoinc)
+    board = erie.Erie(ser=sim, clock=sim.clock)
+    board.OutputOn(0)
+    sim.clock.sleep(2)
+    adk = aardvark.Adapter(board)
+    adk.select_channel(0)
+    return sim, PGEMBase(adk, BARCODE, slot=0)
+
+
+def timed(sim, func):
+    start, frames = sim.clock.time(), sim.frames
+    func()
+    return sim.clock.time() - start, sim.frames - frames
+
+
+if __name__ == "__main__":
+    minor = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    autoinc = bool(int(sys.argv[2])) if len(sys.argv) > 2 else False
+    speedup = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    logging.getLogger("UFT").setLevel(logging.WARNING)
+
+    with station_workdir():
+        sim, dut = make_dut((1, minor), autoinc, speedup)
+        t, n = timed(sim, dut.read_vpd)
+        print "read_vpd(): {0:.3f} s  {1} frames".format(t, n)
+        t, n = timed(sim, dut.dump_vpd)
+        print "dump_vpd(): {0:.3f} s  {1} frames".format(t, n)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: time PGEMBase.write_vpd() of one DUT on a simulated Erie
+board, first on a blank EEPROM, then again on the programmed one (re-test),
+and with an other barcode, in simulated seconds and UART frames. Every run
+starts with an empty VPD cache, as a new test does.
+usage: python bench_vpd_write.py [firmware minor] [autoinc] [speedup]
+keep the speedup low, python overhead is counted as simulated time.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import os
+import sys
+import logging
+
+from bench_sim_station import make_ebf, station_workdir
+from bench_vpd_read import make_dut, timed
+
+OTHER_BARCODE = "AGIGA9831-001BCA02143900000002-01"
+
+
+if __name__ == "__main__":
+    minor = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    autoinc = bool(int(sys.argv[2])) if len(sys.argv) > 2 else False
+    speedup = float(sys.argv[3]) if len(sys.argv) > 3 else 10
+    logging.getLogger("UFT").setLevel(logging.WARNING)
+
+    with station_workdir() as workdir:
+        from UFT.models import PGEMBase
+        ebf = os.path.join(workdir, "sim.ebf")
+        make_ebf(ebf)
+        sim, dut = make_dut((1, minor), autoinc, speedup)
+        for name, barcode in (("blank", dut.barcode),
+                              ("re-test", dut.barcode),
+                              ("new barcode", OTHER_BARCODE)):
+            dut = PGEMBase(dut.device, barcode, slot=0)
+            t, n = timed(sim, lambda: dut.write_vpd(ebf))
+            print "write_vpd() {0:12s}: {1:4d} bytes  {2:.3f} s  " \
+                  "{3} frames".format(name, dut.vpd_written, t, n)
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: pytest setup of the unit tests, run by
+    python -m pytest test
+UFT is imported from src, and reads the station config of the package
+from a temporary working directory, as the benches do. The other test_*.py
+scripts of this directory drive the hardware and are not collected.
+Fixtures shared by the tests: clock, a fake clock, and sim_board, a
+factory of simulated Erie boards.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import os
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "src"))
+
+from bench_sim_station import station_workdir
+
+collect_ignore = ["logger2qt_test.py", "test_argparse.py", "test_backend.py",
+                  "test_channel.py", "test_class_ref.py", "test_devices.py",
+                  "test_encrypted_ic.py", "test_fsm.py", "test_model.py",
+                  "test_powerfail.py", "test_powersupply.py",
+                  "test_process.py", "test_ui.py"]
+
+_station = station_workdir()
+
+
+def pytest_configure(config):
+    _station.__enter__()
+
+
+def pytest_unconfigure(config):
+    _station.__exit__(None, None, None)
+
+
+class FakeClock(object):
+    """clock which only moves on sleep."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def sim_board():
+    """factory of simulated Erie boards, sim_board(speedup, **kvargs) with
+    the keywords of ErieSimulator.
+    :return: (simulator, Erie board on it)
+    """
+    # UFT reads the station config on import, once pytest_configure ran
+    from UFT.devices import erie, erie_sim
+
+    def make(speedup=10, **kvargs):
+        sim = erie_sim.ErieSimulator(clock=erie_sim.SimClock(speedup),
+                                     **kvargs)
+        return sim, erie.Erie(ser=sim, clock=sim.clock)
+    return make
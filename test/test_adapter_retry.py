@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of the retry of UFT.devices.aardvark.Adapter
+through the I/O worker of a simulated Erie board.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+from UFT.devices import aardvark, erie_io
+
+
+def test_safety_request_runs_during_backoff(sim_board):
+    sim, board = sim_board()
+    worker = erie_io.ErieWorker(board)
+    adk = aardvark.Adapter(worker)
+    clock = sim.clock
+    # port 3 is not powered, the read fails and is retried after 100 ms
+    # then 200 ms
+    read = erie_io.submit(worker, adk._read_reg_at, 3, 0x14, 0x20, 1)
+    clock.sleep(0.05)
+    safety = erie_io.submit(worker, clock.time,
+                            priority=erie_io.PRIORITY_SAFETY)
+    after = erie_io.submit(worker, clock.time)
+    assert isinstance(read.exception(1), aardvark.USBI2CAdapterException)
+    assert safety.result(1) < after.result(1) - 0.1
+    assert board.stats.shared_counters["retries"] == 2
+    worker.stop()
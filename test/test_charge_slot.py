@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of the charge phase of UFT.channel.Channel run
+by the slot scheduler, on a fake clock without hardware.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+from collections import namedtuple
+
+import pytest
+
+from UFT.channel import Channel
+from UFT.config import READY_TIMEOUT
+from UFT.models import DUT_STATUS
+from UFT.sampler import SampleBudget
+from UFT.slot_scheduler import SlotScheduler
+
+Config = namedtuple("Config", ["enable", "stoponfail", "threshold", "max",
+                               "min", "ceiling", "shutdown"])
+Status = namedtuple("Status", ["hwready"])
+
+
+class FakeDUT(object):
+
+    def __init__(self, slotnum):
+        self.slotnum = slotnum
+        self.status = DUT_STATUS.Idle
+        self.errormessage = ""
+
+    def read_status_block(self):
+        raise AssertionError("DUT not ready is not read")
+
+
+def make_channel(clock):
+    """Channel with only what the charge phase uses."""
+    ch = Channel.__new__(Channel)
+    ch.clock = clock
+    ch.plans = {0: {"Charge": Config(True, True, 5.0, 100, 10, 6.0,
+                                     False)}}
+    ch.sample_budget = SampleBudget(max_rate=10)
+    ch._slot_starts = lambda dut, config: True
+    ch._turn_on_power = lambda slot: None
+    ch.switch_to_dut = lambda slot: None
+    return ch
+
+
+@pytest.mark.parametrize("flag, message", [(False, "DUT is not ready."),
+                                           (None, "IIC access failed.")])
+def test_not_ready_again_stays_fail(flag, message, clock):
+    ch = make_channel(clock)
+    dut = FakeDUT(0)
+    reads = []
+    flags = [True]
+
+    def read_status(duts):
+        reads.append(clock.time())
+        return {0: Status(hwready=False)}
+
+    def read_ready(duts):
+        return {0: flags.pop(0) if flags else flag}
+
+    scheduler = SlotScheduler(clock, read_status, read_ready=read_ready)
+    scheduler.add(dut, [ch._charge_slot])
+    scheduler.run()
+    assert dut.status == DUT_STATUS.Fail
+    assert dut.errormessage == message
+    # given up after one wait for ready, no sample taken
+    assert len(reads) == 1
+    assert clock.time() >= READY_TIMEOUT
+    assert ch.sample_budget.rates == {}
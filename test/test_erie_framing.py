@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of the checked framing of UFT.devices.erie,
+CRC, sequence numbers and resync, on a simulated Erie board.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+from UFT.devices import erie, erie_trace
+
+
+def response(cmd, data, seq, crc_ok=True):
+    """checked response frame as the board sends it."""
+    frame = bytearray([0x55, 0x77, cmd, 0x00, len(data) + 1, 0x00, 0x00])
+    frame += bytearray(data)
+    frame.append(seq)
+    crc = erie.crc16(frame)
+    if not crc_ok:
+        crc ^= 0x0001
+    return frame + bytearray([crc & 0xFF, crc >> 8])
+
+
+def inject(sim, data):
+    """bytes on the line before the next response."""
+    sim._outbuf.append([0.0, bytearray(data)])
+
+
+def test_crc16_check_value():
+    # CRC-16/CCITT-FALSE
+    assert erie.crc16("123456789") == 0x29B1
+
+
+def test_crc_framing_on_new_firmware(sim_board):
+    sim, board = sim_board()
+    assert board.crc_framing and sim.crc_framing
+    assert board.GetFirmwareVersion()
+
+
+def test_former_framing_on_old_firmware(sim_board):
+    sim, board = sim_board(firmware=(1, 3))
+    assert not board.crc_framing
+    assert board.GetFirmwareVersion()
+
+
+def test_resync_on_garbage(sim_board):
+    sim, board = sim_board()
+    inject(sim, "\x13\x37\x00\x55")
+    assert board.GetFirmwareVersion()
+    assert board.stats.counters["resyncs"] >= 1
+
+
+def traced(board, direction):
+    return [data for t, d, data in board.tracer.ring if d == direction]
+
+
+def test_frames_traced_with_trailer(sim_board):
+    sim, board = sim_board()
+    assert board.GetFirmwareVersion()
+    raw = traced(board, erie_trace.RX)[-1]
+    crc = erie.crc16(raw[:-2])
+    assert raw[-2:] == bytearray([crc & 0xFF, crc >> 8])
+    assert raw[-3] == board._seq
+
+
+def test_dropped_bytes_traced(sim_board):
+    sim, board = sim_board()
+    inject(sim, "\x13\x37\x00\x55")
+    assert board.GetFirmwareVersion()
+    assert "".join(str(d) for d in traced(board, erie_trace.DROP)) == \
+        "\x13\x37\x00\x55"
+
+
+def test_corrupt_frame_skipped(sim_board):
+    sim, board = sim_board()
+    inject(sim, response(erie.CMD_FIRMWARE_VERSION, [1, 4],
+                         (board._seq + 1) & 0xFF, crc_ok=False))
+    assert board.GetFirmwareVersion()
+    assert board.stats.counters["bad_frames"] == 1
+
+
+def test_stale_response_dropped(sim_board):
+    sim, board = sim_board()
+    inject(sim, response(erie.CMD_FIRMWARE_VERSION, [0, 1], board._seq))
+    # the stale v0.1 answer would fail the version check
+    assert board.GetFirmwareVersion()
+    assert board.stats.counters["stale"] == 1
+
+
+def test_batch_matched_by_sequence(sim_board):
+    sim, board = sim_board()
+    board.OutputOn(0)
+    board.OutputOn(1)
+    rets = board.transact_many([(1, erie.CMD_OUTPUT_STATUS),
+                                (2, erie.CMD_OUTPUT_STATUS),
+                                (0, erie.CMD_OUTPUT_STATUS)])
+    assert [ret.port for ret in rets] == [1, 2, 0]
+    assert [ret[7] for ret in rets] == [1, 0, 1]
+
+
+def test_silent_line_fails(sim_board):
+    sim, board = sim_board()
+    sim.timeout = 0.05
+    # unknown command, not answered
+    ret = board.transact_many([(0, 0x7F)])[0]
+    assert isinstance(ret, Exception) and "NOT ready" in str(ret)
+    assert board.stats.counters["timeouts"] == 1
+    assert board.GetFirmwareVersion()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of Erie.GetPortStatusAll and its cache, on a
+simulated Erie board with and without the all ports command.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import pytest
+
+from UFT.devices import erie
+
+
+@pytest.fixture
+def make_board(sim_board):
+    """board of the given firmware, no DUT on port 5, port 2 powered."""
+    def make(firmware):
+        present = [True] * 16
+        present[5] = False
+        sim, board = sim_board(firmware=firmware, present=present)
+        board.OutputOn(2)
+        return sim, board
+    return make
+
+
+def frames(sim, func):
+    before = sim.frames
+    ret = func()
+    return ret, sim.frames - before
+
+
+def test_all_ports_in_one_frame(make_board):
+    sim, board = make_board((1, 4))
+    status, n = frames(sim, lambda: board.GetPortStatusAll(ports=[2]))
+    assert n == 1
+    assert status.is_output_on(2) and not status.is_output_on(3)
+    assert status.is_present(4) and not status.is_present(5)
+    status, n = frames(sim, lambda: board.GetPortStatusAll())
+    assert n == 0
+
+
+def test_old_firmware_reads_the_ports_asked(make_board):
+    sim, board = make_board((1, 3))
+    status, n = frames(sim, lambda: board.GetPortStatusAll(ports=[2]))
+    assert n == 3
+    assert status.is_output_on(2)
+    # cached
+    status, n = frames(sim, lambda: board.GetPortStatusAll(ports=[2]))
+    assert n == 0
+    # added to the cache
+    status, n = frames(sim, lambda: board.GetPortStatusAll(ports=[4, 5]))
+    assert n == 6
+    assert status.covers([2, 4, 5]) and not status.covers([3])
+    assert status.is_output_on(2)
+    assert status.is_present(4) and not status.is_present(5)
+    status, n = frames(sim, lambda: board.GetPortStatusAll())
+    assert n == 3 * erie.PORT_NUM
+
+
+def test_state_command_drops_cache(make_board):
+    sim, board = make_board((1, 3))
+    assert not board.GetPortStatusAll(ports=[3]).is_output_on(3)
+    board.OutputOn(3)
+    assert board.GetPortStatusAll(ports=[3]).is_output_on(3)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of the register sequences of UFT.devices.erie,
+iic_sequence and iic_sequence_many with waits, against the VPD EEPROM
+timing of the simulated PGEM.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import pytest
+
+PGEM = 0x14
+
+
+@pytest.fixture
+def make_board(sim_board):
+    """board with the PGEMs of the first ports powered and booted, a byte
+    of their VPD EEPROM set.
+    """
+    def make(ports=2):
+        sim, board = sim_board()
+        for port in range(ports):
+            board.OutputOn(port)
+            sim.ports[port].pgem.eeprom[0x123] = 0x40 + port
+        sim.clock.sleep(1.1)
+        return sim, board
+    return make
+
+
+def test_eeprom_needs_the_wait(make_board):
+    sim, board = make_board()
+    address = [(0x00, 0x23), (0x01, 0x01)]
+    # the byte of the new address is not fetched yet
+    assert board.iic_sequence(0, PGEM, address + [(0x02, None)]) == [0xFF]
+    assert board.iic_sequence(0, PGEM, address + [(None, 5), (0x02, None)]) \
+        == [0x40]
+
+
+def test_wait_keeps_the_order(make_board):
+    sim, board = make_board()
+    start = sim.clock.time()
+    ops = [(0x00, 0x23), (0x01, 0x01), (None, 20), (0x02, None),
+           (0x00, None), (None, 0), (0x01, None)]
+    assert board.iic_sequence(0, PGEM, ops) == [0x40, 0x23, 0x01]
+    assert sim.clock.time() - start >= 0.02
+
+
+def test_other_ports_go_on_while_one_waits(make_board):
+    sim, board = make_board()
+    jobs = [(port, PGEM, [(0x00, 0x23), (0x01, 0x01), (None, 5),
+                          (0x02, None)]) for port in range(2)]
+    # the hardware ready flag of port 1 read while port 0 waits
+    jobs.append((1, PGEM, [(0x20, None)] * 3))
+    pauses = []
+    rets = board.iic_sequence_many(jobs, pause=lambda: pauses.append(1))
+    assert rets == [[0x40], [0x41], [0xA5] * 3]
+    assert pauses
+
+
+def test_failed_port_does_not_wait(make_board):
+    sim, board = make_board(ports=1)
+    jobs = [(0, PGEM, [(0x20, None), (None, 5), (0x20, None)]),
+            (3, PGEM, [(0x20, None), (None, 5000), (0x20, None)])]
+    start = sim.clock.time()
+    rets = board.iic_sequence_many(jobs)
+    assert rets[0] == [0xA5, 0xA5]
+    assert isinstance(rets[1], Exception)
+    assert sim.clock.time() - start < 1
+
+
+def test_eeprom_write_cycle(make_board):
+    sim, board = make_board(ports=1)
+    eeprom = sim.ports[0].pgem.eeprom
+    enable = [(0x40, 0x45), (0x01, 0x01)]
+    # the second byte comes during the write cycle of the first
+    board.iic_sequence(0, PGEM, enable + [(0x00, 0x30), (0x02, 0x11),
+                                          (0x00, 0x31), (0x02, 0x22)])
+    assert eeprom[0x130:0x132] == bytearray([0x11, 0xFF])
+    board.iic_sequence(0, PGEM, enable + [(0x00, 0x30), (0x02, 0x33),
+                                          (None, 5), (0x00, 0x31),
+                                          (0x02, 0x44)])
+    assert eeprom[0x130:0x132] == bytearray([0x33, 0x44])
+
+
+def test_shared_eeprom_write_cycle(sim_board):
+    sim, board = sim_board(mode4in1=True)
+    board.OutputOn(0)
+    sim.clock.sleep(1.1)
+    eeprom = sim.ports[1].eeproms[0x54]
+    # not acknowledged during the write cycle of the first byte
+    with pytest.raises(Exception):
+        board.iic_sequence(1, 0x54, [(0x10, 0x11), (0x11, 0x22)])
+    assert eeprom.data[0x10:0x12] == bytearray([0x11, 0xFF])
+    sim.clock.sleep(0.01)
+    assert board.iic_sequence(1, 0x54, [(0x10, 0x33), (None, 5),
+                                        (0x11, 0x44), (None, 5),
+                                        (0x10, None)]) == [0x33]
+    assert eeprom.data[0x10:0x12] == bytearray([0x33, 0x44])
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of UFT.sampler, VcapSampler and SampleBudget.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+from collections import namedtuple
+
+import pytest
+
+from UFT.sampler import VcapSampler, SampleBudget, RESOLUTION
+
+Sample = namedtuple("Sample", ["time", "vcap"])
+
+
+def sampler(threshold=5.0):
+    return VcapSampler(threshold, interval=1.0, floor=0.2, ceiling=10.0)
+
+
+def test_no_prediction_without_slope():
+    s = sampler()
+    assert s.time_to_threshold() is None
+    assert s.next_interval() == 1.0
+    s.add(Sample(0.0, 1.0))
+    assert s.next_interval() == 1.0
+
+
+def test_time_to_threshold_rising():
+    s = sampler()
+    for t in range(5):
+        s.add(Sample(float(t), 1.0 + 0.1 * t))
+    assert s.slope == pytest.approx(0.1)
+    # 4.6 V read, half a step away from the threshold
+    eta = (5.0 - 1.4 + RESOLUTION / 2) / 0.1
+    assert s.time_to_threshold() == pytest.approx(eta)
+    assert s.next_interval() == 10.0
+
+
+def test_interval_near_threshold():
+    s = sampler(threshold=3.0)
+    for t in range(5):
+        s.add(Sample(float(t), 3.5 - 0.1 * t))
+    assert s.slope == pytest.approx(-0.1)
+    assert s.next_interval() == pytest.approx(
+        (0.1 + RESOLUTION / 2) / 0.1 * 0.5)
+
+
+def test_slope_away_from_threshold_ignored():
+    s = sampler()
+    s.add(Sample(0.0, 4.0))
+    s.add(Sample(1.0, 4.5))
+    assert s.slope == pytest.approx(0.5)
+    s.add(Sample(2.0, 3.0))
+    assert s.slope == pytest.approx(0.5)
+    assert s.time_to_threshold() == pytest.approx(
+        (2.0 + RESOLUTION / 2) / 0.5)
+
+
+def test_budget_grants_wanted_interval():
+    budget = SampleBudget(max_rate=10)
+    assert budget.grant(0, 1.0) == 1.0
+    assert budget.grant(1, 0.5) == 0.5
+
+
+def test_budget_limits_rate():
+    budget = SampleBudget(max_rate=10)
+    assert budget.grant(0, 0.01) == pytest.approx(0.1)
+    # the rate left, at least a fair share
+    assert budget.grant(1, 0.01) == pytest.approx(0.2)
+    for i in range(20):
+        for slot in range(4):
+            granted = budget.grant(slot, 0.01)
+            assert granted <= 4 / 10.0 + 1e-9
+    assert sum(budget.rates.values()) == pytest.approx(10, rel=0.05)
+
+
+def test_budget_release():
+    budget = SampleBudget(max_rate=2)
+    budget.grant(0, 0.5)
+    assert budget.grant(1, 0.5) == pytest.approx(1.0)
+    budget.release(0)
+    assert budget.grant(1, 0.5) == 0.5
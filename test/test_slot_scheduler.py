@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of UFT.slot_scheduler.SlotScheduler on a fake
+clock.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import pytest
+
+from UFT.slot_scheduler import SlotScheduler, Sleep, Status, Wait, Ready
+from UFT.slot_scheduler import READY_POLL
+
+
+class FakeDUT(object):
+
+    def __init__(self, slotnum):
+        self.slotnum = slotnum
+
+
+class DoneFuture(object):
+
+    def __init__(self, result=None, exc=None):
+        self._result = result
+        self._exc = exc
+
+    def done(self):
+        return True
+
+    def result(self):
+        if self._exc is not None:
+            raise self._exc
+        return self._result
+
+
+def no_status(duts):
+    raise AssertionError("status not expected")
+
+
+def test_slots_do_not_wait_for_each_other(clock):
+    log = []
+
+    def phase(seconds):
+        def run(dut):
+            yield Sleep(seconds * (dut.slotnum + 1))
+            log.append((clock.time(), dut.slotnum, seconds))
+        return run
+
+    scheduler = SlotScheduler(clock, no_status)
+    for slot in range(2):
+        scheduler.add(FakeDUT(slot), [phase(1.0), phase(10.0)])
+    scheduler.run()
+    # slot 0 starts its second phase while slot 1 is still in the first
+    assert log == [(1.0, 0, 1.0), (2.0, 1, 1.0), (11.0, 0, 10.0),
+                   (22.0, 1, 10.0)]
+
+
+def test_status_read_in_one_batch(clock):
+    batches = []
+    seen = {}
+
+    def read_status(duts):
+        batches.append(sorted(d.slotnum for d in duts))
+        return dict((d.slotnum, "block{0}".format(d.slotnum)) for d in duts)
+
+    def phase(dut):
+        seen[dut.slotnum] = yield Status(1.0)
+
+    scheduler = SlotScheduler(clock, read_status)
+    for slot in range(3):
+        scheduler.add(FakeDUT(slot), [phase])
+    scheduler.run()
+    assert batches == [[0, 1, 2]]
+    assert seen == {0: "block0", 1: "block1", 2: "block2"}
+
+
+def test_status_exception_thrown_into_phase(clock):
+    caught = []
+
+    def phase(dut):
+        try:
+            yield Status(0)
+        except IOError as e:
+            caught.append(str(e))
+
+    scheduler = SlotScheduler(clock, lambda duts: {0: IOError("nack")})
+    scheduler.add(FakeDUT(0), [phase])
+    scheduler.run()
+    assert caught == ["nack"]
+
+
+def test_wait_future(clock):
+    got = []
+
+    def phase(dut):
+        got.append((yield Wait(DoneFuture(42))))
+        try:
+            yield Wait(DoneFuture(exc=ValueError("bad")))
+        except ValueError:
+            got.append("raised")
+
+    scheduler = SlotScheduler(clock, no_status)
+    scheduler.add(FakeDUT(0), [phase])
+    scheduler.run()
+    assert got == [42, "raised"]
+
+
+def test_phase_error_stops_scheduler(clock):
+    def phase(dut):
+        yield Sleep(0)
+        raise KeyError("phase")
+
+    scheduler = SlotScheduler(clock, no_status)
+    scheduler.add(FakeDUT(0), [phase])
+    with pytest.raises(KeyError):
+        scheduler.run()
+
+
+def test_on_phase_and_empty_phase(clock):
+    done = []
+
+    def nothing(dut):
+        return None
+
+    def sleeping(dut):
+        yield Sleep(1)
+
+    scheduler = SlotScheduler(clock, no_status,
+                              on_phase=lambda dut, phase: done.append(
+                                  phase.__name__))
+    scheduler.add(FakeDUT(0), [nothing, sleeping])
+    scheduler.run()
+    assert done == ["nothing", "sleeping"]
+
+
+def test_ready_as_soon_as_reported(clock):
+    reads = []
+    got = {}
+
+    def read_ready(duts):
+        reads.append(clock.time())
+        return dict((d.slotnum, clock.time() >= 1.0 * (d.slotnum + 1))
+                    for d in duts)
+
+    def phase(dut):
+        got[dut.slotnum] = (yield Ready(5.0)), clock.time()
+
+    scheduler = SlotScheduler(clock, no_status, read_ready=read_ready)
+    for slot in range(2):
+        scheduler.add(FakeDUT(slot), [phase])
+    scheduler.run()
+    assert got[0][0] is True and got[1][0] is True
+    assert 1.0 <= got[0][1] < 1.0 + READY_POLL + 1e-9
+    assert 2.0 <= got[1][1] < 2.0 + READY_POLL + 1e-9
+    # both slots read in one batch every READY_POLL
+    assert len(reads) == pytest.approx(2.0 / READY_POLL + 1, abs=1)
+
+
+@pytest.mark.parametrize("flag", [False, None])
+def test_ready_timeout_gives_last_flag(flag, clock):
+    got = []
+
+    def phase(dut):
+        got.append(((yield Ready(2.0)), clock.time()))
+
+    scheduler = SlotScheduler(clock, no_status,
+                              read_ready=lambda duts: {0: flag})
+    scheduler.add(FakeDUT(0), [phase])
+    scheduler.run()
+    assert got[0][0] is flag
+    assert 2.0 <= got[0][1] < 2.0 + READY_POLL + 1e-9
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Description: unit tests of UFT.models.vpd, diff_ranges, VPDCache,
+FieldTable and vpd_crc.
+"""
+
+__version__ = "0.1"
+__author__ = "@boqiling"
+
+import pytest
+
+from UFT.models.vpd import VPDCache, FieldTable, diff_ranges
+from UFT.models.vpd import vpd_crc, stored_crc, VPD_CRC_ADDR
+from UFT.models.base import EEP_TABLE
+
+
+def test_diff_ranges_equal():
+    assert diff_ranges([1, 2, 3], [1, 2, 3]) == []
+
+
+def test_diff_ranges_single_bytes():
+    old = [0] * 16
+    new = list(old)
+    new[2] = new[9] = 1
+    assert diff_ranges(old, new) == [(2, 1), (9, 1)]
+
+
+def test_diff_ranges_gap_merges():
+    old = [0] * 16
+    new = list(old)
+    new[2] = new[5] = 1
+    assert diff_ranges(old, new, gap=2) == [(2, 4)]
+    assert diff_ranges(old, new, gap=1) == [(2, 1), (5, 1)]
+
+
+def test_diff_ranges_longer_image():
+    assert diff_ranges(bytearray([7, 7]), [7, 7, 7, 7]) == [(2, 2)]
+
+
+def test_cache_put_get():
+    cache = VPDCache()
+    assert cache.get(0x10) is None
+    cache.put(0x10, 0x1AB)
+    assert cache.get(0x10) == 0xAB
+    assert cache.get_range(0x10, 1) == [0xAB]
+    assert cache.get_range(0x10, 2) is None
+
+
+def test_cache_write_is_dirty_until_read_back():
+    cache = VPDCache()
+    cache.put(0x20, 0x01)
+    cache.write(0x20, 0x02)
+    assert cache.is_dirty(0x20)
+    assert cache.get(0x20) is None
+    assert cache.dirty_addresses() == [0x20]
+    cache.put(0x20, 0x02)
+    assert not cache.is_dirty(0x20)
+    assert cache.get(0x20) == 0x02
+
+
+def test_cache_runtime_area_not_cached():
+    cache = VPDCache()
+    cache.put(0x100, 0x55)
+    assert cache.get(0x100) is None
+
+
+def test_cache_invalidate():
+    cache = VPDCache()
+    for addr in range(8):
+        cache.put(addr, addr)
+    cache.invalidate(2, 3)
+    assert [cache.get(a) for a in range(6)] == [0, 1, None, None, None, 5]
+    cache.invalidate()
+    assert cache.get(0) is None
+
+
+def test_cache_export():
+    cache = VPDCache()
+    cache.put(0, 0xA5)
+    cache.put(2, 0x0F)
+    assert cache.export() == "A5??0F"
+
+
+MAP = [{"name": "B", "addr": 0x04, "length": 2, "type": "int"},
+       {"name": "A", "addr": 0x00, "length": 3, "type": "str"},
+       {"name": "C", "addr": 0x07, "length": 3, "type": "int"}]
+
+
+def test_field_table_decode_image():
+    table = FieldTable(MAP)
+    image = bytearray("AB\x01\xff\x34\x12\xee\x01\x02\x03")
+    assert table.end == 10
+    assert table.decode_image(image) == {"A": "AB", "B": 0x1234,
+                                         "C": 0x030201}
+    assert table["B"].decode(list(image), 4) == 0x1234
+
+
+def test_field_table_encode_into():
+    table = FieldTable(MAP)
+    image = [0] * table.end
+    table.encode_into(image, "A", "XY")
+    table.encode_into(image, "B", 0xBEEF)
+    table.encode_into(image, "C", 0x0A0B0C)
+    assert image == [0x58, 0x59, 0, 0, 0xEF, 0xBE, 0, 0x0C, 0x0B, 0x0A]
+    with pytest.raises(ValueError):
+        table.encode_into(image, "A", "WXYZ")
+
+
+def test_field_table_spans():
+    table = FieldTable(MAP)
+    assert table.spans() == [(0, 3), (4, 6), (7, 10)]
+    assert table.spans(gap=1) == [(0, 10)]
+
+
+def test_field_table_overlap():
+    with pytest.raises(ValueError):
+        FieldTable(MAP + [{"name": "D", "addr": 0x05, "length": 1,
+                           "type": "int"}])
+
+
+def test_eep_table_round_trip():
+    image = bytearray(EEP_TABLE.end)
+    EEP_TABLE.encode_into(image, "SN", "00000123")
+    EEP_TABLE.encode_into(image, "CINIT", 0x0203)
+    fields = EEP_TABLE.decode_image(image)
+    assert fields["SN"] == "00000123"
+    assert fields["CINIT"] == 0x0203
+
+
+# crc_list1 of test/testCRC.py
+CRC_LIST1 = [0x01, 0x09, 0x60, 0x22, 0xb8, 0x24, 0x01,
+             0x00, 0x00, 0x30, 0x34, 0x35, 0x31, 0x30, 0x2d,
+             0x34, 0x30, 0x30, 0x37, 0x35, 0x2d, 0x30, 0x31,
+             0x52, 0x45, 0x56, 0x31,
+             0x30, 0x31,
+             0x84, 0x03, 0x00, 0x42]
+
+
+def reference_crc(data):
+    """the loop of test/testCRC.py, without numpy."""
+    crc = 0
+    for b in data:
+        crc ^= b << 8
+        for i in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def test_vpd_crc_as_testcrc():
+    assert vpd_crc(CRC_LIST1) == reference_crc(CRC_LIST1) == 0x375C
+
+
+def test_vpd_crc_of_image():
+    image = bytearray(range(256))
+    crc = vpd_crc(image)
+    assert crc == reference_crc(image[:VPD_CRC_ADDR])
+    image[VPD_CRC_ADDR] = crc & 0xFF
+    image[VPD_CRC_ADDR + 1] = crc >> 8
+    assert stored_crc(image) == vpd_crc(image)